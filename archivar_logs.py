@@ -0,0 +1,78 @@
+# archivar_logs.py
+import argparse
+import gzip
+import json
+import os
+from datetime import timedelta
+from app import create_app
+from models import db, Log
+from utils import obtener_hora_chile, vaciar_auditoria
+
+app = create_app()
+
+LOTE = 5000
+
+def _linea(log):
+    return json.dumps({
+        'id': log.id,
+        'timestamp': log.timestamp.isoformat() if log.timestamp else None,
+        'usuario_id': log.usuario_id,
+        'usuario_nombre': log.usuario_nombre,
+        'accion': log.accion,
+        'detalles': log.detalles,
+    }, ensure_ascii=False) + '\n'
+
+def archivar(meses, carpeta, simular):
+    """Mueve los logs más antiguos que la retención a archivos mensuales .jsonl.gz.
+
+    Por lotes (keyset sobre id): cada lote se escribe y sincroniza en disco antes de
+    borrarse de la tabla, así un corte a mitad de camino no pierde registros.
+    """
+    with app.app_context():
+        print("\n--- ARCHIVO DE LOGS DE AUDITORÍA ---")
+        vaciar_auditoria()
+
+        limite = obtener_hora_chile().replace(tzinfo=None) - timedelta(days=30 * meses)
+        limite = limite.replace(day=1, hour=0, minute=0, second=0, microsecond=0)  # Meses completos
+        print(f"Se archivan los logs anteriores a {limite:%d-%m-%Y} en {carpeta}")
+        os.makedirs(carpeta, exist_ok=True)
+
+        archivados, ultimo_id = 0, 0
+        while True:
+            lote = Log.query.filter(Log.timestamp < limite, Log.id > ultimo_id) \
+                .order_by(Log.id).limit(LOTE).all()
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+
+            por_mes = {}
+            for log in lote:
+                por_mes.setdefault(log.timestamp.strftime('%Y-%m'), []).append(log)
+
+            if not simular:
+                # gzip admite varios miembros concatenados: cada lote se agrega al archivo del mes
+                for mes, logs in por_mes.items():
+                    ruta = os.path.join(carpeta, f'logs-{mes}.jsonl.gz')
+                    with open(ruta, 'ab') as crudo:
+                        with gzip.GzipFile(fileobj=crudo, mode='ab') as archivo:
+                            archivo.write(''.join(_linea(log) for log in logs).encode('utf-8'))
+                        crudo.flush()
+                        os.fsync(crudo.fileno())
+
+                Log.query.filter(Log.id.in_([log.id for log in lote])).delete(synchronize_session=False)
+                db.session.commit()
+            db.session.expunge_all()
+
+            archivados += len(lote)
+            print(f"  {archivados} logs procesados (meses: {', '.join(sorted(por_mes))})")
+
+        accion = "se archivarían" if simular else "archivados"
+        print(f"¡Listo! {archivados} logs {accion}.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archiva los logs antiguos en archivos mensuales comprimidos.')
+    parser.add_argument('--meses', type=int, default=12, help='Meses de logs que se conservan en la base.')
+    parser.add_argument('--carpeta', default=os.path.join(app.instance_path, 'archivo_logs'))
+    parser.add_argument('--simular', action='store_true', help='Solo informa cuántos logs se archivarían.')
+    args = parser.parse_args()
+    archivar(args.meses, args.carpeta, args.simular)
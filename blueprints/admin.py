@@ -1,14 +1,21 @@
 # blueprints/admin.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import or_
 from werkzeug.utils import secure_filename
-import hashlib
 
 # Modelos
-from models import db, Usuario, Rol, Log, AreaDocumento, Documento
+from models import db, Usuario, Rol, AreaDocumento, Documento, DocumentoVersion, Tarea
 # Utilidades
-from utils import registrar_log, admin_required
+from utils import (registrar_log, vaciar_auditoria, admin_required, obtener_almacenamiento,
+                   soltar_contenido, purgar_contenido, reporte_deduplicacion, procesar_subida,
+                   ArchivoNoValido, resumen_areas, listar_documentos, listar_logs, contar_logs,
+                   actualizar_metadatos_indice, eliminar_del_indice, reintentar_tarea,
+                   resumen_tareas, autocompletar_usuarios, buscar_usuarios, invalidar_identidad,
+                   metricas_hash, encolar_procesamiento, reporte_optimizacion, reporte_integridad,
+                   reemplazar_archivo, restaurar_version, historial, soltar_versiones,
+                   respuesta_documento, HashOcupado, encolar_migracion_legado)
+from utils import (iniciar_subida, cargar_sesion, guardar_trozo, estado_subida,
+                   abrir_subida_completa, descartar_subida, SubidaNoEncontrada, TrozoNoValido)
 
 # Definimos el blueprint
 admin_bp = Blueprint('admin', __name__, template_folder='../templates', url_prefix='/admin')
@@ -21,33 +28,21 @@ admin_bp = Blueprint('admin', __name__, template_folder='../templates', url_pref
 @login_required
 @admin_required
 def panel():
-    # --- Lógica de Paginación y Filtros de Usuarios (Tu estándar) ---
-    page = request.args.get('page', 1, type=int)
+    # --- Filtros de Usuarios: búsqueda por prefijo sin tildes, paginada por cursor ---
     busqueda = request.args.get('busqueda', '')
     rol_filtro = request.args.get('rol_filtro', '')
     estado_filtro = request.args.get('estado_filtro', '')
 
-    query = Usuario.query
+    cursor = request.args.get('cursor')
+    activo = {'activo': True, 'inactivo': False}.get(estado_filtro)
 
-    if busqueda:
-        query = query.filter(
-            or_(Usuario.nombre_completo.ilike(f'%{busqueda}%'),
-                Usuario.email.ilike(f'%{busqueda}%'))
-        )
-    
-    if rol_filtro:
-        query = query.filter(Usuario.rol_id == rol_filtro)
-
-    if estado_filtro == 'activo':
-        query = query.filter(Usuario.activo == True)
-    elif estado_filtro == 'inactivo':
-        query = query.filter(Usuario.activo == False)
-    
-    pagination = query.order_by(Usuario.id).paginate(page=page, per_page=10, error_out=False)
+    pagina = buscar_usuarios(busqueda, rol_id=rol_filtro or None, activo=activo, cursor=cursor)
     roles_para_filtro = Rol.query.order_by(Rol.nombre).all()
 
     return render_template('admin/panel.html', 
-                           pagination=pagination,
+                           usuarios=pagina.usuarios,
+                           cursor_siguiente=pagina.cursor_siguiente,
+                           cursor_actual=cursor,
                            roles_para_filtro=roles_para_filtro,
                            busqueda=busqueda,
                            rol_filtro=rol_filtro,
@@ -74,7 +69,11 @@ def crear_usuario():
             nombre_completo=nombre, email=email, rol_id=rol_id,
             cambio_clave_requerido=forzar_cambio, activo=True
         )
-        nuevo_usuario.set_password(password)
+        try:
+            nuevo_usuario.set_password(password)
+        except HashOcupado:
+            flash('El servidor está ocupado. Intenta crear el usuario nuevamente en unos segundos.', 'warning')
+            return render_template('admin/crear_usuario.html', roles=roles, datos_previos=request.form), 503
         
         try:
             db.session.add(nuevo_usuario)
@@ -109,11 +108,17 @@ def editar_usuario(id):
 
         password = request.form.get('password')
         if password and password.strip():
-            usuario.set_password(password)
+            try:
+                usuario.set_password(password)
+            except HashOcupado:
+                db.session.rollback()
+                flash('El servidor está ocupado. No se guardaron los cambios; intenta nuevamente en unos segundos.', 'warning')
+                return render_template('admin/editar_usuario.html', usuario=usuario, roles=roles), 503
             flash('Contraseña actualizada.', 'info')
 
         try:
             db.session.commit()
+            invalidar_identidad(usuario.id)
             registrar_log("Edición Usuario", f"Admin editó a {usuario.nombre_completo}")
             flash('Usuario actualizado con éxito.', 'success')
             return redirect(url_for('admin.panel'))
@@ -134,6 +139,7 @@ def toggle_activo(id):
         
     usuario.activo = not usuario.activo
     db.session.commit()
+    invalidar_identidad(usuario.id)
     estado = "activado" if usuario.activo else "desactivado"
     registrar_log("Cambio Estado", f"Usuario {usuario.nombre_completo} fue {estado}.")
     flash(f'Usuario {usuario.nombre_completo} {estado}.', 'success')
@@ -143,28 +149,44 @@ def toggle_activo(id):
 @login_required
 @admin_required
 def ver_logs():
-    page = request.args.get('page', 1, type=int)
+    vaciar_auditoria()  # Que aparezcan también los eventos aún en el buffer
+    cursor = request.args.get('cursor')
     usuario_filtro = request.args.get('usuario_id')
     accion_filtro = request.args.get('accion')
 
-    query = Log.query.order_by(Log.timestamp.desc())
-
-    if usuario_filtro and usuario_filtro.isdigit():
-        query = query.filter(Log.usuario_id == int(usuario_filtro))
-    if accion_filtro:
-        query = query.filter(Log.accion == accion_filtro)
+    usuario_id = int(usuario_filtro) if usuario_filtro and usuario_filtro.isdigit() else None
+    pagina = listar_logs(usuario_id=usuario_id, accion=accion_filtro or None, cursor=cursor)
+    total = contar_logs(usuario_id=usuario_id, accion=accion_filtro or None)
 
-    pagination = query.paginate(page=page, per_page=15, error_out=False)
-    todos_los_usuarios = Usuario.query.order_by(Usuario.nombre_completo).all()
+    # Solo el usuario filtrado (para mostrar su nombre); el resto se busca con autocompletar_usuario
+    usuario_seleccionado = db.session.query(Usuario.id, Usuario.nombre_completo) \
+        .filter(Usuario.id == usuario_id).first() if usuario_id else None
     acciones_posibles = ["Inicio de Sesión", "Cierre de Sesión", "Creación Usuario", 
                          "Edición Usuario", "Cambio Estado", "Cambio de Clave", 
-                         "Recuperación Clave", "Gestión Documental"]
+                         "Recuperación Clave", "Gestión Documental", "Integridad"]
 
-    return render_template('admin/ver_logs.html', pagination=pagination,
-                           todos_los_usuarios=todos_los_usuarios,
+    return render_template('admin/ver_logs.html', logs=pagina.logs,
+                           cursor_siguiente=pagina.cursor_siguiente,
+                           cursor_actual=cursor, total=total,
+                           usuario_seleccionado=usuario_seleccionado,
                            acciones_posibles=acciones_posibles,
                            filtros={'usuario_id': usuario_filtro, 'accion': accion_filtro})
 
+@admin_bp.route('/usuarios/autocompletar')
+@login_required
+@admin_required
+def autocompletar_usuario():
+    """JSON con los primeros usuarios que coinciden por prefijo de nombre o email."""
+    usuarios = autocompletar_usuarios(request.args.get('q', ''))
+    return jsonify([{'id': u.id, 'nombre': u.nombre_completo, 'email': u.email} for u in usuarios])
+
+@admin_bp.route('/metricas/hash')
+@login_required
+@admin_required
+def metricas_hash_claves():
+    """Tiempos del pool de hash de contraseñas en este proceso (espera en cola y cálculo)."""
+    return jsonify(metricas_hash())
+
 # ==========================================
 #  SECCIÓN 2: GESTIÓN DOCUMENTAL (NUEVO)
 # ==========================================
@@ -174,8 +196,9 @@ def ver_logs():
 @admin_required
 def gestion_areas():
     """Listado de Áreas documentales."""
-    areas = AreaDocumento.query.all()
-    return render_template('admin/gestion_areas.html', areas=areas)
+    areas = resumen_areas()
+    return render_template('admin/gestion_areas.html', areas=areas,
+                           dedup=reporte_deduplicacion(), optimizacion=reporte_optimizacion())
 
 @admin_bp.route('/area/crear', methods=['POST'])
 @login_required
@@ -201,9 +224,16 @@ def crear_area():
 def eliminar_area(id):
     area = AreaDocumento.query.get_or_404(id)
     nombre = area.nombre
+    # Cada documento suelta su referencia; el contenido se purga solo si nadie más lo usa
+    archivos = [soltar_contenido(d) for d in area.documentos]
+    doc_ids = [d.id for d in area.documentos]
+    archivos += soltar_versiones(doc_ids)
     # SQLAlchemy con cascade="all, delete-orphan" eliminará los documentos asociados automáticamente
     db.session.delete(area)
     db.session.commit()
+    for backend, clave in archivos:
+        purgar_contenido(backend, clave)
+    eliminar_del_indice(doc_ids)
     registrar_log("Gestión Documental", f"Área eliminada: {nombre} y sus documentos.")
     flash('Área eliminada correctamente.', 'success')
     return redirect(url_for('admin.gestion_areas'))
@@ -224,34 +254,33 @@ def gestionar_documentos(id):
         if archivo and titulo:
             if archivo.filename == '':
                 flash('No se seleccionó ningún archivo.', 'warning')
-            elif not archivo.filename.lower().endswith('.pdf'):
-                flash('Solo se permiten archivos PDF.', 'danger')
             else:
                 try:
-                    # 1. Leer datos binarios
-                    data = archivo.read()
-                    filename = secure_filename(archivo.filename)
-                    size = len(data)
-                    sha256 = hashlib.sha256(data).hexdigest()
-                    
-                    # 2. Crear registro
-                    nuevo_doc = Documento(
-                        titulo=titulo,
-                        version=version,
-                        descripcion=request.form.get('descripcion'),
-                        filename=filename,
-                        mimetype='application/pdf',
-                        archivo_data=data, # BLOB
-                        size_bytes=size,
-                        sha256=sha256,
-                        area_id=area.id
-                    )
+                    # 1. Leer por trozos: hash incremental, firma PDF y spool a disco
+                    with procesar_subida(archivo.stream) as subida:
+                        # 2. Crear registro
+                        nuevo_doc = Documento(
+                            titulo=titulo,
+                            version=version,
+                            descripcion=request.form.get('descripcion'),
+                            filename=secure_filename(archivo.filename),
+                            mimetype='application/pdf',
+                            size_bytes=subida.size_bytes,
+                            sha256=subida.sha256,
+                            area_id=area.id
+                        )
+
+                        # 3. Guardar el archivo en el backend configurado
+                        obtener_almacenamiento().guardar(nuevo_doc, subida.archivo)
                     
                     db.session.add(nuevo_doc)
                     db.session.commit()
+                    encolar_procesamiento(nuevo_doc.id)
                     registrar_log("Gestión Documental", f"Documento subido: {titulo} en {area.nombre}")
                     flash('Documento subido exitosamente.', 'success')
-                    
+
+                except ArchivoNoValido as e:
+                    flash(f'{e} Solo se permiten archivos PDF.', 'danger')
                 except Exception as e:
                     db.session.rollback()
                     flash(f'Error al subir archivo: {str(e)}', 'danger')
@@ -259,7 +288,12 @@ def gestionar_documentos(id):
                     
         return redirect(url_for('admin.gestionar_documentos', id=area.id))
         
-    return render_template('admin/gestionar_documentos.html', area=area)
+    cursor = request.args.get('cursor')
+    pagina = listar_documentos(area.id, cursor=cursor)
+    return render_template('admin/gestionar_documentos.html', area=area,
+                           documentos=pagina.documentos,
+                           cursor_siguiente=pagina.cursor_siguiente,
+                           cursor_actual=cursor)
 
 @admin_bp.route('/documento/eliminar/<int:id>', methods=['POST'])
 @login_required
@@ -268,9 +302,14 @@ def eliminar_documento(id):
     doc = Documento.query.get_or_404(id)
     area_id = doc.area_id
     titulo = doc.titulo
+    # El documento y cada versión anterior sueltan su referencia
+    archivos = [soltar_contenido(doc)] + soltar_versiones([id])
     
     db.session.delete(doc)
     db.session.commit()
+    for backend, clave in archivos:
+        purgar_contenido(backend, clave)
+    eliminar_del_indice([id])
     
     registrar_log("Gestión Documental", f"Documento eliminado: {titulo}")
     flash('Documento eliminado correctamente.', 'success')
@@ -302,31 +341,228 @@ def editar_documento(id):
     titulo = request.form.get('titulo')
     
     if titulo:
-        doc.titulo = titulo
-        doc.version = request.form.get('version')
-        doc.descripcion = request.form.get('descripcion')
-        
-        # Verificar si subieron un archivo nuevo para reemplazar el anterior
+        # Primero el archivo: la versión vigente pasa al historial con su etiqueta de versión
         archivo = request.files.get('archivo')
+        archivo_reemplazado = False
         if archivo and archivo.filename != '':
-            if archivo.filename.lower().endswith('.pdf'):
-                try:
-                    data = archivo.read()
-                    doc.filename = secure_filename(archivo.filename)
-                    doc.archivo_data = data
-                    doc.size_bytes = len(data)
-                    doc.sha256 = hashlib.sha256(data).hexdigest()
-                    flash('Documento y archivo actualizados.', 'success')
-                except Exception as e:
-                    flash(f'Error al procesar el nuevo archivo: {e}', 'danger')
-            else:
+            try:
+                with procesar_subida(archivo.stream) as subida:
+                    archivo_reemplazado = reemplazar_archivo(doc, subida, secure_filename(archivo.filename),
+                                                             current_user.nombre_completo)
+                if archivo_reemplazado:
+                    flash('Documento y archivo actualizados. La versión anterior quedó en el historial.', 'success')
+                else:
+                    flash('El archivo es idéntico al vigente; se actualizaron solo los datos.', 'info')
+            except ArchivoNoValido:
                 flash('El archivo nuevo debe ser PDF. Se actualizaron solo los textos.', 'warning')
+            except Exception as e:
+                # Se descartan los cambios del archivo; los textos sí se guardan
+                db.session.rollback()
+                archivo_reemplazado = False
+                flash(f'Error al procesar el nuevo archivo: {e}', 'danger')
         else:
             flash('Datos del documento actualizados (archivo mantenido).', 'success')
 
+        doc.titulo = titulo
+        doc.version = request.form.get('version')
+        doc.descripcion = request.form.get('descripcion')
         db.session.commit()
+        if archivo_reemplazado:
+            encolar_procesamiento(doc.id)
+            encolar_migracion_legado(doc)
+        else:
+            actualizar_metadatos_indice(doc.id, doc.area_id, doc.titulo, doc.descripcion)
         registrar_log("Gestión Documental", f"Documento editado: {titulo}")
     else:
         flash('El título es obligatorio.', 'warning')
         
-    return redirect(url_for('admin.gestionar_documentos', id=doc.area_id))
\ No newline at end of file
+    return redirect(url_for('admin.gestionar_documentos', id=doc.area_id))
+
+@admin_bp.route('/documento/<int:id>/versiones')
+@login_required
+@admin_required
+def versiones_documento(id):
+    """Versión vigente e historial de archivos reemplazados."""
+    doc = Documento.query.get_or_404(id)
+    return render_template('admin/versiones_documento.html', doc=doc, versiones=historial(doc))
+
+@admin_bp.route('/documento/<int:id>/versiones/<int:numero>/descargar')
+@login_required
+@admin_required
+def descargar_version(id, numero):
+    version = DocumentoVersion.query.filter_by(documento_id=id, numero=numero).first_or_404()
+    # La versión tiene los mismos campos de almacenamiento que un Documento
+    return respuesta_documento(version, as_attachment=True)
+
+@admin_bp.route('/documento/<int:id>/versiones/<int:numero>/restaurar', methods=['POST'])
+@login_required
+@admin_required
+def restaurar_version_documento(id, numero):
+    doc = Documento.query.get_or_404(id)
+    version = DocumentoVersion.query.filter_by(documento_id=id, numero=numero).first_or_404()
+
+    if restaurar_version(doc, version, current_user.nombre_completo):
+        db.session.commit()
+        encolar_procesamiento(doc.id)
+        encolar_migracion_legado(doc)
+        registrar_log("Gestión Documental", f"Documento {doc.titulo}: restaurada la versión {numero}")
+        flash(f'Versión {numero} restaurada. La que estaba vigente quedó en el historial.', 'success')
+    else:
+        flash('Esa versión ya es la vigente.', 'info')
+    return redirect(url_for('admin.versiones_documento', id=doc.id))
+
+# ==========================================
+#  SECCIÓN 3: SUBIDAS REANUDABLES (API JSON)
+# ==========================================
+
+def _sesion_o_404(upload_id):
+    try:
+        return cargar_sesion(upload_id, current_user.id)
+    except SubidaNoEncontrada:
+        abort(404)
+
+@admin_bp.route('/area/<int:id>/subidas', methods=['POST'])
+@login_required
+@admin_required
+def iniciar_subida_reanudable(id):
+    """Crea una sesión de subida por trozos. Devuelve el upload_id y el tamaño de trozo."""
+    area = AreaDocumento.query.get_or_404(id)
+    datos = request.get_json(silent=True) or {}
+
+    if not datos.get('titulo') or not datos.get('filename'):
+        return jsonify(error='El título y el archivo son obligatorios.'), 400
+
+    try:
+        meta = iniciar_subida(
+            current_user.id, area.id,
+            {
+                'titulo': datos.get('titulo'),
+                'version': datos.get('version'),
+                'descripcion': datos.get('descripcion'),
+                'filename': secure_filename(datos['filename']),
+            },
+            int(datos.get('size_bytes') or 0),
+            datos.get('sha256')
+        )
+    except (TrozoNoValido, ValueError) as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(upload_id=meta['upload_id'],
+                   chunk_size=meta['chunk_size'],
+                   total_trozos=meta['total_trozos']), 201
+
+@admin_bp.route('/subidas/<upload_id>', methods=['GET'])
+@login_required
+@admin_required
+def estado_subida_reanudable(upload_id):
+    """Trozos recibidos y faltantes, para reanudar tras un corte."""
+    meta = _sesion_o_404(upload_id)
+    return jsonify(estado_subida(meta))
+
+@admin_bp.route('/subidas/<upload_id>', methods=['PUT'])
+@login_required
+@admin_required
+def subir_trozo(upload_id):
+    """Recibe un trozo en el cuerpo (application/octet-stream) con ?offset= en bytes."""
+    meta = _sesion_o_404(upload_id)
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify(error='Falta el offset.'), 400
+
+    try:
+        indice = guardar_trozo(meta, offset, request.stream)
+    except TrozoNoValido as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(indice=indice)
+
+@admin_bp.route('/subidas/<upload_id>/finalizar', methods=['POST'])
+@login_required
+@admin_required
+def finalizar_subida_reanudable(upload_id):
+    """Ensambla, verifica sha256 y firma PDF, y crea el Documento."""
+    meta = _sesion_o_404(upload_id)
+    area = AreaDocumento.query.get_or_404(meta['area_id'])
+
+    try:
+        with abrir_subida_completa(meta) as subida:
+            nuevo_doc = Documento(
+                titulo=meta['titulo'],
+                version=meta['version'],
+                descripcion=meta['descripcion'],
+                filename=meta['filename'],
+                mimetype='application/pdf',
+                size_bytes=subida.size_bytes,
+                sha256=subida.sha256,
+                area_id=area.id
+            )
+            obtener_almacenamiento().guardar(nuevo_doc, subida.archivo)
+
+        db.session.add(nuevo_doc)
+        db.session.commit()
+    except TrozoNoValido as e:
+        return jsonify(error=str(e)), 400
+    except ArchivoNoValido as e:
+        # Archivo ensamblado inservible (no es PDF o no coincide el sha256): se sube de nuevo
+        descartar_subida(upload_id)
+        return jsonify(error=str(e)), 400
+    except Exception as e:
+        db.session.rollback()
+        print(e)
+        return jsonify(error=f'Error al guardar el archivo: {e}'), 500
+
+    descartar_subida(upload_id)
+    encolar_procesamiento(nuevo_doc.id)
+    registrar_log("Gestión Documental", f"Documento subido: {meta['titulo']} en {area.nombre}")
+    flash('Documento subido exitosamente.', 'success')
+    return jsonify(documento_id=nuevo_doc.id,
+                   redirect=url_for('admin.gestionar_documentos', id=area.id))
+
+@admin_bp.route('/subidas/<upload_id>', methods=['DELETE'])
+@login_required
+@admin_required
+def cancelar_subida_reanudable(upload_id):
+    _sesion_o_404(upload_id)
+    descartar_subida(upload_id)
+    return jsonify(ok=True)
+
+# ==========================================
+#  SECCIÓN 4: TAREAS EN SEGUNDO PLANO
+# ==========================================
+
+@admin_bp.route('/tareas')
+@login_required
+@admin_required
+def ver_tareas():
+    """Estado de la cola procesada por worker.py."""
+    estado_filtro = request.args.get('estado', '')
+
+    query = Tarea.query.order_by(Tarea.id.desc())
+    if estado_filtro:
+        query = query.filter(Tarea.estado == estado_filtro)
+
+    return render_template('admin/tareas.html',
+                           tareas=query.limit(100).all(),
+                           resumen=resumen_tareas(),
+                           estado_filtro=estado_filtro)
+
+@admin_bp.route('/tareas/<int:id>/reintentar', methods=['POST'])
+@login_required
+@admin_required
+def reintentar(id):
+    if reintentar_tarea(id):
+        flash('Tarea devuelta a la cola.', 'success')
+    else:
+        flash('Solo se pueden reintentar tareas fallidas.', 'warning')
+    return redirect(url_for('admin.ver_tareas', estado='fallida'))
+
+# ==========================================
+#  SECCIÓN 5: INTEGRIDAD DE ARCHIVOS
+# ==========================================
+
+@admin_bp.route('/integridad')
+@login_required
+@admin_required
+def ver_integridad():
+    """Resultado de verificar_integridad.py: avance y archivos con diferencias."""
+    return render_template('admin/integridad.html', reporte=reporte_integridad())
@@ -7,11 +7,15 @@ import secrets
 import re
 
 from models import db, Usuario
-from utils import registrar_log, enviar_correo_reseteo
+from utils import (registrar_log, enviar_correo_reseteo, invalidar_identidad, necesita_rehash,
+                   HashOcupado, limitar_intentos, limpiar_intentos, registrar_fallo)
 
 # Definimos el Blueprint
 auth_bp = Blueprint('auth', __name__, template_folder='../templates')
 
+# Respuesta 503 cuando el pool de hash de contraseñas no tiene cupo (HashOcupado)
+MENSAJE_OCUPADO = 'Hay muchos ingresos en este momento. Intenta nuevamente en unos segundos.'
+
 # --- VALIDACIONES LOCALES ---
 def es_password_segura(password):
     if len(password) < 8: return False
@@ -35,6 +39,7 @@ def obtener_ruta_redireccion(usuario):
 # --- RUTAS DE AUTENTICACIÓN ---
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@limitar_intentos('LOGIN', 'auth/login.html', solo_fallos=True)
 def login():
     if current_user.is_authenticated:
         return redirect(obtener_ruta_redireccion(current_user))
@@ -50,8 +55,23 @@ def login():
                 flash('Tu cuenta está desactivada. Contacta al administrador.', 'danger')
                 return redirect(url_for('auth.login'))
             
-            if usuario.check_password(password):
+            try:
+                clave_valida = usuario.check_password(password)
+            except HashOcupado:
+                flash(MENSAJE_OCUPADO, 'warning')
+                return render_template('auth/login.html'), 503
+
+            if clave_valida:
                 login_user(usuario)
+                limpiar_intentos('LOGIN', email)
+                if necesita_rehash(usuario.password_hash):
+                    # Hash con método o parámetros antiguos: se actualiza ahora que tenemos la clave.
+                    # Es oportunista: si el pool está saturado se deja para el próximo ingreso
+                    try:
+                        usuario.set_password(password)
+                        db.session.commit()
+                    except HashOcupado:
+                        pass
                 registrar_log("Inicio de Sesión", f"Usuario {usuario.nombre_completo} accedió.")
 
                 if usuario.cambio_clave_requerido:
@@ -60,6 +80,8 @@ def login():
                 flash(f'Bienvenido, {usuario.nombre_completo}', 'success')
                 return redirect(obtener_ruta_redireccion(usuario))
         
+        # Solo los fallos gastan cupo del límite de intentos
+        registrar_fallo('LOGIN', email)
         flash('Correo o contraseña incorrectos.', 'danger')
     
     return render_template('auth/login.html')
@@ -84,9 +106,16 @@ def cambiar_clave():
         if not es_password_segura(nueva_password):
             flash('Error: La contraseña debe tener 8 caracteres, mayúscula y número.', 'danger')
         else:
-            current_user.set_password(nueva_password)
-            current_user.cambio_clave_requerido = False
+            # current_user es la identidad cacheada (solo lectura): se edita la entidad
+            usuario = db.session.get(Usuario, current_user.id)
+            try:
+                usuario.set_password(nueva_password)
+            except HashOcupado:
+                flash(MENSAJE_OCUPADO, 'warning')
+                return render_template('auth/cambiar_clave.html'), 503
+            usuario.cambio_clave_requerido = False
             db.session.commit()
+            invalidar_identidad(usuario.id)
             
             registrar_log("Cambio de Clave", "Usuario actualizó su contraseña obligatoria.")
             logout_user()
@@ -96,6 +125,7 @@ def cambiar_clave():
     return render_template('auth/cambiar_clave.html')
 
 @auth_bp.route('/solicitar-reseteo', methods=['GET', 'POST'])
+@limitar_intentos('RESETEO', 'auth/solicitar_reseteo.html')
 def solicitar_reseteo():
     if current_user.is_authenticated:
         return redirect(obtener_ruta_redireccion(current_user))
@@ -141,7 +171,11 @@ def resetear_clave(token):
         if not es_password_segura(nueva_password):
             flash('Error: Requisitos de seguridad no cumplidos.', 'danger')
         else:
-            usuario.set_password(nueva_password)
+            try:
+                usuario.set_password(nueva_password)
+            except HashOcupado:
+                flash(MENSAJE_OCUPADO, 'warning')
+                return render_template('auth/resetear_clave.html'), 503
             usuario.reset_token = None
             usuario.reset_token_expiracion = None
             db.session.commit()
@@ -1,52 +1,115 @@
-from flask import Blueprint, render_template, send_file, abort
+from flask import Blueprint, render_template, request, abort, jsonify, url_for
 from flask_login import login_required
-from models import AreaDocumento, Documento
-from io import BytesIO
+from models import db, AreaDocumento, Documento
+from utils import (respuesta_documento, respuesta_paginas, respuesta_zip, respuesta_miniatura, resumen_areas,
+                   listar_documentos, buscar, variante_optimizada, obtener_estructura, estructuras_de, secciones)
 
 repositorio_bp = Blueprint('repositorio', __name__, template_folder='../templates')
 
 @repositorio_bp.route('/panel')
 @login_required
 def panel():
-    """Vista principal: Grid de Áreas (Estilo Estadísticas)"""
-    areas = AreaDocumento.query.all()
+    """Vista principal: Grid de Áreas (Estilo Estadísticas). Conteos en una sola consulta."""
+    areas = resumen_areas()
     return render_template('repositorio/index.html', areas=areas)
 
 @repositorio_bp.route('/area/<int:id>')
 @login_required
 def ver_area(id):
-    """Vista interna: Acordeón con documentos"""
+    """Vista interna: Acordeón con documentos (solo metadatos, paginado por cursor)"""
     area = AreaDocumento.query.get_or_404(id)
-    return render_template('repositorio/ver_area.html', area=area)
+    cursor = request.args.get('cursor')
+    pagina = listar_documentos(area.id, cursor=cursor)
+    estructuras = estructuras_de(pagina.documentos)
+    return render_template('repositorio/ver_area.html', area=area,
+                           documentos=pagina.documentos,
+                           secciones={sha: (e.paginas, secciones(e)) for sha, e in estructuras.items()},
+                           cursor_siguiente=pagina.cursor_siguiente,
+                           cursor_actual=cursor)
+
+@repositorio_bp.route('/buscar')
+@login_required
+def buscar_documentos():
+    """Búsqueda de texto completo (título, descripción y contenido del PDF)."""
+    q = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 20
+
+    resultados, total = buscar(q, page=page, per_page=per_page)
+
+    # Nombre de área y verificación de existencia en una sola consulta
+    ids = [r.documento_id for r in resultados]
+    areas = dict(db.session.query(Documento.id, AreaDocumento.nombre)
+                 .join(AreaDocumento, Documento.area_id == AreaDocumento.id)
+                 .filter(Documento.id.in_(ids)).all()) if ids else {}
+
+    return render_template('repositorio/buscar.html', q=q, page=page, total=total,
+                           resultados=[r for r in resultados if r.documento_id in areas],
+                           areas=areas, hay_siguiente=page * per_page < total)
 
 @repositorio_bp.route('/documento/<int:id>/ver')
 @login_required
 def ver_pdf(id):
-    """Streaming del BLOB al navegador"""
+    """Streaming del archivo al navegador (admite Range para saltar de página)"""
     doc = Documento.query.get_or_404(id)
-    
-    # Validamos que exista data binaria
-    if not doc.archivo_data:
-        abort(404)
-        
-    return send_file(
-        BytesIO(doc.archivo_data),
-        mimetype=doc.mimetype,
-        as_attachment=False, 
-        download_name=doc.filename
-    )
+    return respuesta_documento(doc, as_attachment=False, variante=_variante(doc))
 
 @repositorio_bp.route('/documento/<int:id>/descargar')
 @login_required
 def descargar_pdf(id):
-    """Descarga forzada del BLOB"""
+    """Descarga forzada del archivo"""
+    doc = Documento.query.get_or_404(id)
+    return respuesta_documento(doc, as_attachment=True, variante=_variante(doc))
+
+@repositorio_bp.route('/documento/<int:id>/paginas')
+@login_required
+def ver_paginas(id):
+    """Solo las páginas pedidas (?desde=&hasta=), como un PDF aparte"""
+    doc = Documento.query.get_or_404(id)
+    return respuesta_paginas(doc, request.args.get('desde', 1, type=int), request.args.get('hasta', type=int),
+                             as_attachment=bool(request.args.get('descargar')), variante=_variante(doc))
+
+@repositorio_bp.route('/documento/<int:id>/estructura')
+@login_required
+def estructura(id):
+    """Páginas y marcadores del documento, con el enlace a cada sección"""
+    doc = Documento.query.get_or_404(id)
+    datos = obtener_estructura(doc)
+    if datos is None:
+        abort(404)
+    return jsonify(paginas=datos.paginas, secciones=[
+        {'nivel': s.nivel, 'titulo': s.titulo, 'desde': s.desde, 'hasta': s.hasta,
+         'url': url_for('repositorio.ver_paginas', id=doc.id, desde=s.desde, hasta=s.hasta)}
+        for s in secciones(datos, nivel_maximo=None)
+    ])
+
+def _variante(doc):
+    """Versión optimizada si existe; ?original=1 entrega el archivo tal como se subió."""
+    return None if request.args.get('original') else variante_optimizada(doc)
+
+@repositorio_bp.route('/documento/<int:id>/miniatura')
+@login_required
+def miniatura(id):
+    """Primera página en JPEG para el listado, sin descargar el PDF completo"""
     doc = Documento.query.get_or_404(id)
-    if not doc.archivo_data:
+    respuesta = respuesta_miniatura(doc)
+    if respuesta is None:
         abort(404)
+    return respuesta
 
-    return send_file(
-        BytesIO(doc.archivo_data),
-        mimetype=doc.mimetype,
-        as_attachment=True,
-        download_name=doc.filename
-    )
\ No newline at end of file
+@repositorio_bp.route('/area/<int:id>/zip')
+@login_required
+def descargar_zip(id):
+    """Todos los documentos del área (o los marcados con ?doc=) en un ZIP enviado por partes"""
+    area = AreaDocumento.query.get_or_404(id)
+    query = Documento.query.filter(Documento.area_id == area.id)
+
+    seleccion = request.args.getlist('doc', type=int)
+    if seleccion:
+        query = query.filter(Documento.id.in_(seleccion))
+
+    # Entidades sin el BLOB (columna diferida); el contenido se lee recién al escribir cada entrada
+    documentos = query.order_by(Documento.fecha_subida.desc(), Documento.id.desc()).all()
+    if not documentos:
+        abort(404)
+    return respuesta_zip(f'{area.nombre}.zip', documentos)
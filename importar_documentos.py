@@ -0,0 +1,215 @@
+# importar_documentos.py
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import insert, update
+from werkzeug.utils import secure_filename
+from app import create_app
+from models import db, AreaDocumento, Documento, ContenidoArchivo
+from utils import obtener_almacenamiento, obtener_hora_chile, registrar_log
+from utils.uploads import procesar_archivo, ArchivoNoValido
+from utils.jobs import encolar_varios, tareas_procesamiento
+
+app = create_app()
+
+LOTE_DOCUMENTOS = 200
+LOTE_BYTES = 64 * 1024 * 1024  # Con backend 'db' los BLOB del lote quedan en memoria hasta el INSERT
+
+def _analizar(ruta):
+    """En el proceso hijo: sha256, tamaño y validación de firma PDF, sin copiar el archivo."""
+    try:
+        with procesar_archivo(ruta) as archivo:
+            return ruta, archivo.sha256, archivo.size_bytes, None
+    except ArchivoNoValido as e:
+        return ruta, None, None, str(e)
+    except OSError as e:
+        return ruta, None, None, f"No se pudo leer: {e}"
+
+def _huella(ruta):
+    info = os.stat(ruta)
+    return f"{info.st_size}:{int(info.st_mtime)}"
+
+def _cargar_estado(ruta_estado):
+    """Archivos ya resueltos en ejecuciones anteriores (ruta -> tamaño:mtime)."""
+    procesados = {}
+    if os.path.exists(ruta_estado):
+        with open(ruta_estado, encoding='utf-8') as archivo:
+            for linea in archivo:
+                if linea.strip():
+                    registro = json.loads(linea)
+                    procesados[registro['ruta']] = registro['huella']
+    return procesados
+
+def _recorrer(raiz, areas, crear_areas, simular):
+    """(ruta, area_id) de cada PDF: la primera carpeta bajo la raíz es el nombre del área."""
+    for nombre in sorted(os.listdir(raiz)):
+        carpeta = os.path.join(raiz, nombre)
+        if not os.path.isdir(carpeta):
+            if nombre.lower().endswith('.pdf'):
+                print(f"  Omitido (no está dentro de la carpeta de un área): {nombre}")
+            continue
+
+        area_id = areas.get(nombre.lower())
+        if area_id is None:
+            if not crear_areas:
+                print(f"  Carpeta omitida, no existe el área '{nombre}' (use --crear-areas)")
+                continue
+            if simular:
+                area_id = 0
+            else:
+                area = AreaDocumento(nombre=nombre)
+                db.session.add(area)
+                db.session.commit()
+                area_id = areas[nombre.lower()] = area.id
+                print(f"  Área creada: {nombre}")
+
+        for actual, subcarpetas, archivos in os.walk(carpeta):
+            subcarpetas.sort()
+            for archivo in sorted(archivos):
+                if archivo.lower().endswith('.pdf'):
+                    yield os.path.join(actual, archivo), area_id
+
+class Importacion:
+    """Acumula documentos validados y los inserta por lotes (executemany)."""
+
+    def __init__(self, raiz, ruta_estado, simular):
+        self.raiz = raiz
+        self.ruta_estado = ruta_estado
+        self.simular = simular
+        self.almacen = obtener_almacenamiento()
+        self.documentos, self.contenidos, self.reutilizados, self.resueltos = [], [], [], []
+        self.bytes_lote = 0
+        self.importados = 0
+
+    def agregar(self, ruta, area_id, sha256, size_bytes, contenido_existe):
+        relativa = os.path.relpath(ruta, self.raiz)
+        nombre = os.path.basename(ruta)
+        if not self.simular:
+            if contenido_existe:
+                self.reutilizados.append(sha256)
+            else:
+                with open(ruta, 'rb') as origen:
+                    contenido = self.almacen.escribir_nuevo(sha256, size_bytes, origen)
+                self.contenidos.append({
+                    'sha256': sha256, 'size_bytes': size_bytes, 'storage_backend': contenido.storage_backend,
+                    'referencias': 1, 'data': contenido.data, 'fecha_creacion': self.ahora()
+                })
+                self.bytes_lote += size_bytes if contenido.data is not None else 0
+            self.documentos.append({
+                'titulo': os.path.splitext(nombre)[0].replace('_', ' ').strip()[:200] or nombre[:200],
+                'descripcion': f"Importado desde {relativa}",
+                'filename': secure_filename(nombre) or 'documento.pdf',
+                'mimetype': 'application/pdf',
+                'size_bytes': size_bytes,
+                'sha256': sha256,
+                'storage_backend': self.almacen.nombre if not contenido_existe else None,
+                'storage_key': sha256,
+                'fecha_subida': self.ahora(),
+                'area_id': area_id,
+            })
+        self.resolver(ruta)
+        if len(self.documentos) >= LOTE_DOCUMENTOS or self.bytes_lote >= LOTE_BYTES:
+            self.confirmar()
+
+    def resolver(self, ruta):
+        """Archivo terminado (importado, duplicado o inválido): no se vuelve a analizar al reanudar."""
+        self.resueltos.append({'ruta': os.path.relpath(ruta, self.raiz), 'huella': _huella(ruta)})
+
+    @staticmethod
+    def ahora():
+        return obtener_hora_chile().replace(tzinfo=None)
+
+    def confirmar(self):
+        if not self.simular and (self.documentos or self.contenidos):
+            if self.reutilizados:
+                # Contenidos ya guardados (p. ej. de documentos eliminados): el documento usa su backend
+                backends = dict(db.session.query(ContenidoArchivo.sha256, ContenidoArchivo.storage_backend)
+                                .filter(ContenidoArchivo.sha256.in_(self.reutilizados)))
+                for doc in self.documentos:
+                    if doc['storage_backend'] is None:
+                        doc['storage_backend'] = backends[doc['sha256']]
+                db.session.execute(update(ContenidoArchivo)
+                                   .where(ContenidoArchivo.sha256.in_(self.reutilizados))
+                                   .values(referencias=ContenidoArchivo.referencias + 1))
+            if self.contenidos:
+                db.session.execute(insert(ContenidoArchivo), self.contenidos)
+            db.session.execute(insert(Documento), self.documentos)
+            db.session.commit()
+
+            # IDs de lo recién insertado, para la indexación y las miniaturas
+            shas = [doc['sha256'] for doc in self.documentos]
+            ids = [fila.id for fila in db.session.query(Documento.id).filter(Documento.sha256.in_(shas))]
+            for tipo in tareas_procesamiento():
+                encolar_varios(tipo, [{'documento_id': i} for i in ids])
+            self.importados += len(self.documentos)
+            print(f"  {self.importados} documentos importados")
+
+        # El estado se escribe después del commit: si se corta antes, el lote se reintenta
+        if self.resueltos and not self.simular:
+            with open(self.ruta_estado, 'a', encoding='utf-8') as archivo:
+                for registro in self.resueltos:
+                    archivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                archivo.flush()
+                os.fsync(archivo.fileno())
+
+        self.documentos, self.contenidos, self.reutilizados, self.resueltos = [], [], [], []
+        self.bytes_lote = 0
+
+def importar(raiz, workers, crear_areas, ruta_estado, simular):
+    """Importa un árbol de carpetas (una por área) de PDF.
+
+    Los archivos se hashean y validan en paralelo; los que ya existen en el repositorio
+    (mismo sha256) se omiten. Se puede interrumpir y volver a ejecutar: lo ya resuelto
+    queda en el archivo de estado y no se vuelve a leer.
+    """
+    with app.app_context():
+        print("\n--- IMPORTACIÓN MASIVA DE DOCUMENTOS ---")
+        raiz = os.path.abspath(raiz)
+        areas = {nombre.lower(): area_id for area_id, nombre in
+                 db.session.query(AreaDocumento.id, AreaDocumento.nombre)}
+        existentes = {fila.sha256 for fila in db.session.query(Documento.sha256)
+                      .filter(Documento.sha256.isnot(None))}
+        contenidos = {fila.sha256 for fila in db.session.query(ContenidoArchivo.sha256)}
+        procesados = _cargar_estado(ruta_estado)
+
+        pendientes = [(ruta, area_id) for ruta, area_id in _recorrer(raiz, areas, crear_areas, simular)
+                      if procesados.get(os.path.relpath(ruta, raiz)) != _huella(ruta)]
+        print(f"Archivos por analizar: {len(pendientes)} (workers: {workers})")
+
+        importacion = Importacion(raiz, ruta_estado, simular)
+        area_de = dict(pendientes)
+        duplicados = invalidos = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for ruta, sha256, size_bytes, error in pool.map(_analizar, [r for r, _ in pendientes], chunksize=8):
+                if error:
+                    invalidos += 1
+                    print(f"  Inválido: {os.path.relpath(ruta, raiz)} ({error})")
+                    importacion.resolver(ruta)
+                elif sha256 in existentes:
+                    duplicados += 1
+                    importacion.resolver(ruta)
+                else:
+                    existentes.add(sha256)  # Copias dentro del mismo árbol
+                    importacion.agregar(ruta, area_de[ruta], sha256, size_bytes, sha256 in contenidos)
+        importacion.confirmar()
+
+        resumen = f"{importacion.importados} importados, {duplicados} ya existentes, {invalidos} inválidos"
+        if simular:
+            resumen = f"Simulación: {len(pendientes) - duplicados - invalidos} por importar, {duplicados} ya existentes, {invalidos} inválidos"
+        elif importacion.importados:
+            with app.test_request_context():
+                registrar_log("Gestión Documental", f"Importación masiva desde {raiz}: {resumen}")
+        print(f"¡Listo! {resumen}.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importa carpetas de PDF al repositorio (una carpeta por área).')
+    parser.add_argument('raiz', help='Carpeta con una subcarpeta por área (el nombre debe coincidir con el área).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--crear-areas', action='store_true', help='Crea las áreas que no existan.')
+    parser.add_argument('--estado', default=os.path.join(app.instance_path, 'importacion.jsonl'),
+                        help='Archivo con lo ya procesado, para reanudar una importación interrumpida.')
+    parser.add_argument('--simular', action='store_true', help='Analiza sin escribir nada.')
+    args = parser.parse_args()
+    importar(args.raiz, args.workers, args.crear_areas, args.estado, args.simular)
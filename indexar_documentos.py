@@ -0,0 +1,66 @@
+# indexar_documentos.py
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from app import create_app
+from models import db, Documento
+from utils import almacenamiento_de
+from utils.search import extraer_texto, indexar_documento, ids_indexados
+
+app = create_app()
+
+def _origen(doc):
+    """Ruta del archivo si está en disco (el proceso hijo lo lee); si no, los bytes del BLOB."""
+    almacen = almacenamiento_de(doc)
+    ruta = almacen.ruta(doc)
+    if ruta:
+        return ruta
+    archivo = almacen.abrir(doc)
+    return archivo.read() if archivo else b''
+
+def indexar_todo(workers, reconstruir):
+    """Extrae el texto de los PDF existentes en paralelo y los carga al índice de búsqueda."""
+    with app.app_context():
+        print("\n--- INDEXACIÓN DE DOCUMENTOS PARA BÚSQUEDA ---")
+
+        ya_indexados = set() if reconstruir else ids_indexados()
+        docs = db.session.query(
+            Documento.id, Documento.area_id, Documento.titulo, Documento.descripcion,
+            Documento.storage_backend, Documento.storage_key, Documento.size_bytes
+        ).order_by(Documento.id).all()
+        pendientes = [d for d in docs if d.id not in ya_indexados]
+        print(f"Documentos por indexar: {len(pendientes)} (workers: {workers})")
+
+        listos = 0
+
+        def guardar(futuro):
+            nonlocal listos
+            doc = en_vuelo.pop(futuro)
+            try:
+                indexar_documento(doc.id, doc.area_id, doc.titulo, doc.descripcion, futuro.result())
+                listos += 1
+                print(f"  [{doc.id}] {doc.titulo}")
+            except Exception as e:
+                print(f"  [{doc.id}] Error: {e}")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Ventana acotada: no se leen más BLOBs que los que el pool puede procesar
+            en_vuelo = {}
+            for doc in pendientes:
+                en_vuelo[pool.submit(extraer_texto, _origen(doc))] = doc
+                if len(en_vuelo) >= workers * 2:
+                    terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        guardar(futuro)
+            for futuro in list(en_vuelo):
+                guardar(futuro)
+
+        print(f"¡Listo! {listos} documentos indexados.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Indexa el texto de los PDF existentes.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--reconstruir', action='store_true',
+                        help='Vuelve a indexar también los documentos ya presentes en el índice.')
+    args = parser.parse_args()
+    indexar_todo(args.workers, args.reconstruir)
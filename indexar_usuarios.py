@@ -0,0 +1,16 @@
+# indexar_usuarios.py
+from app import create_app
+from utils import reindexar_usuarios
+
+app = create_app()
+
+def indexar():
+    """Genera los términos de búsqueda de los usuarios existentes (se ejecuta una vez tras
+    crear la tabla usuarios_terminos; después se mantienen solos al crear o editar)."""
+    with app.app_context():
+        print("\n--- INDEXACIÓN DE USUARIOS PARA BÚSQUEDA ---")
+        total = reindexar_usuarios()
+        print(f"¡Listo! {total} usuarios indexados.")
+
+if __name__ == '__main__':
+    indexar()
@@ -0,0 +1,48 @@
+# migrar_almacenamiento.py
+from sqlalchemy import or_
+from app import create_app
+from models import db, Documento
+from utils import migrar_legado, sincronizar_referencias, reporte_deduplicacion
+
+app = create_app()
+
+def migrar_blobs():
+    """Mueve los BLOB antiguos de documentos.archivo_data al almacenamiento deduplicado
+    del backend configurado (STORAGE_BACKEND), junto con las versiones anteriores que los usan."""
+    with app.app_context():
+        print("\n--- MIGRACIÓN DE ARCHIVOS A ALMACENAMIENTO DEDUPLICADO ---")
+
+        # 1. Registrar contenidos de archivos ya en disco y corregir contadores
+        sincronizar_referencias()
+
+        # Solo IDs: cada BLOB se carga de a uno para no llenar la memoria.
+        # Un documento reemplazado puede conservar el BLOB para su historial (ver utils/versions.py)
+        ids = [fila.id for fila in db.session.query(Documento.id)
+               .filter(or_(Documento.storage_key.is_(None), Documento.archivo_data.isnot(None)))
+               .order_by(Documento.id)]
+        print(f"Documentos por migrar: {len(ids)}")
+
+        migrados = 0
+        for doc_id in ids:
+            try:
+                contenido = migrar_legado(doc_id)
+                db.session.commit()
+                if contenido is None:
+                    print(f"  [{doc_id}] Sin datos binarios en uso, se omite.")
+                    continue
+                migrados += 1
+                estado = "reutilizado" if contenido.referencias > 1 else "nuevo"
+                print(f"  [{doc_id}] -> {contenido.storage_backend}:{contenido.sha256} ({estado})")
+            except Exception as e:
+                db.session.rollback()
+                print(f"  [{doc_id}] Error: {e}")
+            finally:
+                db.session.expunge_all()
+
+        reporte = reporte_deduplicacion()
+        print(f"¡Listo! {migrados} documentos migrados.")
+        print(f"Contenidos únicos: {reporte['contenidos']} | "
+              f"Ahorro por deduplicación: {reporte['bytes_ahorrados'] / 1024 / 1024:.2f} MB")
+
+if __name__ == '__main__':
+    migrar_blobs()
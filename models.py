@@ -1,7 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from sqlalchemy.orm import deferred
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import pytz
 
@@ -22,7 +21,8 @@ class Rol(db.Model):
 class Usuario(db.Model, UserMixin):
     __tablename__ = 'usuarios'
     id = db.Column(db.Integer, primary_key=True)
-    nombre_completo = db.Column(db.String(255), nullable=False)
+    # Índice para el autocompletado por prefijo (LIKE 'texto%')
+    nombre_completo = db.Column(db.String(255), nullable=False, index=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     activo = db.Column(db.Boolean, default=True)
@@ -36,11 +36,24 @@ class Usuario(db.Model, UserMixin):
     rol_id = db.Column(db.Integer, db.ForeignKey('roles.id'), index=True)
     rol = db.relationship('Rol', back_populates='usuarios')
 
+    # El cálculo corre en el pool de utils.passwords (import diferido: utils importa models)
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        from utils.passwords import generar_hash
+        self.password_hash = generar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        from utils.passwords import verificar_hash
+        return verificar_hash(self.password_hash, password)
+
+class UsuarioTermino(db.Model):
+    """Palabras del nombre y email en minúsculas y sin tildes, para buscar usuarios por prefijo.
+
+    Se mantiene sola al crear o editar un Usuario (ver utils/user_search.py).
+    """
+    __tablename__ = 'usuarios_terminos'
+    termino = db.Column(db.String(100), primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'),
+                           primary_key=True, index=True)
 
 class Log(db.Model):
     __tablename__ = 'logs'
@@ -53,6 +66,13 @@ class Log(db.Model):
     accion = db.Column(db.String(255), nullable=False)
     detalles = db.Column(db.Text)
 
+    __table_args__ = (
+        # Visor de logs: filtros por usuario y/o acción, ordenado por (timestamp, id) con cursor
+        db.Index('ix_logs_usuario_fecha', 'usuario_id', 'timestamp', 'id'),
+        db.Index('ix_logs_accion_fecha', 'accion', 'timestamp', 'id'),
+        db.Index('ix_logs_usuario_accion_fecha', 'usuario_id', 'accion', 'timestamp', 'id'),
+    )
+
 # --- REPOSITORIO DOCUMENTAL ---
 
 class AreaDocumento(db.Model):
@@ -78,11 +98,144 @@ class Documento(db.Model):
     size_bytes = db.Column(db.BigInteger, nullable=True) 
     sha256 = db.Column(db.String(64), nullable=True)   
     
-    # BLOB diferido
-    archivo_data = deferred(db.Column(db.LargeBinary(length=(2**32)-1)))
+    # BLOB diferido (legado: documentos subidos antes de la deduplicación).
+    # raiseload: acceder sin undefer() explícito lanza error en vez de traer el BLOB en silencio
+    archivo_data = deferred(db.Column(db.LargeBinary(length=(2**32)-1)), raiseload=True)
+
+    # Ubicación del archivo: backend + clave del ContenidoArchivo (sha256).
+    # Filas antiguas con backend 'db' y sin clave guardan el BLOB en archivo_data.
+    storage_backend = db.Column(db.String(20), nullable=False, default='db', server_default='db')
+    storage_key = db.Column(db.String(255), nullable=True)
     
     # Índices solicitados
     fecha_subida = db.Column(db.DateTime, default=obtener_hora_chile, index=True)
     area_id = db.Column(db.Integer, db.ForeignKey('areas_documentos.id'), nullable=False, index=True)
     
-    area = db.relationship('AreaDocumento', back_populates='documentos')
\ No newline at end of file
+    area = db.relationship('AreaDocumento', back_populates='documentos')
+
+    __table_args__ = (
+        # Listado por área ordenado por fecha (paginación por cursor)
+        db.Index('ix_documentos_area_fecha', 'area_id', 'fecha_subida', 'id'),
+    )
+
+class DocumentoVersion(db.Model):
+    """Versión anterior de un documento. La vigente sigue en la fila de Documento; al reemplazar
+    el archivo, la vigente se copia aquí (solo metadatos) y conserva su referencia al contenido."""
+    __tablename__ = 'documentos_versiones'
+    id = db.Column(db.Integer, primary_key=True)
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos.id', ondelete='CASCADE'), nullable=False)
+    numero = db.Column(db.Integer, nullable=False)  # 1 = primera versión del documento
+
+    version = db.Column(db.String(50), nullable=True)  # Etiqueta libre que tenía el documento
+    filename = db.Column(db.String(255), nullable=False)
+    mimetype = db.Column(db.String(100), default='application/pdf')
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    sha256 = db.Column(db.String(64), nullable=True)
+    storage_backend = db.Column(db.String(20), nullable=False)
+    # NULL: BLOB legado en documentos.archivo_data, pendiente de la tarea 'migrar_legado'
+    storage_key = db.Column(db.String(255), nullable=True)
+
+    fecha_subida = db.Column(db.DateTime, nullable=True)  # Cuando pasó a ser la vigente
+    fecha_reemplazo = db.Column(db.DateTime, default=obtener_hora_chile)
+    reemplazado_por = db.Column(db.String(255), nullable=True)
+
+    __table_args__ = (
+        # Historial de un documento, de la más reciente a la más antigua
+        db.UniqueConstraint('documento_id', 'numero', name='uq_documento_version_numero'),
+    )
+
+class ContenidoArchivo(db.Model):
+    """Payload único por sha256: varios documentos idénticos comparten el mismo archivo."""
+    __tablename__ = 'contenidos'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    storage_backend = db.Column(db.String(20), nullable=False)
+
+    # BLOB diferido (solo con backend 'db'); mismo resguardo raiseload que Documento
+    data = deferred(db.Column(db.LargeBinary(length=(2**32)-1)), raiseload=True)
+
+    # Cantidad de documentos, versiones anteriores y variantes que apuntan a este contenido; en 0 se puede purgar
+    referencias = db.Column(db.Integer, nullable=False, default=0)
+    fecha_creacion = db.Column(db.DateTime, default=obtener_hora_chile)
+
+class OptimizacionPDF(db.Model):
+    """Resultado de optimizar un contenido. El original se conserva; la variante es otro
+    ContenidoArchivo (storage_key = su sha256) al que esta fila le suma una referencia."""
+    __tablename__ = 'optimizaciones_pdf'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256_original = db.Column(db.String(64), unique=True, nullable=False)
+
+    # 'optimizado' | 'sin_ganancia' (no se guardó variante) | 'error'
+    estado = db.Column(db.String(20), nullable=False)
+    storage_backend = db.Column(db.String(20), nullable=True)
+    storage_key = db.Column(db.String(255), nullable=True)
+
+    bytes_original = db.Column(db.BigInteger, nullable=False)
+    bytes_optimizado = db.Column(db.BigInteger, nullable=True)
+    imagenes_reducidas = db.Column(db.Integer, nullable=False, default=0)
+    segundos = db.Column(db.Float, nullable=False, default=0)
+    detalle = db.Column(db.Text, nullable=True)
+    fecha = db.Column(db.DateTime, default=obtener_hora_chile)
+
+    # Los backends de almacenamiento reciben objetos con id, storage_backend, storage_key y
+    # size_bytes (como Documento): así la variante se entrega con el mismo código
+    @property
+    def size_bytes(self):
+        return self.bytes_optimizado
+
+class EstructuraPDF(db.Model):
+    """Cantidad de páginas y marcadores de un contenido, calculados una sola vez."""
+    __tablename__ = 'estructuras_pdf'
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    paginas = db.Column(db.Integer, nullable=False)
+    marcadores = db.Column(db.Text, nullable=True)  # JSON: [[nivel, título, página], ...]
+    fecha = db.Column(db.DateTime, default=obtener_hora_chile)
+
+class VerificacionIntegridad(db.Model):
+    """Última verificación de un payload (verificar_integridad.py): también es el avance entre ejecuciones."""
+    __tablename__ = 'verificaciones_integridad'
+    id = db.Column(db.Integer, primary_key=True)
+    # 'contenido' (clave = sha256) | 'documento' (BLOB legado en documentos.archivo_data, clave = id)
+    tipo = db.Column(db.String(20), nullable=False)
+    clave = db.Column(db.String(64), nullable=False)
+
+    # 'ok' | 'hash_distinto' | 'tamano_distinto' | 'faltante' | 'error'
+    estado = db.Column(db.String(20), nullable=False)
+    detalle = db.Column(db.Text, nullable=True)
+    bytes_leidos = db.Column(db.BigInteger, nullable=False, default=0)
+    segundos = db.Column(db.Float, nullable=False, default=0)
+    fecha = db.Column(db.DateTime, default=obtener_hora_chile, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('tipo', 'clave', name='uq_verificacion_tipo_clave'),
+    )
+
+# --- TAREAS EN SEGUNDO PLANO ---
+
+class Tarea(db.Model):
+    """Cola de trabajos durable; la procesa worker.py fuera del ciclo de la petición."""
+    __tablename__ = 'tareas'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=True)  # JSON
+
+    # 'pendiente' -> 'en_proceso' -> 'completada' | 'fallida' (reintentos agotados)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    max_intentos = db.Column(db.Integer, nullable=False, default=5)
+    ultimo_error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    # Señal periódica del worker mientras la ejecuta; sin señal reciente se da por caído
+    latido = db.Column(db.DateTime, nullable=True)
+
+    ejecutar_desde = db.Column(db.DateTime, default=obtener_hora_chile)
+    fecha_creacion = db.Column(db.DateTime, default=obtener_hora_chile)
+    fecha_inicio = db.Column(db.DateTime, nullable=True)
+    fecha_fin = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # El worker busca pendientes listas para ejecutar, en orden de llegada
+        db.Index('ix_tareas_estado_ejecutar', 'estado', 'ejecutar_desde', 'id'),
+    )
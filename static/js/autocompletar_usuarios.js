@@ -0,0 +1,68 @@
+// static/js/autocompletar_usuarios.js
+// Filtro de usuario del visor de logs: busca en el servidor mientras se escribe en vez de listar a todos.
+
+document.addEventListener('DOMContentLoaded', () => {
+    const entrada = document.getElementById('filtro_usuario');
+    if (!entrada) return;
+
+    const oculto = document.getElementById('filtro_usuario_id');
+    const lista = document.getElementById('sugerencias_usuario');
+    const ESPERA_MS = 250;
+    let temporizador = null;
+    let ultimaConsulta = '';
+
+    function cerrar() {
+        lista.classList.add('hidden');
+        lista.innerHTML = '';
+    }
+
+    function mostrar(usuarios) {
+        lista.innerHTML = '';
+        if (usuarios.length === 0) {
+            const vacio = document.createElement('li');
+            vacio.className = 'px-4 py-2 text-sm text-gray-500 italic';
+            vacio.textContent = 'Sin coincidencias';
+            lista.appendChild(vacio);
+        }
+        usuarios.forEach((usuario) => {
+            const item = document.createElement('li');
+            item.className = 'px-4 py-2 cursor-pointer hover:bg-blue-50';
+            const nombre = document.createElement('div');
+            nombre.className = 'text-sm font-semibold text-gray-800';
+            nombre.textContent = usuario.nombre;
+            const email = document.createElement('div');
+            email.className = 'text-xs text-gray-500';
+            email.textContent = usuario.email;
+            item.append(nombre, email);
+            item.addEventListener('mousedown', (evento) => {
+                evento.preventDefault();  // Antes del blur de la entrada
+                entrada.value = usuario.nombre;
+                oculto.value = usuario.id;
+                cerrar();
+            });
+            lista.appendChild(item);
+        });
+        lista.classList.remove('hidden');
+    }
+
+    async function consultar(texto) {
+        ultimaConsulta = texto;
+        const respuesta = await fetch(`${entrada.dataset.url}?q=${encodeURIComponent(texto)}`);
+        if (!respuesta.ok) return;
+        const usuarios = await respuesta.json();
+        if (texto === ultimaConsulta) mostrar(usuarios);  // Ignora respuestas de consultas viejas
+    }
+
+    entrada.addEventListener('input', () => {
+        oculto.value = '';  // Texto editado: deja de filtrar hasta elegir un usuario
+        clearTimeout(temporizador);
+        const texto = entrada.value.trim();
+        if (texto.length < 2) {
+            cerrar();
+            return;
+        }
+        temporizador = setTimeout(() => consultar(texto), ESPERA_MS);
+    });
+
+    entrada.addEventListener('blur', cerrar);
+});
@@ -0,0 +1,194 @@
+// static/js/subida_reanudable.js
+// Sube PDFs grandes por trozos. Si la conexión se corta, al reintentar solo se envían los trozos faltantes.
+// El sha256 se calcula antes de crear la sesión; el servidor lo compara al ensamblar el archivo.
+
+const K_SHA256 = new Uint32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+]);
+
+const rotar = (x, n) => (x >>> n) | (x << (32 - n));
+
+// SHA-256 incremental: crypto.subtle.digest exige el archivo completo en memoria
+class Sha256 {
+    constructor() {
+        this.h = new Uint32Array([0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a,
+                                  0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]);
+        this.w = new Uint32Array(64);
+        this.pendiente = new Uint8Array(64);
+        this.usados = 0;
+        this.total = 0;
+    }
+
+    update(datos) {
+        this.total += datos.length;
+        let i = 0;
+        if (this.usados) {
+            i = Math.min(64 - this.usados, datos.length);
+            this.pendiente.set(datos.subarray(0, i), this.usados);
+            this.usados += i;
+            if (this.usados < 64) return;
+            this.procesar(this.pendiente, 0);
+            this.usados = 0;
+        }
+        for (; i + 64 <= datos.length; i += 64) this.procesar(datos, i);
+        if (i < datos.length) {
+            this.pendiente.set(datos.subarray(i));
+            this.usados = datos.length - i;
+        }
+    }
+
+    hexdigest() {
+        const bits = this.total * 8;
+        const relleno = new Uint8Array((this.usados < 56 ? 64 : 128) - this.usados);
+        relleno[0] = 0x80;
+        const vista = new DataView(relleno.buffer);
+        vista.setUint32(relleno.length - 8, Math.floor(bits / 2 ** 32));
+        vista.setUint32(relleno.length - 4, bits >>> 0);
+        this.update(relleno);
+        return Array.from(this.h, (x) => x.toString(16).padStart(8, '0')).join('');
+    }
+
+    procesar(d, o) {
+        const w = this.w;
+        for (let t = 0; t < 16; t++) {
+            w[t] = (d[o + 4 * t] << 24) | (d[o + 4 * t + 1] << 16) | (d[o + 4 * t + 2] << 8) | d[o + 4 * t + 3];
+        }
+        for (let t = 16; t < 64; t++) {
+            const s0 = rotar(w[t - 15], 7) ^ rotar(w[t - 15], 18) ^ (w[t - 15] >>> 3);
+            const s1 = rotar(w[t - 2], 17) ^ rotar(w[t - 2], 19) ^ (w[t - 2] >>> 10);
+            w[t] = w[t - 16] + s0 + w[t - 7] + s1;
+        }
+        let [a, b, c, d0, e, f, g, h] = this.h;
+        for (let t = 0; t < 64; t++) {
+            const t1 = (h + (rotar(e, 6) ^ rotar(e, 11) ^ rotar(e, 25)) + ((e & f) ^ (~e & g)) + K_SHA256[t] + w[t]) | 0;
+            const t2 = ((rotar(a, 2) ^ rotar(a, 13) ^ rotar(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            h = g; g = f; f = e; e = (d0 + t1) | 0;
+            d0 = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        const suma = [a, b, c, d0, e, f, g, h];
+        for (let t = 0; t < 8; t++) this.h[t] += suma[t];
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('form-subida');
+    if (!form) return;
+
+    const umbral = parseInt(form.dataset.umbral, 10);
+    const progreso = document.getElementById('progreso-subida');
+    const csrfToken = form.querySelector('input[name="csrf_token"]').value;
+    const MAX_REINTENTOS = 5;
+    const BLOQUE_HASH = 4 * 1024 * 1024;
+    const hashes = new Map(); // Un reintento de crear la sesión no vuelve a leer el archivo
+
+    const urlSesion = (id) => form.dataset.urlSesion.replace('UPLOAD_ID', id);
+
+    function mostrarProgreso(texto) {
+        progreso.textContent = texto;
+        progreso.classList.remove('hidden');
+    }
+
+    async function pedir(url, opciones = {}) {
+        opciones.headers = Object.assign({ 'X-CSRFToken': csrfToken }, opciones.headers || {});
+        const respuesta = await fetch(url, opciones);
+        const datos = respuesta.headers.get('Content-Type')?.includes('json') ? await respuesta.json() : {};
+        if (!respuesta.ok) {
+            const error = new Error(datos.error || `Error ${respuesta.status}`);
+            error.status = respuesta.status;
+            throw error;
+        }
+        return datos;
+    }
+
+    async function conReintentos(fn) {
+        for (let intento = 1; ; intento++) {
+            try {
+                return await fn();
+            } catch (error) {
+                // Errores 4xx no se arreglan reintentando
+                if (intento >= MAX_REINTENTOS || (error.status >= 400 && error.status < 500)) throw error;
+                await new Promise((r) => setTimeout(r, 1000 * 2 ** intento));
+            }
+        }
+    }
+
+    async function calcularSha256(archivo) {
+        const hash = new Sha256();
+        for (let inicio = 0; inicio < archivo.size; inicio += BLOQUE_HASH) {
+            const bloque = await archivo.slice(inicio, inicio + BLOQUE_HASH).arrayBuffer();
+            hash.update(new Uint8Array(bloque));
+            mostrarProgreso(`Calculando sha256... ${Math.round((Math.min(inicio + BLOQUE_HASH, archivo.size) / archivo.size) * 100)}%`);
+        }
+        return hash.hexdigest();
+    }
+
+    async function obtenerSesion(archivo, clave) {
+        const guardada = localStorage.getItem(clave);
+        if (guardada) {
+            try {
+                return await pedir(urlSesion(guardada));
+            } catch (error) {
+                localStorage.removeItem(clave); // Expiró o fue limpiada: se parte de cero
+            }
+        }
+        if (!hashes.has(clave)) hashes.set(clave, await calcularSha256(archivo));
+        const sha256 = hashes.get(clave);
+        const sesion = await pedir(form.dataset.urlIniciar, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                titulo: form.elements['titulo'].value,
+                version: form.elements['version'].value,
+                descripcion: form.elements['descripcion'].value,
+                filename: archivo.name,
+                size_bytes: archivo.size,
+                sha256,
+            }),
+        });
+        localStorage.setItem(clave, sesion.upload_id);
+        return pedir(urlSesion(sesion.upload_id));
+    }
+
+    form.addEventListener('submit', async (event) => {
+        const archivo = form.elements['archivo'].files[0];
+        if (!archivo || archivo.size <= umbral) return; // Archivos pequeños: subida normal
+
+        event.preventDefault();
+        const boton = form.querySelector('button[type="submit"]');
+        boton.disabled = true;
+
+        const clave = `subida:${form.dataset.urlIniciar}:${archivo.name}:${archivo.size}:${archivo.lastModified}`;
+
+        try {
+            const estado = await conReintentos(() => obtenerSesion(archivo, clave));
+            let enviados = estado.recibidos.length;
+
+            for (const indice of estado.faltantes) {
+                const inicio = indice * estado.chunk_size;
+                const trozo = archivo.slice(inicio, inicio + estado.chunk_size);
+                await conReintentos(() => pedir(`${urlSesion(estado.upload_id)}?offset=${inicio}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: trozo,
+                }));
+                enviados++;
+                mostrarProgreso(`Subiendo... ${Math.round((enviados / estado.total_trozos) * 100)}%`);
+            }
+
+            mostrarProgreso('Verificando archivo...');
+            const final = await conReintentos(() => pedir(`${urlSesion(estado.upload_id)}/finalizar`, { method: 'POST' }));
+            localStorage.removeItem(clave);
+            window.location = final.redirect;
+        } catch (error) {
+            mostrarProgreso(`${error.message} Vuelve a presionar "Subir" para reanudar.`);
+            boton.disabled = false;
+        }
+    });
+});
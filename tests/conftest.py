@@ -0,0 +1,116 @@
+# tests/conftest.py
+"""Aplicación de prueba: SQLite y directorios en tmp_path, sin CSRF ni pool de hash.
+
+El backend de almacenamiento sale del fixture `backend` ('local' por defecto); las pruebas
+que deben pasar con ambos lo parametrizan: @pytest.mark.parametrize('backend', ['local', 'db']).
+"""
+import os
+import sys
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from pypdf import PdfWriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Rol, Usuario, AreaDocumento, Tarea  # noqa: E402
+
+EMAIL = 'admin@prueba.cl'
+CLAVE = 'Clave1234'
+
+RUTAS = {
+    'STORAGE_PATH': 'documentos',
+    'UPLOAD_TMP_PATH': 'subidas',
+    'SEARCH_INDEX_PATH': 'busqueda.sqlite',
+    'THUMBNAIL_CACHE_PATH': 'miniaturas',
+    'PAGE_CACHE_PATH': 'paginas',
+    'AUDIT_FALLBACK_PATH': 'auditoria/pendiente.jsonl',
+    'RATE_LIMIT_SQLITE_PATH': 'limites.sqlite',
+}
+
+
+@pytest.fixture
+def backend():
+    return 'local'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv('SECRET_KEY', 'pruebas')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'db.sqlite'}")
+    monkeypatch.setenv('STORAGE_BACKEND', backend)
+    monkeypatch.setenv('PASSWORD_HASH_WORKERS', '0')
+    monkeypatch.setenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setenv('IDENTITY_CACHE_TTL', '0')
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    for variable, nombre in RUTAS.items():
+        monkeypatch.setenv(variable, str(tmp_path / nombre))
+    os.makedirs(tmp_path / 'auditoria')
+
+    aplicacion = create_app()
+    aplicacion.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with aplicacion.app_context():
+        db.create_all()
+        for nombre in ('Admin', 'Director', 'Visualizador'):
+            db.session.add(Rol(nombre=nombre))
+        db.session.flush()
+        usuario = Usuario(nombre_completo='Admin Prueba', email=EMAIL, rol_id=1, activo=True)
+        usuario.set_password(CLAVE)
+        db.session.add_all([usuario, AreaDocumento(nombre='Área de prueba')])
+        db.session.commit()
+
+    yield aplicacion
+
+    with aplicacion.app_context():
+        aplicacion.extensions['auditoria'].vaciar()
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def cliente(app):
+    """Cliente con sesión iniciada como administrador."""
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'email': EMAIL, 'password': CLAVE})
+    assert respuesta.status_code == 302
+    return cliente
+
+
+def crear_pdf(texto, paginas=1):
+    """PDF mínimo y distinto por `texto` (va en los metadatos)."""
+    escritor = PdfWriter()
+    for _ in range(paginas):
+        escritor.add_blank_page(612, 792)
+    escritor.add_metadata({'/Title': texto})
+    salida = BytesIO()
+    escritor.write(salida)
+    return salida.getvalue()
+
+
+def crear_pdf_escaneado(paginas=2):
+    """PDF de imágenes JPEG grandes, como un escaneo: la optimización lo reduce."""
+    imagen = Image.effect_noise((2200, 2800), 40).convert('RGB')
+    salida = BytesIO()
+    imagen.save(salida, 'PDF', save_all=True, append_images=[imagen] * (paginas - 1), quality=95)
+    return salida.getvalue()
+
+
+def subir(cliente, contenido, titulo='Documento', nombre='archivo.pdf', area_id=1):
+    return cliente.post(f'/admin/area/{area_id}/documentos',
+                        data={'titulo': titulo, 'archivo': (BytesIO(contenido), nombre)},
+                        content_type='multipart/form-data')
+
+
+def ejecutar_pendientes(tipos=None):
+    """Corre las tareas pendientes en este proceso, como lo haría worker.py (con app_context)."""
+    from utils.jobs import reclamar_tareas, ejecutar_tarea
+
+    if tipos is not None:
+        # Las demás no interesan a la prueba: se descartan para no depender de su resultado
+        Tarea.query.filter(Tarea.tipo.notin_(tipos), Tarea.estado == 'pendiente') \
+            .update({'estado': 'completada'}, synchronize_session=False)
+        db.session.commit()
+    for tarea_id in reclamar_tareas(100):
+        ejecutar_tarea(tarea_id)
@@ -0,0 +1,136 @@
+# tests/test_almacenamiento.py
+"""Entrega, deduplicación y purga de contenidos con ambos backends."""
+import os
+from collections import namedtuple
+from unittest import mock
+
+import pytest
+from sqlalchemy.orm import Query
+
+from conftest import crear_pdf, subir
+from models import db, Documento, ContenidoArchivo
+from utils.storage import obtener_almacenamiento, purgar_contenido, soltar_contenido
+
+pytestmark = pytest.mark.parametrize('backend', ['local', 'db'])
+
+
+Ubicacion = namedtuple('Ubicacion', ['id', 'storage_backend', 'storage_key', 'size_bytes'])
+
+
+def _documentos():
+    return Documento.query.order_by(Documento.id).all()
+
+
+def _leer(backend, clave):
+    return b''.join(obtener_almacenamiento(backend).iterar(Ubicacion(None, backend, clave, None)))
+
+
+def test_ver_y_descargar_con_rango_y_condicional(app, cliente):
+    contenido = crear_pdf('entrega', paginas=3)
+    assert subir(cliente, contenido, nombre='entrega.pdf').status_code == 302
+    with app.app_context():
+        doc = _documentos()[0]
+        assert doc.storage_key == doc.sha256
+
+    respuesta = cliente.get(f'/documento/{doc.id}/ver')
+    assert respuesta.status_code == 200
+    assert respuesta.data == contenido
+    etag = respuesta.headers['ETag']
+
+    parcial = cliente.get(f'/documento/{doc.id}/descargar', headers={'Range': 'bytes=0-99'})
+    assert parcial.status_code == 206
+    assert parcial.data == contenido[:100]
+    assert parcial.headers['Content-Range'] == f'bytes 0-99/{len(contenido)}'
+    assert 'attachment' in parcial.headers['Content-Disposition']
+
+    assert cliente.get(f'/documento/{doc.id}/ver', headers={'If-None-Match': etag}).status_code == 304
+    fuera = cliente.get(f'/documento/{doc.id}/ver', headers={'Range': f'bytes={len(contenido) + 10}-'})
+    assert fuera.status_code == 416
+    fuera.close()
+
+
+def test_contenido_identico_se_guarda_una_vez(app, cliente, backend):
+    contenido = crear_pdf('duplicado')
+    subir(cliente, contenido, titulo='Uno')
+    subir(cliente, contenido, titulo='Dos')
+    with app.app_context():
+        uno, dos = _documentos()
+        assert uno.storage_key == dos.storage_key
+        fila = ContenidoArchivo.query.one()
+        assert (fila.referencias, fila.storage_backend) == (2, backend)
+        ruta = obtener_almacenamiento(backend).ruta(uno)
+        assert (ruta is not None) == (backend == 'local')
+
+
+def test_primera_subida_simultanea_suma_referencia(app, cliente, backend):
+    """La otra subida insertó el contenido después de nuestra lectura: el SAVEPOINT falla por el
+    sha256 único y se suma una referencia a su fila."""
+    contenido = crear_pdf('simultaneo')
+    subir(cliente, contenido, titulo='Uno')
+    original = Query.first
+
+    def lectura_anterior_al_insert(self):
+        if self.column_descriptions[0]['entity'] is ContenidoArchivo:
+            return None
+        return original(self)
+
+    with mock.patch.object(Query, 'first', lectura_anterior_al_insert):
+        assert subir(cliente, contenido, titulo='Dos').status_code == 302
+    with app.app_context():
+        uno, dos = _documentos()
+        assert uno.storage_key == dos.storage_key
+        assert ContenidoArchivo.query.one().referencias == 2
+    assert cliente.get(f'/documento/{dos.id}/descargar').data == contenido
+
+
+def test_purga_solo_sin_referencias(app, cliente, backend):
+    contenido = crear_pdf('purga')
+    subir(cliente, contenido, titulo='Uno')
+    subir(cliente, contenido, titulo='Dos')
+    with app.app_context():
+        uno, dos = _documentos()
+        ruta = obtener_almacenamiento(backend).ruta(uno)
+
+    cliente.post(f'/admin/documento/eliminar/{uno.id}')
+    with app.app_context():
+        assert ContenidoArchivo.query.one().referencias == 1
+    assert cliente.get(f'/documento/{dos.id}/ver').data == contenido
+
+    cliente.post(f'/admin/documento/eliminar/{dos.id}')
+    with app.app_context():
+        assert ContenidoArchivo.query.count() == 0
+    if ruta:
+        assert not os.path.exists(ruta)
+
+
+def test_purga_respeta_referencia_nueva(app, cliente):
+    """Si otra subida volvió a referenciar el contenido antes de purgar, no se borra nada."""
+    contenido = crear_pdf('carrera')
+    subir(cliente, contenido)
+    with app.app_context():
+        doc = _documentos()[0]
+        backend_doc, clave = soltar_contenido(doc)
+        db.session.delete(doc)
+        db.session.commit()
+        ContenidoArchivo.query.filter_by(sha256=clave).update({'referencias': 1})
+        db.session.commit()
+
+        purgar_contenido(backend_doc, clave)
+        assert ContenidoArchivo.query.filter_by(sha256=clave).one().referencias == 1
+        assert _leer(backend_doc, clave) == contenido
+
+
+def test_commit_fallido_devuelve_el_archivo(app, cliente):
+    contenido = crear_pdf('rollback')
+    subir(cliente, contenido)
+    with app.app_context():
+        doc = _documentos()[0]
+        backend_doc, clave = soltar_contenido(doc)
+        db.session.delete(doc)
+        db.session.commit()
+
+        with mock.patch.object(db.session, 'commit', side_effect=RuntimeError('base caída')):
+            purgar_contenido(backend_doc, clave)
+
+        assert ContenidoArchivo.query.filter_by(sha256=clave).count() == 1
+        assert _leer(backend_doc, clave) == contenido
@@ -0,0 +1,119 @@
+# tests/test_auditoria.py
+"""Respaldo en archivo de la auditoría: reinserción, líneas cortadas y reclamos huérfanos."""
+import json
+import os
+import subprocess
+import sys
+import time
+from unittest import mock
+
+import pytest
+
+from models import Log
+from utils.audit import BufferAuditoria
+
+
+def _evento(accion):
+    return {'usuario_id': None, 'usuario_nombre': 'Prueba', 'accion': accion,
+            'detalles': None, 'timestamp': '2026-10-18T10:00:00'}
+
+
+def _linea(accion):
+    return json.dumps(_evento(accion)) + '\n'
+
+
+@pytest.fixture
+def buffer(app):
+    buffer = BufferAuditoria(app)
+    buffer._pid = os.getpid()  # Sin hilo: las pruebas llaman a vaciar() directamente
+    return buffer
+
+
+@pytest.fixture
+def ruta(app):
+    return app.config['AUDIT_FALLBACK_PATH']
+
+
+def _acciones(app):
+    with app.app_context():
+        return sorted(log.accion for log in Log.query)
+
+
+def _pid_terminado():
+    proceso = subprocess.Popen([sys.executable, '-c', 'pass'])
+    proceso.wait()
+    return proceso.pid
+
+
+def test_respaldo_se_reinserta_y_aparta_lineas_cortadas(app, buffer, ruta):
+    with open(ruta, 'w') as archivo:
+        archivo.write(_linea('respaldada'))
+        archivo.write('{"usuario_id": nul')  # Escritura cortada por una caída
+
+    buffer.agregar(_evento('nueva'))
+    buffer.vaciar()
+
+    assert _acciones(app) == ['nueva', 'respaldada']
+    assert open(f'{ruta}.corrupto').read() == '{"usuario_id": nul\n'
+    assert sorted(os.listdir(os.path.dirname(ruta))) == [os.path.basename(ruta) + '.corrupto']
+
+
+def test_reclamos_huerfanos_se_reinsertan_al_arrancar(app, buffer, ruta):
+    with open(f'{ruta}.{_pid_terminado()}.1', 'w') as archivo:
+        archivo.write(_linea('proceso-muerto'))
+    with open(f'{ruta}.{os.getpid()}.1', 'w') as archivo:
+        archivo.write(_linea('mismo-pid-tras-reinicio'))
+    vivo = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    try:
+        with open(f'{ruta}.{vivo.pid}.1', 'w') as archivo:
+            archivo.write(_linea('proceso-vivo'))
+
+        buffer.vaciar()
+        assert _acciones(app) == ['mismo-pid-tras-reinicio', 'proceso-muerto']
+        # El reclamo de un proceso vivo es suyo: no se toca
+        assert os.listdir(os.path.dirname(ruta)) == [os.path.basename(f'{ruta}.{vivo.pid}.1')]
+    finally:
+        vivo.kill()
+        vivo.wait()
+
+
+def test_base_caida_va_al_respaldo_y_luego_se_reinserta(app, buffer, ruta):
+    buffer.agregar(_evento('durante-caida'))
+    with mock.patch('utils.audit._fila', side_effect=RuntimeError('base caída')):
+        buffer.vaciar()
+    assert _acciones(app) == []
+    assert open(ruta).read() == _linea('durante-caida')
+
+    buffer.vaciar()
+    assert _acciones(app) == ['durante-caida']
+    assert not os.path.exists(ruta)
+
+
+def test_sin_base_ni_respaldo_los_eventos_vuelven_al_buffer(app, buffer, ruta):
+    buffer.agregar(_evento('retenido'))
+    with mock.patch('utils.audit._fila', side_effect=RuntimeError('base caída')), \
+            mock.patch.object(buffer, '_escribir_respaldo', side_effect=OSError('disco lleno')):
+        buffer.vaciar()
+    assert [e['accion'] for e in buffer._eventos] == ['retenido']
+
+    buffer.vaciar()
+    assert _acciones(app) == ['retenido']
+    assert buffer._eventos == []
+
+
+def test_el_hilo_sobrevive_a_un_error(app):
+    buffer = BufferAuditoria(app)
+    buffer.intervalo = 0.01
+    llamadas = []
+
+    def vaciar_con_error():
+        llamadas.append(1)
+        raise RuntimeError('error inesperado')
+
+    buffer.vaciar = vaciar_con_error
+    buffer.agregar(_evento('x'))
+    limite = time.monotonic() + 5
+    while len(llamadas) < 3 and time.monotonic() < limite:
+        time.sleep(0.01)
+    buffer.vaciar = lambda: None  # El hilo es daemon: queda en silencio hasta que termine pytest
+    assert len(llamadas) >= 3
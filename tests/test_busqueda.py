@@ -0,0 +1,52 @@
+# tests/test_busqueda.py
+"""Índice de búsqueda: el rowid es el id del documento y los índices antiguos se migran."""
+import sqlite3
+
+import pytest
+
+from utils.search import (indexar_documento, actualizar_metadatos_indice, eliminar_del_indice,
+                          ids_indexados, buscar)
+
+
+@pytest.fixture
+def contexto(app):
+    with app.app_context():
+        yield
+
+
+def _ids(texto):
+    return sorted(r.documento_id for r in buscar(texto)[0])
+
+
+def test_indexar_actualizar_y_eliminar_por_id(contexto):
+    indexar_documento(7, 1, 'Reglamento interno', '', 'texto de calibración')
+    indexar_documento(9, 2, 'Manual', '', 'texto de calibración')
+    indexar_documento(7, 1, 'Reglamento interno', '', 'versión nueva')  # Reemplaza, no duplica
+    assert ids_indexados() == {7, 9}
+    assert _ids('calibracion') == [9]
+
+    actualizar_metadatos_indice(9, 3, 'Manual de equipos', 'bodega')
+    resultado, total = buscar('bodega')
+    assert total == 1
+    assert (resultado[0].documento_id, resultado[0].area_id, resultado[0].titulo) == (9, 3, 'Manual de equipos')
+
+    eliminar_del_indice([7])
+    assert ids_indexados() == {9}
+    assert _ids('nueva') == []
+
+
+def test_indice_con_columna_documento_id_se_migra(app):
+    ruta = app.config['SEARCH_INDEX_PATH']
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("CREATE VIRTUAL TABLE documentos_fts USING fts5(titulo, descripcion, contenido, "
+                     "documento_id UNINDEXED, area_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')")
+    conexion.execute("INSERT INTO documentos_fts (rowid, titulo, descripcion, contenido, documento_id, area_id) "
+                     "VALUES (1, 'Protocolo', '', 'emergencias', 42, 5)")
+    conexion.commit()
+    conexion.close()
+
+    with app.app_context():
+        assert ids_indexados() == {42}
+        assert [(r.documento_id, r.area_id) for r in buscar('emergencias')[0]] == [(42, 5)]
+        eliminar_del_indice([42])
+        assert ids_indexados() == set()
@@ -0,0 +1,64 @@
+# tests/test_consultas.py
+"""Listados por cursor y conteo cacheado del visor de logs."""
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+import utils.queries as queries
+from models import db, Documento, Log
+
+
+@pytest.fixture
+def contexto(app):
+    queries._conteos_logs.clear()
+    with app.app_context():
+        yield
+
+
+def test_cache_de_conteos_tiene_tope(contexto):
+    with mock.patch.object(queries, 'MAX_CONTEOS_CACHE', 3):
+        for numero in range(10):
+            queries.contar_logs(accion=f'accion-{numero}')
+    assert list(queries._conteos_logs) == [(None, 'accion-7'), (None, 'accion-8'), (None, 'accion-9')]
+
+
+def test_cache_de_conteos_descarta_vencidos_al_escribir(contexto):
+    queries.contar_logs(accion='vieja')
+    instante, total = queries._conteos_logs[(None, 'vieja')]
+    queries._conteos_logs[(None, 'vieja')] = (instante - queries.SEGUNDOS_CACHE_CONTEO, total)
+    queries.contar_logs(accion='nueva')
+    assert list(queries._conteos_logs) == [(None, 'nueva')]
+
+
+def _paginas(listar, limite=2):
+    vistos, cursor = [], None
+    while True:
+        pagina = listar(cursor, limite)
+        vistos.extend(fila.id for fila in pagina[0])
+        cursor = pagina.cursor_siguiente
+        if not cursor:
+            return vistos
+
+
+def test_cursor_recorre_documentos_sin_fecha(contexto):
+    fechas = [datetime(2026, 1, 1), None, datetime(2026, 3, 1), None, None, datetime(2026, 2, 1)]
+    for numero, fecha in enumerate(fechas, 1):
+        db.session.add(Documento(titulo=f'Doc {numero}', filename='a.pdf', area_id=1))
+        db.session.flush()
+        Documento.query.filter_by(id=numero).update({'fecha_subida': fecha})
+    db.session.commit()
+
+    vistos = _paginas(lambda cursor, limite: queries.listar_documentos(1, cursor=cursor, limite=limite))
+    assert vistos == [3, 6, 1, 5, 4, 2]
+
+
+def test_cursor_recorre_logs_sin_fecha(contexto):
+    for numero in range(1, 6):
+        db.session.add(Log(accion='Prueba', timestamp=datetime(2026, 1, numero)))
+    db.session.commit()
+    Log.query.filter(Log.id.in_([2, 4])).update({'timestamp': None})
+    db.session.commit()
+
+    vistos = _paginas(lambda cursor, limite: queries.listar_logs(cursor=cursor, limite=limite))
+    assert vistos == [5, 3, 1, 4, 2]
@@ -0,0 +1,58 @@
+# tests/test_contrasenas.py
+"""Pool de hash saturado (HashOcupado): las vistas responden 503 en vez de 500."""
+from unittest import mock
+
+import pytest
+
+import utils.passwords as passwords
+from conftest import EMAIL, CLAVE
+from models import db, Usuario
+
+
+@pytest.fixture
+def ocupado():
+    with mock.patch.object(passwords, 'generar_hash', side_effect=passwords.HashOcupado()):
+        yield
+
+
+def test_rehash_tras_login_se_omite_si_el_pool_esta_ocupado(app):
+    with app.app_context():
+        usuario = Usuario.query.filter_by(email=EMAIL).one()
+        antiguo = passwords.generate_password_hash(CLAVE, method='pbkdf2:sha256:1')
+        usuario.password_hash = antiguo
+        db.session.commit()
+
+    cliente = app.test_client()
+    with mock.patch.object(passwords, 'generar_hash', side_effect=passwords.HashOcupado()):
+        assert cliente.post('/login', data={'email': EMAIL, 'password': CLAVE}).status_code == 302
+    with app.app_context():
+        assert Usuario.query.filter_by(email=EMAIL).one().password_hash == antiguo
+
+    # Con cupo, el siguiente ingreso actualiza el hash
+    cliente.get('/logout')
+    cliente.post('/login', data={'email': EMAIL, 'password': CLAVE})
+    with app.app_context():
+        assert Usuario.query.filter_by(email=EMAIL).one().password_hash != antiguo
+
+
+def test_crear_usuario_con_pool_ocupado(app, cliente, ocupado):
+    respuesta = cliente.post('/admin/crear_usuario', data={
+        'nombre_completo': 'Nuevo', 'email': 'nuevo@prueba.cl', 'password': 'Clave1234', 'rol_id': '2'})
+    assert respuesta.status_code == 503
+    with app.app_context():
+        assert Usuario.query.filter_by(email='nuevo@prueba.cl').first() is None
+
+
+def test_editar_usuario_con_pool_ocupado_no_guarda_cambios(app, cliente, ocupado):
+    respuesta = cliente.post('/admin/editar_usuario/1', data={
+        'nombre_completo': 'Otro Nombre', 'email': EMAIL, 'password': 'Nueva1234', 'rol_id': '1'})
+    assert respuesta.status_code == 503
+    with app.app_context():
+        assert db.session.get(Usuario, 1).nombre_completo == 'Admin Prueba'
+
+
+def test_fuera_de_una_peticion_no_se_usa_el_pool(app):
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+    with app.app_context():
+        assert passwords.verificar_hash(passwords.generar_hash('abc'), 'abc')
+    assert passwords._pool is None
@@ -0,0 +1,45 @@
+# tests/test_limite_intentos.py
+"""Límite de intentos de login: solo cuentan los fallos y un rechazo no gasta cupo."""
+import pytest
+
+from conftest import EMAIL, CLAVE
+
+pytestmark = pytest.mark.parametrize('limitador', ['memoria', 'sqlite'])
+
+
+@pytest.fixture
+def cliente_anonimo(app, limitador):
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_BACKEND=limitador,
+                      RATE_LIMIT_LOGIN_IP='6/300', RATE_LIMIT_LOGIN_EMAIL='3/900')
+    return app.test_client()
+
+
+def _login(cliente, clave, email=EMAIL):
+    return cliente.post('/login', data={'email': email, 'password': clave})
+
+
+def _espera(app, clave, limite, ventana):
+    with app.test_request_context():
+        return app.extensions['limitador'].espera(clave, limite, ventana)
+
+
+def test_ingresos_correctos_no_cuentan(app, cliente_anonimo):
+    for _ in range(8):
+        assert _login(cliente_anonimo, CLAVE).status_code == 302
+        cliente_anonimo.get('/logout')
+
+
+def test_fallos_por_email(app, cliente_anonimo):
+    assert [_login(cliente_anonimo, 'mala').status_code for _ in range(4)] == [200, 200, 200, 429]
+    respuesta = _login(cliente_anonimo, CLAVE)
+    assert respuesta.status_code == 429
+    assert int(respuesta.headers['Retry-After']) > 0
+
+
+def test_rechazo_por_email_no_gasta_cupo_de_ip(app, cliente_anonimo):
+    for _ in range(5):
+        _login(cliente_anonimo, 'mala')
+    # 3 fallos registrados (IP y email); los 2 rechazos no se sumaron a la IP
+    assert _espera(app, 'LOGIN:ip:127.0.0.1', 4, 300) == 0
+    assert _espera(app, 'LOGIN:ip:127.0.0.1', 3, 300) > 0
+    assert _login(cliente_anonimo, 'mala', email='otro@prueba.cl').status_code == 200
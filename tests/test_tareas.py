@@ -0,0 +1,108 @@
+# tests/test_tareas.py
+"""Cola de tareas: reintentos con espera, recuperación de tareas sin latido y limpieza."""
+from datetime import timedelta
+
+import pytest
+
+from models import db, Tarea
+from utils.jobs import (tarea, encolar, encolar_unica, reclamar_tareas, ejecutar_tarea, marcar_latido,
+                        recuperar_tareas_colgadas, limpiar_tareas_completadas, reintentar_tarea, _ahora)
+
+ejecutadas = []
+
+
+@tarea('prueba_ok')
+def _tarea_ok(valor):
+    ejecutadas.append(valor)
+
+
+@tarea('prueba_falla')
+def _tarea_falla():
+    raise RuntimeError('falla de prueba')
+
+
+@pytest.fixture
+def contexto(app):
+    ejecutadas.clear()
+    with app.app_context():
+        yield
+
+
+def _colgada(**valores):
+    hace_rato = _ahora() - timedelta(hours=1)
+    registro = Tarea(tipo='prueba_ok', payload='{"valor": 1}', estado='en_proceso', worker='caido:1',
+                     fecha_inicio=hace_rato, latido=hace_rato, **valores)
+    db.session.add(registro)
+    db.session.commit()
+    return registro.id
+
+
+def test_completa_y_no_se_reclama_dos_veces(contexto):
+    tarea_id = encolar('prueba_ok', valor=7)
+    assert reclamar_tareas(10) == [tarea_id]
+    assert reclamar_tareas(10) == []
+    ejecutar_tarea(tarea_id)
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos, ejecutadas) == ('completada', 1, [7])
+
+
+def test_error_programa_reintento_y_agota_intentos(contexto):
+    tarea_id = encolar('prueba_falla', max_intentos=2)
+    reclamar_tareas(10)
+    ejecutar_tarea(tarea_id)
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos) == ('pendiente', 1)
+    assert 'falla de prueba' in registro.ultimo_error
+    assert registro.ejecutar_desde > _ahora()
+    assert reclamar_tareas(10) == []  # Aún en espera
+
+    registro.ejecutar_desde = _ahora()
+    db.session.commit()
+    reclamar_tareas(10)
+    ejecutar_tarea(tarea_id)
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos) == ('fallida', 2)
+
+    assert reintentar_tarea(tarea_id)
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos) == ('pendiente', 0)
+
+
+def test_sin_latido_vuelve_a_la_cola_contando_el_intento(contexto):
+    tarea_id = _colgada(intentos=0, max_intentos=5)
+    assert recuperar_tareas_colgadas() == 1
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos) == ('pendiente', 1)
+    assert 'caido:1' in registro.ultimo_error
+    assert registro.ejecutar_desde > _ahora()
+
+
+def test_tarea_que_mata_al_worker_termina_fallida(contexto):
+    tarea_id = _colgada(intentos=4, max_intentos=5)
+    recuperar_tareas_colgadas()
+    registro = db.session.get(Tarea, tarea_id)
+    assert (registro.estado, registro.intentos) == ('fallida', 5)
+    assert registro.fecha_fin is not None
+
+
+def test_latido_reciente_no_se_recupera(contexto):
+    tarea_id = _colgada(intentos=0)
+    marcar_latido([tarea_id])
+    assert recuperar_tareas_colgadas() == 0
+    assert db.session.get(Tarea, tarea_id).estado == 'en_proceso'
+
+
+def test_limpieza_borra_solo_completadas_antiguas(contexto):
+    antigua = Tarea(tipo='prueba_ok', estado='completada', fecha_fin=_ahora() - timedelta(days=30))
+    reciente = Tarea(tipo='prueba_ok', estado='completada', fecha_fin=_ahora())
+    fallida = Tarea(tipo='prueba_ok', estado='fallida', fecha_fin=_ahora() - timedelta(days=30))
+    db.session.add_all([antigua, reciente, fallida])
+    db.session.commit()
+    assert limpiar_tareas_completadas() == 1
+    assert sorted(t.estado for t in Tarea.query) == ['completada', 'fallida']
+
+
+def test_encolar_unica_no_duplica_pendientes(contexto):
+    primera = encolar_unica('prueba_ok', valor=1)
+    assert encolar_unica('prueba_ok', valor=1) == primera
+    assert encolar_unica('prueba_ok', valor=2) != primera
@@ -0,0 +1,68 @@
+# tests/test_variantes.py
+"""Variante optimizada de un PDF escaneado: se entrega en lugar del original con ambos backends."""
+from io import BytesIO
+
+import pytest
+from pypdf import PdfReader
+
+from conftest import crear_pdf_escaneado, subir, ejecutar_pendientes
+from models import db, Documento, ContenidoArchivo, OptimizacionPDF
+
+pytestmark = pytest.mark.parametrize('backend', ['local', 'db'])
+
+
+@pytest.fixture
+def escaneado(app, cliente):
+    """(documento, bytes originales, variante) con la optimización ya ejecutada."""
+    original = crear_pdf_escaneado(paginas=2)
+    subir(cliente, original, nombre='escaneo.pdf')
+    with app.app_context():
+        ejecutar_pendientes(tipos=['optimizar_pdf'])
+        doc = Documento.query.one()
+        variante = OptimizacionPDF.query.filter_by(sha256_original=doc.storage_key).one()
+        assert variante.estado == 'optimizado', variante.detalle
+        db.session.expunge_all()
+    return doc, original, variante
+
+
+def test_ver_entrega_la_variante(cliente, escaneado):
+    doc, original, variante = escaneado
+    respuesta = cliente.get(f'/documento/{doc.id}/ver')
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] == f'"{variante.storage_key}"'
+    assert len(respuesta.data) == variante.bytes_optimizado < len(original)
+    assert len(PdfReader(BytesIO(respuesta.data)).pages) == 2
+
+    condicional = cliente.get(f'/documento/{doc.id}/ver', headers={'If-None-Match': respuesta.headers['ETag']})
+    assert condicional.status_code == 304
+
+
+def test_descarga_parcial_de_la_variante(cliente, escaneado):
+    doc, _, variante = escaneado
+    completa = cliente.get(f'/documento/{doc.id}/descargar').data
+    parcial = cliente.get(f'/documento/{doc.id}/descargar', headers={'Range': 'bytes=10-19'})
+    assert parcial.status_code == 206
+    assert parcial.data == completa[10:20]
+    assert parcial.headers['Content-Range'] == f'bytes 10-19/{variante.bytes_optimizado}'
+    assert 'escaneo.pdf' in parcial.headers['Content-Disposition']
+
+
+def test_original_sigue_disponible(cliente, escaneado):
+    doc, original, _ = escaneado
+    respuesta = cliente.get(f'/documento/{doc.id}/ver?original=1')
+    assert respuesta.status_code == 200
+    assert respuesta.data == original
+
+
+def test_paginas_desde_la_variante(cliente, escaneado):
+    doc, _, _ = escaneado
+    respuesta = cliente.get(f'/documento/{doc.id}/paginas?desde=2&hasta=2')
+    assert respuesta.status_code == 200
+    assert len(PdfReader(BytesIO(respuesta.data)).pages) == 1
+
+
+def test_eliminar_documento_purga_la_variante(app, cliente, escaneado):
+    doc, _, _ = escaneado
+    cliente.post(f'/admin/documento/eliminar/{doc.id}')
+    with app.app_context():
+        assert ContenidoArchivo.query.count() == 0
@@ -0,0 +1,150 @@
+# tests/test_versiones.py
+"""Historial de versiones: reemplazo, restauración, numeración y BLOB legado, con ambos backends."""
+from io import BytesIO
+from unittest import mock
+
+import pytest
+from sqlalchemy.orm import Query
+
+from conftest import crear_pdf, subir, ejecutar_pendientes
+from models import db, Documento, DocumentoVersion, ContenidoArchivo, Tarea
+
+pytestmark = pytest.mark.parametrize('backend', ['local', 'db'])
+
+A, B, C = crear_pdf('uno'), crear_pdf('dos'), crear_pdf('tres')
+
+
+def _editar(cliente, doc_id, contenido, nombre='nuevo.pdf'):
+    return cliente.post(f'/admin/documento/editar/{doc_id}',
+                        data={'titulo': 'Reglamento', 'archivo': (BytesIO(contenido), nombre)},
+                        content_type='multipart/form-data')
+
+
+def _referencias():
+    return sorted(fila.referencias for fila in ContenidoArchivo.query)
+
+
+def _numeros():
+    return [(v.numero, v.filename) for v in DocumentoVersion.query.order_by(DocumentoVersion.numero)]
+
+
+def test_reemplazar_y_restaurar(app, cliente):
+    subir(cliente, A, titulo='Reglamento', nombre='a.pdf')
+    _editar(cliente, 1, B, 'b.pdf')
+    _editar(cliente, 1, C, 'c.pdf')
+    with app.app_context():
+        assert _numeros() == [(1, 'a.pdf'), (2, 'b.pdf')]
+        assert _referencias() == [1, 1, 1]
+
+    assert cliente.get('/documento/1/descargar').data == C
+    assert cliente.get('/admin/documento/1/versiones/1/descargar').data == A
+    assert cliente.get('/admin/documento/1/versiones').status_code == 200
+
+    cliente.post('/admin/documento/1/versiones/1/restaurar')
+    assert cliente.get('/documento/1/descargar').data == A
+    with app.app_context():
+        assert _numeros() == [(1, 'a.pdf'), (2, 'b.pdf'), (3, 'c.pdf')]
+        # A: el documento y la versión 1
+        assert _referencias() == [1, 1, 2]
+
+    cliente.post('/admin/documento/eliminar/1')
+    with app.app_context():
+        assert ContenidoArchivo.query.count() == 0
+        assert DocumentoVersion.query.count() == 0
+
+
+def test_archivo_identico_no_crea_version(app, cliente):
+    subir(cliente, A, titulo='Reglamento')
+    _editar(cliente, 1, A, 'otro_nombre.pdf')
+    with app.app_context():
+        assert DocumentoVersion.query.count() == 0
+        assert db.session.get(Documento, 1).filename == 'otro_nombre.pdf'
+
+
+def test_reemplazo_actualiza_validadores(app, cliente):
+    subir(cliente, A, titulo='Reglamento')
+    with app.app_context():
+        # Fecha de subida en el pasado: el reemplazo debe moverla a "ahora"
+        documento = db.session.get(Documento, 1)
+        documento.fecha_subida = documento.fecha_subida.replace(year=2020)
+        db.session.commit()
+    vieja = cliente.get('/documento/1/descargar')
+    vieja.close()
+
+    _editar(cliente, 1, B)
+    nueva = cliente.get('/documento/1/descargar', headers={'If-Range': vieja.headers['Last-Modified'],
+                                                         'Range': 'bytes=0-9'})
+    # If-Range con la fecha anterior no coincide: se entrega el archivo nuevo completo
+    assert nueva.status_code == 200
+    assert nueva.data == B
+    assert nueva.headers['Last-Modified'] != vieja.headers['Last-Modified']
+    assert nueva.headers['ETag'] != vieja.headers['ETag']
+
+
+def test_numero_repetido_se_reintenta(app, cliente):
+    """Otra edición simultánea tomó el número: el SAVEPOINT falla y se usa el siguiente."""
+    subir(cliente, A, titulo='Reglamento', nombre='a.pdf')
+    _editar(cliente, 1, B, 'b.pdf')
+
+    original = Query.with_for_update
+    llamadas = []
+
+    def lectura_desactualizada(self, *args, **kwargs):
+        consulta = original(self, *args, **kwargs)
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            return mock.Mock(scalar=mock.Mock(return_value=0))
+        return consulta
+
+    with mock.patch.object(Query, 'with_for_update', lectura_desactualizada):
+        assert _editar(cliente, 1, C, 'c.pdf').status_code == 302
+    assert len(llamadas) == 2
+    with app.app_context():
+        assert _numeros() == [(1, 'a.pdf'), (2, 'b.pdf')]
+        assert db.session.get(Documento, 1).filename == 'c.pdf'
+
+
+def test_blob_legado_se_migra_en_segundo_plano(app, cliente, backend):
+    with app.app_context():
+        db.session.add(Documento(titulo='Legado', filename='legado.pdf', size_bytes=len(A), area_id=1,
+                                 storage_backend='db', archivo_data=A))
+        db.session.commit()
+
+    _editar(cliente, 1, B)
+    with app.app_context():
+        # La petición no copió el BLOB: solo existe el contenido nuevo
+        assert [f.sha256 for f in ContenidoArchivo.query] == [db.session.get(Documento, 1).sha256]
+        version = DocumentoVersion.query.one()
+        assert (version.storage_backend, version.storage_key) == ('db', None)
+        assert Tarea.query.filter_by(tipo='migrar_legado').count() == 1
+    assert cliente.get('/admin/documento/1/versiones/1/descargar').data == A
+
+    with app.app_context():
+        ejecutar_pendientes(tipos=['migrar_legado'])
+        assert Tarea.query.filter_by(tipo='migrar_legado').one().estado == 'completada'
+        version = DocumentoVersion.query.one()
+        assert (version.storage_backend, version.storage_key) == (backend, version.sha256)
+        assert db.session.query(Documento.archivo_data).filter_by(id=1).scalar() is None
+        assert _referencias() == [1, 1]
+    assert cliente.get('/admin/documento/1/versiones/1/descargar').data == A
+    assert cliente.get('/documento/1/descargar').data == B
+
+
+def test_restaurar_blob_legado_antes_de_migrar(app, cliente, backend):
+    with app.app_context():
+        db.session.add(Documento(titulo='Legado', filename='legado.pdf', size_bytes=len(A), area_id=1,
+                                 storage_backend='db', archivo_data=A))
+        db.session.commit()
+
+    _editar(cliente, 1, B)
+    cliente.post('/admin/documento/1/versiones/1/restaurar')
+    assert cliente.get('/documento/1/descargar').data == A
+
+    with app.app_context():
+        ejecutar_pendientes(tipos=['migrar_legado'])
+        documento = db.session.get(Documento, 1)
+        assert documento.storage_key == DocumentoVersion.query.filter_by(numero=1).one().storage_key
+        # A: el documento y la versión 1; B: la versión 2
+        assert _referencias() == [1, 2]
+    assert cliente.get('/documento/1/descargar').data == A
+    assert cliente.get('/admin/documento/1/versiones/2/descargar').data == B
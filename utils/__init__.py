@@ -1,4 +1,26 @@
 # utils/__init__.py
 from .helpers import obtener_hora_chile, registrar_log
+from .audit import vaciar_auditoria
 from .email import enviar_correo_reseteo
-from .decorators import check_password_change, admin_required, gestor_required
\ No newline at end of file
+from .decorators import check_password_change, admin_required, gestor_required
+from .identity import obtener_identidad, invalidar_identidad
+from .rate_limit import limitar_intentos, limpiar_intentos, registrar_fallo
+from .passwords import necesita_rehash, metricas_hash, HashOcupado
+from .storage import (obtener_almacenamiento, almacenamiento_de, soltar_contenido, purgar_contenido,
+                      sincronizar_referencias, reporte_deduplicacion)
+from .streaming import respuesta_documento, respuesta_paginas, respuesta_zip
+from .uploads import procesar_subida, ArchivoNoValido
+from .resumable import (iniciar_subida, cargar_sesion, guardar_trozo, estado_subida,
+                        abrir_subida_completa, descartar_subida, limpiar_subidas_abandonadas,
+                        SubidaNoEncontrada, TrozoNoValido)
+from .user_search import buscar_usuarios, reindexar_usuarios
+from .queries import (resumen_areas, resumen_area, listar_documentos, listar_logs, contar_logs,
+                      autocompletar_usuarios)
+from .jobs import encolar, encolar_procesamiento, reintentar_tarea, resumen_tareas
+from .search import (buscar, indexar_desde_almacen, actualizar_metadatos_indice, eliminar_del_indice)
+from .thumbnails import respuesta_miniatura, obtener_miniatura, recortar_cache
+from .pdf_optimize import variante_optimizada, reporte_optimizacion
+from .pages import obtener_estructura, estructuras_de, secciones
+from .integrity import verificar_pendientes, reporte_integridad
+from .versions import (reemplazar_archivo, restaurar_version, historial, soltar_versiones,
+                       encolar_migracion_legado, migrar_legado)
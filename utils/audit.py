@@ -0,0 +1,220 @@
+# utils/audit.py
+"""Escritura diferida del registro de auditoría (tabla logs).
+
+- registrar_log() solo agrega el evento a un buffer en memoria: la vista no hace commit.
+- Un hilo por proceso inserta el buffer en lote (INSERT de varias filas) cuando junta
+  AUDIT_BUFFER_SIZE eventos o pasan AUDIT_FLUSH_SECONDS, usando su propia conexión del
+  engine, nunca la sesión de la vista. También se vacía al terminar el proceso.
+- Si la base no responde, los eventos se agregan (con fsync) a AUDIT_FALLBACK_PATH y se
+  reinsertan en el siguiente vaciado exitoso.
+- El archivo de respaldo se reclama con os.replace a <ruta>.<pid>.<n> (bajo flock, para no
+  cortar una escritura a medias). Al arrancar, cada proceso reinserta también los reclamados
+  por procesos que ya no existen. Las líneas ilegibles (una escritura cortada por una caída)
+  se apartan en <ruta>.corrupto y el resto se reinserta.
+- Un error al vaciar nunca termina el hilo: los eventos vuelven al buffer.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sin bloqueo entre procesos
+    fcntl = None
+
+from models import db, Log
+
+
+class BufferAuditoria:
+
+    def __init__(self, app):
+        self.app = app
+        self.tamano = app.config['AUDIT_BUFFER_SIZE']
+        self.intervalo = app.config['AUDIT_FLUSH_SECONDS']
+        self.ruta_respaldo = app.config['AUDIT_FALLBACK_PATH']
+        self._eventos = []
+        self._lock = threading.Lock()
+        self._lock_vaciado = threading.Lock()
+        self._despertar = threading.Event()
+        self._pid = None
+        self._retenidos = []          # Archivos reclamados cuyo contenido aún no se insertó
+        self._revisar_huerfanos = True
+
+    def agregar(self, evento):
+        with self._lock:
+            self._eventos.append(evento)
+            lleno = len(self._eventos) >= self.tamano
+        self._asegurar_hilo()
+        if lleno:
+            self._despertar.set()
+
+    def _asegurar_hilo(self):
+        # Se arranca en el primer evento: tras un fork (gunicorn --preload) el hilo del padre no existe
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._retenidos, self._revisar_huerfanos = [], True
+                threading.Thread(target=self._ciclo, name='auditoria', daemon=True).start()
+
+    def _ciclo(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+            except Exception as e:  # El hilo debe sobrevivir a cualquier error
+                print(f"Error en el hilo de auditoría: {e}")
+
+    def vaciar(self):
+        """Inserta lo acumulado (y lo pendiente en el archivo de respaldo) en una sola transacción."""
+        with self._lock_vaciado:
+            with self._lock:
+                eventos, self._eventos = self._eventos, []
+            try:
+                self._vaciar(eventos)
+            except Exception as e:
+                # Ni la base ni el respaldo aceptaron los eventos: vuelven al buffer
+                print(f"Error al vaciar la auditoría (se reintentará): {e}")
+                with self._lock:
+                    self._eventos[:0] = eventos
+
+    def _vaciar(self, eventos):
+        pendientes = self._reclamar_respaldo()
+        if not eventos and not pendientes:
+            self._soltar_retenidos()
+            return
+
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conexion:
+                    conexion.execute(Log.__table__.insert(),
+                                     [_fila(e) for e in pendientes + eventos])
+        except Exception as e:
+            print(f"Error al registrar log (se guarda en {self.ruta_respaldo}): {e}")
+            self._escribir_respaldo(pendientes + eventos)
+        self._soltar_retenidos()
+
+    def _soltar_retenidos(self):
+        for ruta in self._retenidos:
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+        self._retenidos = []
+
+    def _reclamar_respaldo(self):
+        """Toma el archivo de respaldo (y, al arrancar, los que dejaron reclamados procesos que
+        ya no existen) y devuelve sus eventos. Los archivos quedan en _retenidos hasta que sus
+        eventos estén en la base o de nuevo en el respaldo."""
+        if self._revisar_huerfanos:
+            self._revisar_huerfanos = False
+            for ruta in glob.glob(glob.escape(self.ruta_respaldo) + '.*'):
+                pid = _pid_reclamo(self.ruta_respaldo, ruta)
+                # El propio pid también: tras reiniciar un contenedor los pid se repiten
+                if pid is not None and ruta not in self._retenidos \
+                        and (pid == os.getpid() or not _proceso_vivo(pid)):
+                    self._reclamar(ruta)
+        self._reclamar(self.ruta_respaldo)
+
+        eventos = []
+        for ruta in self._retenidos:
+            eventos.extend(self._leer_respaldo(ruta))
+        return eventos
+
+    def _reclamar(self, origen):
+        destino = f"{self.ruta_respaldo}.{os.getpid()}.{time.time_ns()}"
+        try:
+            with open(origen, 'rb') as archivo:
+                _bloquear(archivo)  # Espera a que termine una escritura en curso
+                os.replace(origen, destino)
+        except FileNotFoundError:
+            return  # No hay respaldo, u otro proceso lo reclamó primero
+        self._retenidos.append(destino)
+
+    def _leer_respaldo(self, ruta):
+        eventos, ilegibles = [], []
+        with open(ruta, 'rb') as archivo:
+            for linea in archivo:
+                if not linea.strip():
+                    continue
+                try:
+                    evento = json.loads(linea)
+                    _fila(evento)  # Valida la fecha antes de mezclarlo con el lote
+                    eventos.append(evento)
+                except (ValueError, TypeError, KeyError):
+                    ilegibles.append(linea if linea.endswith(b'\n') else linea + b'\n')
+        if ilegibles:
+            print(f"Auditoría: {len(ilegibles)} líneas ilegibles en {ruta} se apartan en {self.ruta_respaldo}.corrupto")
+            with open(f"{self.ruta_respaldo}.corrupto", 'ab') as corrupto:
+                corrupto.writelines(ilegibles)
+                corrupto.flush()
+                os.fsync(corrupto.fileno())
+        return eventos
+
+    def _escribir_respaldo(self, eventos):
+        os.makedirs(os.path.dirname(self.ruta_respaldo), exist_ok=True)
+        while True:
+            archivo = open(self.ruta_respaldo, 'a', encoding='utf-8')
+            _bloquear(archivo)
+            try:
+                vigente = os.fstat(archivo.fileno()).st_ino == os.stat(self.ruta_respaldo).st_ino
+            except FileNotFoundError:
+                vigente = False
+            if vigente:
+                break
+            archivo.close()  # Otro proceso lo reclamó mientras se esperaba el bloqueo
+        with archivo:
+            for evento in eventos:
+                archivo.write(json.dumps(evento, ensure_ascii=False) + '\n')
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+
+def _bloquear(archivo):
+    """Bloqueo exclusivo hasta cerrar el archivo."""
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+
+
+def _pid_reclamo(ruta_respaldo, ruta):
+    """pid del proceso que reclamó `ruta` (<respaldo>.<pid>[.<n>]), o None si no es un reclamo."""
+    partes = ruta[len(ruta_respaldo) + 1:].split('.')
+    if not all(parte.isdigit() for parte in partes):
+        return None
+    return int(partes[0])
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, pero es de otro usuario
+    return True
+
+
+def _fila(evento):
+    return dict(evento, timestamp=datetime.fromisoformat(evento['timestamp']))
+
+
+def iniciar_auditoria(app):
+    buffer = BufferAuditoria(app)
+    app.extensions['auditoria'] = buffer
+    atexit.register(buffer.vaciar)
+    return buffer
+
+
+def vaciar_auditoria():
+    """Escribe de inmediato los eventos pendientes (p. ej. antes de mostrar los logs)."""
+    from flask import current_app
+
+    buffer = current_app.extensions.get('auditoria')
+    if buffer is not None:
+        buffer.vaciar()
@@ -0,0 +1,88 @@
+# utils/disk_cache.py
+"""Cachés en disco acotadas por tamaño (miniaturas, extractos de páginas).
+
+Cada lectura actualiza el mtime del archivo; al superar el límite se eliminan los
+archivos usados hace más tiempo (LRU aproximado, sin índice aparte).
+
+Recorrer el directorio es caro: cada proceso lleva un total estimado por caché (el del
+último recorrido más lo que escribió después) y solo vuelve a recorrer cuando la estimación
+supera el límite o cuando pasó INTERVALO_RECUENTO (para sumar lo escrito por otros procesos).
+"""
+import os
+import threading
+import time
+
+FRACCION_TRAS_RECORTE = 0.9  # Se libera un poco más del límite para no recortar en cada escritura
+INTERVALO_RECUENTO = 600     # segundos
+
+_lock_recorte = threading.Lock()
+_totales = {}  # raiz -> [bytes estimados, momento del último recorrido]
+
+
+def marcar_uso(ruta):
+    """True si el archivo existe (y lo marca como recién usado)."""
+    try:
+        os.utime(ruta)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def guardar_atomico(ruta, escribir):
+    """Crea `ruta` con escribir(archivo) en un temporal + os.replace: nadie lee un archivo a medias."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporal, 'wb') as destino:
+            escribir(destino)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return ruta
+
+
+def recortar_directorio(raiz, extension, limite_bytes):
+    """Elimina los archivos menos usados hasta quedar bajo el límite. Devuelve cuántos borró."""
+    with _lock_recorte:
+        archivos, total = [], 0
+        for carpeta, _, nombres in os.walk(raiz):
+            for nombre in nombres:
+                if not nombre.endswith(extension):
+                    continue
+                ruta = os.path.join(carpeta, nombre)
+                try:
+                    info = os.stat(ruta)
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+                total += info.st_size
+        if total <= limite_bytes:
+            _totales[raiz] = [total, time.monotonic()]
+            return 0
+
+        borrados = 0
+        objetivo = limite_bytes * FRACCION_TRAS_RECORTE
+        for _, tamano, ruta in sorted(archivos):
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except FileNotFoundError:
+                pass
+            total -= tamano
+        _totales[raiz] = [total, time.monotonic()]
+        return borrados
+
+
+def registrar_escritura(raiz, extension, tamano, limite_bytes):
+    """Suma `tamano` al total estimado de la caché y la recorta solo si hace falta."""
+    with _lock_recorte:
+        estimado = _totales.get(raiz)
+        if estimado is not None and estimado[0] + tamano <= limite_bytes \
+                and time.monotonic() - estimado[1] < INTERVALO_RECUENTO:
+            estimado[0] += tamano
+            return 0
+    return recortar_directorio(raiz, extension, limite_bytes)
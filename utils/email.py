@@ -1,23 +1,27 @@
-import os
 import smtplib
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
-from flask import url_for
+from flask import url_for, current_app
+
+from .jobs import tarea, encolar
+
+# Los correos salen por la cola de tareas (worker.py): la vista solo encola y responde.
+MAX_INTENTOS_CORREO = 6
+INACTIVIDAD_MAXIMA = 60  # segundos; pasado esto el servidor SMTP suele cortar la conexión
+
+# Una conexión autenticada por hilo del worker, reutilizada entre mensajes
+_local = threading.local()
+
 
 def enviar_correo_reseteo(usuario, token):
-    remitente = os.getenv("EMAIL_USUARIO")
-    contrasena = os.getenv("EMAIL_CONTRASENA")
-    
-    if not remitente or not contrasena:
+    remitente = _remitente()
+    if not remitente:
         print("ERROR: Credenciales de correo faltantes en .env")
         return
 
-    msg = MIMEMultipart()
-    msg['Subject'] = 'Restablecimiento de Contraseña - Repositorio Dirección'
-    msg['From'] = formataddr(('Repositorio Dirección', remitente))
-    msg['To'] = usuario.email
-
     url_reseteo = url_for('auth.resetear_clave', token=token, _external=True)
 
     cuerpo_html = f"""
@@ -35,12 +39,69 @@ def enviar_correo_reseteo(usuario, token):
         <p style="font-size: 12px; color: #888;">Unidad de TICs - Departamento de Salud</p>
     </div>
     """
-    msg.attach(MIMEText(cuerpo_html, 'html'))
 
+    encolar('enviar_correo', max_intentos=MAX_INTENTOS_CORREO,
+            para=usuario.email,
+            asunto='Restablecimiento de Contraseña - Repositorio Dirección',
+            html=cuerpo_html)
+
+
+def _remitente():
+    config = current_app.config
+    return config.get('MAIL_DEFAULT_SENDER') or config.get('MAIL_USERNAME')
+
+
+@tarea('enviar_correo')
+def _tarea_enviar_correo(para, asunto, html):
+    msg = MIMEMultipart()
+    msg['Subject'] = asunto
+    msg['From'] = formataddr(('Repositorio Dirección', _remitente()))
+    msg['To'] = para
+    msg.attach(MIMEText(html, 'html'))
+
+    # Si el servidor cerró la conexión reutilizada, se reintenta una vez con una nueva;
+    # cualquier otro error sube a la cola, que reintenta con espera exponencial.
+    for intento in (1, 2):
+        servidor = _conexion()
+        try:
+            servidor.send_message(msg)
+            _local.ultimo_uso = time.monotonic()
+            return
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            cerrar_conexion()
+            if intento == 2:
+                raise
+
+
+def _conexion():
+    """Conexión SMTP del hilo actual; se abre (STARTTLS + login) solo si no hay una vigente."""
+    servidor = getattr(_local, 'servidor', None)
+    if servidor is not None and time.monotonic() - _local.ultimo_uso < INACTIVIDAD_MAXIMA:
+        return servidor
+    cerrar_conexion()
+
+    config = current_app.config
+    servidor = smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=config['MAIL_TIMEOUT'])
+    try:
+        if config['MAIL_USE_TLS']:
+            servidor.starttls()
+        if config.get('MAIL_USERNAME') and config.get('MAIL_PASSWORD'):
+            servidor.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+    except Exception:
+        servidor.close()
+        raise
+
+    _local.servidor = servidor
+    _local.ultimo_uso = time.monotonic()
+    return servidor
+
+
+def cerrar_conexion():
+    servidor = getattr(_local, 'servidor', None)
+    _local.servidor = None
+    if servidor is None:
+        return
     try:
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()
-            server.login(remitente, contrasena)
-            server.send_message(msg)
-    except Exception as e:
-        print(f"Error enviando correo: {e}")
\ No newline at end of file
+        servidor.quit()
+    except (smtplib.SMTPException, OSError):
+        servidor.close()
@@ -1,26 +1,24 @@
 from datetime import datetime
 import pytz
+from flask import current_app
 from flask_login import current_user
-from models import db, Log
 
 def obtener_hora_chile():
     cl_tz = pytz.timezone('America/Santiago')
     return datetime.now(cl_tz)
 
 def registrar_log(accion, detalles=None):
-    """Registra una acción en la base de datos."""
+    """Registra una acción en la auditoría. Se escribe en lote, fuera de la sesión de la vista."""
     try:
         usuario_id = current_user.id if current_user.is_authenticated else None
         usuario_nombre = current_user.nombre_completo if current_user.is_authenticated else 'Sistema/Anónimo'
         
-        nuevo_log = Log(
-            usuario_id=usuario_id,
-            usuario_nombre=usuario_nombre,
-            accion=accion,
-            detalles=detalles,
-            timestamp=obtener_hora_chile()
-        )
-        db.session.add(nuevo_log)
-        db.session.commit()
+        current_app.extensions['auditoria'].agregar({
+            'usuario_id': usuario_id,
+            'usuario_nombre': usuario_nombre,
+            'accion': accion,
+            'detalles': detalles,
+            'timestamp': obtener_hora_chile().replace(tzinfo=None).isoformat()
+        })
     except Exception as e:
-        print(f"Error al registrar log: {e}")
\ No newline at end of file
+        print(f"Error al registrar log: {e}")
@@ -0,0 +1,61 @@
+# utils/identity.py
+"""Identidad del usuario autenticado, cacheada por proceso.
+
+load_user devuelve una Identidad inmutable (datos de sesión y rol, sin hash ni tokens) en
+vez de la entidad Usuario: con caché vigente, autenticar y autorizar no consulta la base.
+Las vistas que modifican al usuario deben llamar a invalidar_identidad(); en otros
+procesos el cambio se ve al vencer IDENTITY_CACHE_TTL.
+"""
+import threading
+import time
+from collections import namedtuple
+from dataclasses import dataclass
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy.orm import joinedload
+
+from models import Usuario
+
+RolResumido = namedtuple('RolResumido', ['id', 'nombre'])
+
+_cache = {}  # usuario_id -> (vence, Identidad)
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Identidad(UserMixin):
+    id: int
+    nombre_completo: str
+    email: str
+    activo: bool
+    cambio_clave_requerido: bool
+    rol: RolResumido = None
+
+
+def _construir(usuario):
+    rol = RolResumido(usuario.rol.id, usuario.rol.nombre) if usuario.rol else None
+    return Identidad(usuario.id, usuario.nombre_completo, usuario.email, bool(usuario.activo),
+                     bool(usuario.cambio_clave_requerido), rol)
+
+
+def obtener_identidad(usuario_id):
+    """Identidad desde la caché o, si venció, desde la base (usuario y rol en una consulta)."""
+    ahora = time.monotonic()
+    guardada = _cache.get(usuario_id)
+    if guardada and guardada[0] > ahora:
+        return guardada[1]
+
+    usuario = Usuario.query.options(joinedload(Usuario.rol)).filter_by(id=usuario_id).first()
+    if usuario is None:
+        invalidar_identidad(usuario_id)
+        return None
+
+    identidad = _construir(usuario)
+    with _lock:
+        _cache[usuario_id] = (ahora + current_app.config['IDENTITY_CACHE_TTL'], identidad)
+    return identidad
+
+
+def invalidar_identidad(usuario_id):
+    with _lock:
+        _cache.pop(usuario_id, None)
@@ -0,0 +1,189 @@
+# utils/integrity.py
+"""Verificación periódica de los archivos guardados (verificar_integridad.py, vía cron).
+
+- Cada contenido se lee por trozos desde su backend y se recalcula el sha256; se
+  compara con la clave y con size_bytes. La memoria no depende del tamaño del archivo.
+- La lectura se limita a VERIFY_MAX_MB_S para no competir con las descargas.
+- VerificacionIntegridad guarda el resultado de cada payload: una ejecución solo revisa
+  lo nunca verificado o verificado hace más de VERIFY_INTERVAL_DAYS, empezando por lo
+  más antiguo, y si se interrumpe la siguiente continúa donde quedó.
+- Las diferencias quedan en el Log y en el reporte de administración.
+"""
+import hashlib
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, cast, func
+
+from .helpers import obtener_hora_chile, registrar_log
+from .storage import obtener_almacenamiento, CHUNK_SIZE
+
+# Lo que los backends necesitan para leer un payload; size_bytes=None obliga a medir el real
+_Ubicacion = namedtuple('_Ubicacion', ['id', 'storage_backend', 'storage_key', 'size_bytes'])
+Pendiente = namedtuple('Pendiente', ['tipo', 'clave', 'sha256', 'size_bytes', 'ubicacion'])
+Resultado = namedtuple('Resultado', ['pendiente', 'estado', 'detalle', 'bytes_leidos'])
+
+MAX_DOCUMENTOS_EN_DETALLE = 10
+MAX_PROBLEMAS_EN_REPORTE = 200
+
+
+def _ahora():
+    return obtener_hora_chile().replace(tzinfo=None)
+
+
+class _Limitador:
+    """Duerme lo necesario para que la lectura acumulada no supere `bytes_por_segundo`."""
+
+    def __init__(self, bytes_por_segundo):
+        self.bytes_por_segundo = bytes_por_segundo
+        self.inicio = time.monotonic()
+        self.leidos = 0
+
+    def consumir(self, cantidad):
+        self.leidos += cantidad
+        if self.bytes_por_segundo > 0:
+            adelanto = self.leidos / self.bytes_por_segundo - (time.monotonic() - self.inicio)
+            if adelanto > 0:
+                time.sleep(adelanto)
+
+
+def _consultas_pendientes(dias):
+    """Consultas de contenidos y de BLOB legados sin verificar o con verificación vencida."""
+    from models import db, ContenidoArchivo, Documento, VerificacionIntegridad as V
+
+    vencimiento = _ahora() - timedelta(days=dias)
+    contenidos = db.session.query(ContenidoArchivo.id, ContenidoArchivo.sha256, ContenidoArchivo.size_bytes,
+                                  ContenidoArchivo.storage_backend, V.fecha) \
+        .outerjoin(V, and_(V.tipo == 'contenido', V.clave == ContenidoArchivo.sha256)) \
+        .filter(or_(V.id.is_(None), V.fecha < vencimiento))
+    legados = db.session.query(Documento.id, Documento.sha256, Documento.size_bytes,
+                               Documento.storage_backend, V.fecha) \
+        .outerjoin(V, and_(V.tipo == 'documento', V.clave == cast(Documento.id, db.String))) \
+        .filter(Documento.storage_key.is_(None), Documento.sha256.isnot(None),
+                or_(V.id.is_(None), V.fecha < vencimiento))
+    return contenidos, legados
+
+
+def pendientes_verificacion(dias=None, limite=None):
+    """Payloads sin verificar o con verificación vencida; los más atrasados primero."""
+    from models import ContenidoArchivo, Documento, VerificacionIntegridad as V
+
+    dias = current_app.config['VERIFY_INTERVAL_DAYS'] if dias is None else dias
+    contenidos, legados = _consultas_pendientes(dias)
+    # NULL (nunca verificado) ordena primero en MySQL y SQLite
+    contenidos = contenidos.order_by(V.fecha, ContenidoArchivo.id)
+    legados = legados.order_by(V.fecha, Documento.id)
+    if limite:
+        contenidos, legados = contenidos.limit(limite), legados.limit(limite)
+
+    filas = [(f.fecha, Pendiente('contenido', f.sha256, f.sha256, f.size_bytes,
+                                 _Ubicacion(f.id, f.storage_backend, f.sha256, None)))
+             for f in contenidos]
+    filas += [(f.fecha, Pendiente('documento', str(f.id), f.sha256, f.size_bytes,
+                                  _Ubicacion(f.id, 'db', None, None)))  # Sin storage_key el BLOB está en la fila
+              for f in legados]
+    filas.sort(key=lambda fila: (fila[0] is not None, fila[0] or datetime.min))
+    pendientes = [pendiente for _, pendiente in filas]
+    return pendientes[:limite] if limite else pendientes
+
+
+def verificar(pendiente, limitador):
+    """Lee el payload por trozos y compara hash y tamaño. No modifica la base."""
+    almacen = obtener_almacenamiento(pendiente.ubicacion.storage_backend)
+    calculado = hashlib.sha256()
+    leidos = 0
+    try:
+        for trozo in almacen.iterar(pendiente.ubicacion, 0, None, CHUNK_SIZE):
+            calculado.update(trozo)
+            leidos += len(trozo)
+            limitador.consumir(len(trozo))
+    except Exception as e:
+        return Resultado(pendiente, 'error', f"No se pudo leer: {e}", leidos)
+
+    if leidos == 0 and pendiente.size_bytes:
+        return Resultado(pendiente, 'faltante', "No se encontró el archivo en el almacenamiento.", 0)
+    if calculado.hexdigest() != pendiente.sha256:
+        return Resultado(pendiente, 'hash_distinto',
+                         f"sha256 esperado {pendiente.sha256}, calculado {calculado.hexdigest()}.", leidos)
+    if pendiente.size_bytes is not None and leidos != pendiente.size_bytes:
+        # El contenido es el correcto; el dato registrado no
+        return Resultado(pendiente, 'tamano_distinto',
+                         f"size_bytes registrado {pendiente.size_bytes}, real {leidos}.", leidos)
+    return Resultado(pendiente, 'ok', None, leidos)
+
+
+def registrar_resultado(resultado, segundos):
+    """Guarda el avance (una fila por payload) y deja en el Log las diferencias."""
+    from models import db, Documento, DocumentoVersion, OptimizacionPDF, VerificacionIntegridad
+
+    pendiente = resultado.pendiente
+    fila = VerificacionIntegridad.query.filter_by(tipo=pendiente.tipo, clave=pendiente.clave).first()
+    if fila is None:
+        fila = VerificacionIntegridad(tipo=pendiente.tipo, clave=pendiente.clave)
+        db.session.add(fila)
+    fila.estado, fila.detalle = resultado.estado, resultado.detalle
+    fila.bytes_leidos, fila.segundos, fila.fecha = resultado.bytes_leidos, round(segundos, 3), _ahora()
+
+    if resultado.estado in ('hash_distinto', 'faltante'):
+        # Una variante optimizada dañada deja de entregarse: se vuelve al original
+        OptimizacionPDF.query.filter_by(storage_key=pendiente.sha256, estado='optimizado') \
+            .update({OptimizacionPDF.estado: 'error', OptimizacionPDF.detalle: resultado.detalle},
+                    synchronize_session=False)
+    db.session.commit()
+
+    if resultado.estado != 'ok':
+        if pendiente.tipo == 'contenido':
+            documentos = db.session.query(Documento.id).filter(Documento.storage_key == pendiente.sha256) \
+                .order_by(Documento.id).limit(MAX_DOCUMENTOS_EN_DETALLE).all()
+            versiones = db.session.query(DocumentoVersion.documento_id, DocumentoVersion.numero) \
+                .filter(DocumentoVersion.storage_key == pendiente.sha256) \
+                .order_by(DocumentoVersion.documento_id).limit(MAX_DOCUMENTOS_EN_DETALLE).all()
+            afectados = ', '.join([str(d.id) for d in documentos] +
+                                  [f"{v.documento_id} (versión {v.numero})" for v in versiones]) \
+                or 'ninguno (variante optimizada)'
+        else:
+            afectados = pendiente.clave
+        registrar_log("Integridad", f"{pendiente.tipo} {pendiente.clave[:16]}: {resultado.estado}. "
+                                    f"{resultado.detalle} Documentos: {afectados}")
+    return fila
+
+
+def verificar_pendientes(dias=None, limite=None, max_segundos=None, mb_por_segundo=None):
+    """Verifica lo que está por vencer, dentro del tiempo y la tasa de lectura dados.
+
+    Genera un Resultado por payload a medida que avanza (el script los muestra).
+    """
+    if mb_por_segundo is None:
+        mb_por_segundo = current_app.config['VERIFY_MAX_MB_S']
+    limitador = _Limitador(mb_por_segundo * 1024 * 1024)
+    fin = time.monotonic() + max_segundos if max_segundos else None
+
+    for pendiente in pendientes_verificacion(dias, limite):
+        if fin and time.monotonic() >= fin:
+            break
+        inicio = time.monotonic()
+        resultado = verificar(pendiente, limitador)
+        registrar_resultado(resultado, time.monotonic() - inicio)
+        yield resultado
+
+
+def reporte_integridad():
+    """Resumen para administración: verificados, vencidos y payloads con problemas."""
+    from models import db, ContenidoArchivo, VerificacionIntegridad
+
+    dias = current_app.config['VERIFY_INTERVAL_DAYS']
+    vencimiento = _ahora() - timedelta(days=dias)
+    al_dia = VerificacionIntegridad.query.filter(VerificacionIntegridad.fecha >= vencimiento).count()
+    problemas = VerificacionIntegridad.query.filter(VerificacionIntegridad.estado != 'ok') \
+        .order_by(VerificacionIntegridad.fecha.desc()).limit(MAX_PROBLEMAS_EN_REPORTE).all()
+    ultima = db.session.query(func.max(VerificacionIntegridad.fecha)).scalar()
+
+    return {
+        'contenidos': db.session.query(func.count(ContenidoArchivo.id)).scalar(),
+        'al_dia': al_dia,
+        'pendientes': sum(consulta.count() for consulta in _consultas_pendientes(dias)),
+        'ultima_verificacion': ultima,
+        'problemas': problemas,
+        'dias': dias,
+    }
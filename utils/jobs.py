@@ -0,0 +1,220 @@
+# utils/jobs.py
+"""Cola de tareas en segundo plano respaldada por la tabla `tareas`.
+
+- Las vistas llaman a encolar(); el trabajo pesado lo hace worker.py.
+- Cada tipo de tarea se registra con el decorador @tarea('tipo') junto a su módulo.
+- Reintentos con espera exponencial; tras max_intentos la tarea queda 'fallida'.
+- Mientras corre, el worker renueva `latido`; una tarea sin latido reciente (worker caído o
+  matado por el sistema) vuelve a la cola y eso también cuenta como intento.
+"""
+import json
+import socket
+import os
+import traceback
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import func
+
+from models import db, Tarea
+from .helpers import obtener_hora_chile
+
+_MANEJADORES = {}
+
+ESPERA_BASE_SEGUNDOS = 30
+ESPERA_MAXIMA_SEGUNDOS = 3600
+
+
+def tarea(tipo):
+    """Registra la función que ejecuta las tareas de un tipo. Recibe el payload como kwargs."""
+    def decorador(funcion):
+        _MANEJADORES[tipo] = funcion
+        return funcion
+    return decorador
+
+
+def _ahora():
+    # Las columnas DateTime se guardan sin zona, en hora de Chile
+    return obtener_hora_chile().replace(tzinfo=None)
+
+
+def encolar(tipo, max_intentos=5, retraso_segundos=0, **payload):
+    """Agrega una tarea a la cola y la confirma. Un fallo aquí no debe romper la vista."""
+    try:
+        nueva = Tarea(
+            tipo=tipo,
+            payload=json.dumps(payload),
+            max_intentos=max_intentos,
+            ejecutar_desde=_ahora() + timedelta(seconds=retraso_segundos),
+            fecha_creacion=_ahora()
+        )
+        db.session.add(nueva)
+        db.session.commit()
+        return nueva.id
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error al encolar tarea {tipo}: {e}")
+        return None
+
+
+def encolar_unica(tipo, **payload):
+    """Como encolar(), salvo que ya haya una igual pendiente o en proceso (p. ej. varias
+    peticiones que piden la misma miniatura mientras se genera)."""
+    existente = db.session.query(Tarea.id) \
+        .filter(Tarea.tipo == tipo, Tarea.estado.in_(('pendiente', 'en_proceso')),
+                Tarea.payload == json.dumps(payload)).first()
+    if existente is not None:
+        return existente.id
+    return encolar(tipo, **payload)
+
+
+def encolar_varios(tipo, payloads, max_intentos=5):
+    """Agrega muchas tareas del mismo tipo en un solo INSERT (importaciones masivas)."""
+    if not payloads:
+        return
+    ahora = _ahora()
+    db.session.execute(Tarea.__table__.insert(), [
+        {'tipo': tipo, 'payload': json.dumps(p), 'estado': 'pendiente', 'intentos': 0,
+         'max_intentos': max_intentos, 'ejecutar_desde': ahora, 'fecha_creacion': ahora}
+        for p in payloads
+    ])
+    db.session.commit()
+
+
+def tareas_procesamiento():
+    """Tipos de tarea que siguen a toda subida o reemplazo de archivo (payload: documento_id)."""
+    tipos = ['indexar_documento', 'generar_miniatura', 'indexar_paginas']
+    if current_app.config['PDF_OPTIMIZE_ENABLED']:
+        tipos.append('optimizar_pdf')
+    return tipos
+
+
+def encolar_procesamiento(documento_id):
+    for tipo in tareas_procesamiento():
+        encolar(tipo, documento_id=documento_id)
+
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def reclamar_tareas(limite):
+    """Marca hasta `limite` tareas pendientes como 'en_proceso' y devuelve sus IDs.
+
+    El UPDATE condicionado a estado='pendiente' garantiza que dos workers nunca
+    tomen la misma tarea, sin depender de SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    ahora = _ahora()
+    candidatas = [fila.id for fila in db.session.query(Tarea.id)
+                  .filter(Tarea.estado == 'pendiente', Tarea.ejecutar_desde <= ahora)
+                  .order_by(Tarea.ejecutar_desde, Tarea.id).limit(limite)]
+
+    reclamadas = []
+    for tarea_id in candidatas:
+        filas = Tarea.query.filter_by(id=tarea_id, estado='pendiente').update(
+            {'estado': 'en_proceso', 'fecha_inicio': ahora, 'latido': ahora, 'worker': identificador_worker()},
+            synchronize_session=False)
+        db.session.commit()
+        if filas:
+            reclamadas.append(tarea_id)
+    return reclamadas
+
+
+def ejecutar_tarea(tarea_id):
+    """Ejecuta una tarea ya reclamada y registra el resultado (o programa el reintento)."""
+    registro = db.session.get(Tarea, tarea_id)
+    if registro is None:
+        return
+
+    manejador = _MANEJADORES.get(registro.tipo)
+    try:
+        if manejador is None:
+            raise LookupError(f"Tipo de tarea sin manejador: {registro.tipo}")
+        manejador(**json.loads(registro.payload or '{}'))
+    except Exception as e:
+        db.session.rollback()
+        registro = db.session.get(Tarea, tarea_id)
+        registro.intentos += 1
+        registro.ultimo_error = f"{e}\n{traceback.format_exc(limit=5)}"
+        if registro.intentos >= registro.max_intentos:
+            registro.estado = 'fallida'
+            registro.fecha_fin = _ahora()
+        else:
+            registro.estado = 'pendiente'
+            registro.ejecutar_desde = _ahora() + timedelta(seconds=_espera_reintento(registro.intentos))
+        db.session.commit()
+        return
+
+    registro.estado = 'completada'
+    registro.intentos += 1
+    registro.ultimo_error = None
+    registro.fecha_fin = _ahora()
+    db.session.commit()
+
+
+def marcar_latido(tarea_ids):
+    """Renueva el latido de las tareas que este worker sigue ejecutando."""
+    if not tarea_ids:
+        return
+    Tarea.query.filter(Tarea.id.in_(tarea_ids), Tarea.estado == 'en_proceso') \
+        .update({'latido': _ahora()}, synchronize_session=False)
+    db.session.commit()
+
+
+def _espera_reintento(intentos):
+    return min(ESPERA_BASE_SEGUNDOS * 2 ** (intentos - 1), ESPERA_MAXIMA_SEGUNDOS)
+
+
+def recuperar_tareas_colgadas(minutos=None):
+    """Devuelve a la cola las tareas 'en_proceso' sin latido reciente (worker caído).
+
+    Cuenta como intento: una tarea que mata al worker (p. ej. un PDF que agota la memoria)
+    termina 'fallida' en lugar de repetirse para siempre.
+    """
+    minutos = current_app.config['JOB_STALE_MINUTES'] if minutos is None else minutos
+    limite = _ahora() - timedelta(minutes=minutos)
+    colgadas = Tarea.query.filter(Tarea.estado == 'en_proceso',
+                                  func.coalesce(Tarea.latido, Tarea.fecha_inicio) < limite).all()
+    recuperadas = 0
+    for registro in colgadas:
+        intentos = registro.intentos + 1
+        ultima_senal = (registro.latido or registro.fecha_inicio).strftime('%d-%m-%Y %H:%M:%S')
+        valores = {'intentos': intentos, 'latido': None,
+                   'ultimo_error': f"Sin latido desde {ultima_senal} (worker {registro.worker} caído o detenido)."}
+        if intentos >= registro.max_intentos:
+            valores.update(estado='fallida', fecha_fin=_ahora())
+        else:
+            valores.update(estado='pendiente', ejecutar_desde=_ahora() + timedelta(seconds=_espera_reintento(intentos)))
+        # Condicionado al estado leído: dos workers recuperando a la vez no suman dos intentos
+        recuperadas += Tarea.query.filter_by(id=registro.id, estado='en_proceso', intentos=registro.intentos) \
+            .update(valores, synchronize_session=False)
+    db.session.commit()
+    return recuperadas
+
+
+def limpiar_tareas_completadas(dias=None):
+    """Borra las completadas más antiguas que JOB_RETENTION_DAYS (sus payloads pueden traer
+    datos sensibles, como los enlaces de recuperación de clave). Devuelve cuántas se borraron."""
+    dias = current_app.config['JOB_RETENTION_DAYS'] if dias is None else dias
+    borradas = Tarea.query.filter(Tarea.estado == 'completada', Tarea.fecha_fin < _ahora() - timedelta(days=dias)) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return borradas
+
+
+def reintentar_tarea(tarea_id):
+    """Vuelve a encolar una tarea fallida (acción manual desde el panel)."""
+    registro = db.session.get(Tarea, tarea_id)
+    if registro is None or registro.estado != 'fallida':
+        return False
+    registro.estado = 'pendiente'
+    registro.intentos = 0
+    registro.ejecutar_desde = _ahora()
+    db.session.commit()
+    return True
+
+
+def resumen_tareas():
+    """Cantidad de tareas por estado, en una consulta."""
+    conteos = dict(db.session.query(Tarea.estado, func.count(Tarea.id)).group_by(Tarea.estado).all())
+    return {estado: conteos.get(estado, 0)
+            for estado in ('pendiente', 'en_proceso', 'completada', 'fallida')}
@@ -0,0 +1,158 @@
+# utils/pages.py
+"""Páginas y marcadores de cada PDF, y extractos de rangos de páginas.
+
+- EstructuraPDF guarda, por sha256, la cantidad de páginas y los marcadores (tarea
+  'indexar_paginas' al subir; si falta, se calcula en la primera consulta).
+- Un rango de páginas se arma con pypdf una vez y queda en una caché de disco acotada
+  (PAGE_CACHE_PATH / PAGE_CACHE_MAX_MB, ver disk_cache), una entrada por (sha256, rango).
+"""
+import glob
+import json
+import os
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .disk_cache import marcar_uso, guardar_atomico, registrar_escritura
+from .jobs import tarea
+
+MAX_MARCADORES = 500
+LARGO_TITULO = 200
+
+Estructura = namedtuple('Estructura', ['paginas', 'marcadores'])
+Seccion = namedtuple('Seccion', ['nivel', 'titulo', 'desde', 'hasta'])
+
+
+def calcular_estructura(origen):
+    """(páginas, [[nivel, título, página], ...]) de un PDF (ruta o archivo)."""
+    from pypdf import PdfReader
+
+    lector = PdfReader(origen)
+    marcadores = []
+
+    def recorrer(elementos, nivel):
+        for elemento in elementos:
+            if len(marcadores) >= MAX_MARCADORES:
+                return
+            if isinstance(elemento, list):
+                recorrer(elemento, nivel + 1)
+                continue
+            try:
+                pagina = lector.get_destination_page_number(elemento)
+            except Exception:
+                continue  # Destinos externos o rotos
+            if pagina is not None and pagina >= 0:
+                titulo = ' '.join(str(elemento.title or '').split())[:LARGO_TITULO]
+                marcadores.append([nivel, titulo, pagina + 1])
+
+    try:
+        recorrer(lector.outline, 0)
+    except Exception as e:
+        print(f"Error leyendo marcadores: {e}")
+    return len(lector.pages), marcadores
+
+
+def obtener_estructura(doc):
+    """Estructura del documento desde la base o, la primera vez, leyendo el PDF. None si no se puede."""
+    from models import db, EstructuraPDF
+    from .storage import almacenamiento_de
+
+    if not doc.sha256:
+        return None
+    fila = EstructuraPDF.query.filter_by(sha256=doc.sha256).first()
+    if fila is None:
+        almacen = almacenamiento_de(doc)
+        origen = almacen.ruta(doc) or almacen.abrir(doc)
+        if origen is None:
+            return None
+        try:
+            paginas, marcadores = calcular_estructura(origen)
+        except Exception as e:
+            print(f"Error leyendo estructura del documento {doc.id}: {e}")
+            return None
+        fila = EstructuraPDF(sha256=doc.sha256, paginas=paginas, marcadores=json.dumps(marcadores))
+        db.session.add(fila)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Otra petición la guardó primero; el resultado es el mismo
+    return Estructura(fila.paginas, json.loads(fila.marcadores or '[]'))
+
+
+def estructuras_de(documentos):
+    """{sha256: Estructura} de los documentos ya indexados, en una consulta (para listados)."""
+    from models import EstructuraPDF
+
+    shas = {doc.sha256 for doc in documentos if doc.sha256}
+    if not shas:
+        return {}
+    filas = EstructuraPDF.query.filter(EstructuraPDF.sha256.in_(shas)).all()
+    return {f.sha256: Estructura(f.paginas, json.loads(f.marcadores or '[]')) for f in filas}
+
+
+def secciones(estructura, nivel_maximo=0):
+    """Marcadores hasta `nivel_maximo` (None = todos) con su rango: cada uno llega hasta la
+    página anterior al siguiente marcador de su mismo nivel o superior (o hasta el final)."""
+    resultado = []
+    marcadores = estructura.marcadores
+    for i, (nivel, titulo, desde) in enumerate(marcadores):
+        if nivel_maximo is not None and nivel > nivel_maximo:
+            continue
+        hasta = estructura.paginas
+        for siguiente_nivel, _, siguiente in marcadores[i + 1:]:
+            if siguiente_nivel <= nivel and siguiente > desde:
+                hasta = siguiente - 1
+                break
+        resultado.append(Seccion(nivel, titulo, desde, max(hasta, desde)))
+    return resultado
+
+
+def _ruta_extracto(sha256, desde, hasta):
+    raiz = current_app.config['PAGE_CACHE_PATH']
+    return os.path.join(raiz, sha256[:2], f'{sha256}_{desde}-{hasta}.pdf')
+
+
+def extracto_paginas(archivo, sha256, desde, hasta):
+    """Ruta del PDF con las páginas desde..hasta (1 = primera) de `archivo` (documento o
+    variante optimizada); lo arma si no está en caché."""
+    from pypdf import PdfWriter
+    from .storage import almacenamiento_de
+
+    ruta = _ruta_extracto(sha256, desde, hasta)
+    if marcar_uso(ruta):
+        return ruta
+
+    origen = almacenamiento_de(archivo).abrir(archivo)
+    if origen is None:
+        return None
+    with origen:
+        escritor = PdfWriter()
+        escritor.append(origen, pages=(desde - 1, hasta))  # Conserva los marcadores del rango
+        guardar_atomico(ruta, escritor.write)
+    registrar_escritura(current_app.config['PAGE_CACHE_PATH'], '.pdf', os.path.getsize(ruta),
+                        current_app.config['PAGE_CACHE_MAX_MB'] * 1024 * 1024)
+    return ruta
+
+
+def descartar_estructura(sha256):
+    """Quita la estructura y los extractos de un contenido que se eliminó del almacenamiento."""
+    from models import db, EstructuraPDF
+
+    if not sha256:
+        return
+    EstructuraPDF.query.filter_by(sha256=sha256).delete(synchronize_session=False)
+    db.session.commit()
+    for ruta in glob.glob(os.path.join(current_app.config['PAGE_CACHE_PATH'], sha256[:2], f'{sha256}_*.pdf')):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+@tarea('indexar_paginas')
+def _tarea_indexar_paginas(documento_id):
+    from models import db, Documento
+
+    doc = db.session.get(Documento, documento_id)
+    if doc is not None:
+        obtener_estructura(doc)
@@ -0,0 +1,134 @@
+# utils/passwords.py
+"""Hash de contraseñas en un pool de procesos acotado.
+
+scrypt/pbkdf2 consumen CPU durante decenas de milisegundos: hechos en el hilo de la vista,
+un cambio de turno con muchos logins satura a los workers y frena las descargas. Aquí:
+
+- PASSWORD_HASH_WORKERS procesos hacen los cálculos (0 = en el mismo hilo). Fuera de una
+  petición (scripts como crear_superadmin.py, worker.py) siempre se calcula en el mismo hilo:
+  no hay vistas que proteger y no vale la pena levantar procesos.
+- A lo más PASSWORD_HASH_MAX_PENDING cálculos en espera o en curso; si no hay cupo en
+  PASSWORD_HASH_TIMEOUT segundos se lanza HashOcupado en vez de encolar sin límite.
+- PASSWORD_HASH_METHOD define el algoritmo; necesita_rehash() detecta hashes antiguos.
+- metricas_hash() entrega tiempos de espera en cola y de cálculo de este proceso.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_request_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashOcupado(Exception):
+    """No hubo cupo en el pool de hash dentro del tiempo de espera."""
+
+
+_pool = None
+_pid_pool = None
+_cupos = None
+_lock = threading.Lock()
+_metodos = {}
+_metricas = {'calculos': 0, 'rechazados': 0, 'espera_total': 0.0, 'espera_max': 0.0, 'calculo_total': 0.0}
+
+
+# --- Funciones que corren en el proceso hijo ---
+
+def _generar(password, metodo):
+    inicio = time.time()
+    return generate_password_hash(password, method=metodo), inicio, time.time()
+
+
+def _verificar(password_hash, password):
+    inicio = time.time()
+    return check_password_hash(password_hash, password), inicio, time.time()
+
+
+# --- API ---
+
+def generar_hash(password):
+    return _ejecutar(_generar, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verificar_hash(password_hash, password):
+    return _ejecutar(_verificar, password_hash, password)
+
+
+def necesita_rehash(password_hash):
+    """True si el hash no usa el método y parámetros configurados (p. ej. pbkdf2 antiguo)."""
+    metodo = current_app.config['PASSWORD_HASH_METHOD']
+    if metodo not in _metodos:
+        # Con parámetros por defecto ('scrypt') werkzeug escribe el método completo ('scrypt:32768:8:1')
+        _metodos[metodo] = generate_password_hash('', method=metodo).split('$', 1)[0]
+    return not password_hash or password_hash.split('$', 1)[0] != _metodos[metodo]
+
+
+def metricas_hash():
+    with _lock:
+        m = dict(_metricas)
+    calculos = m['calculos'] or 1
+    return {
+        'calculos': m['calculos'],
+        'rechazados': m['rechazados'],
+        'espera_promedio_ms': round(m['espera_total'] / calculos * 1000, 1),
+        'espera_max_ms': round(m['espera_max'] * 1000, 1),
+        'calculo_promedio_ms': round(m['calculo_total'] / calculos * 1000, 1),
+        'workers': current_app.config['PASSWORD_HASH_WORKERS'],
+    }
+
+
+def _ejecutar(funcion, *args):
+    config = current_app.config
+    if config['PASSWORD_HASH_WORKERS'] <= 0 or not has_request_context():
+        enviado = time.time()
+        resultado, inicio, fin = funcion(*args)
+        _registrar(inicio - enviado, fin - inicio)
+        return resultado
+
+    pool, cupos = _obtener_pool(config)
+    if not cupos.acquire(timeout=config['PASSWORD_HASH_TIMEOUT']):
+        with _lock:
+            _metricas['rechazados'] += 1
+        raise HashOcupado()
+    try:
+        enviado = time.time()
+        try:
+            resultado, inicio, fin = pool.submit(funcion, *args).result()
+        except BrokenProcessPool:
+            _descartar_pool(pool)
+            raise
+        _registrar(inicio - enviado, fin - inicio)
+        return resultado
+    finally:
+        cupos.release()
+
+
+def _obtener_pool(config):
+    """Pool del proceso actual; tras un fork (gunicorn) se crea uno nuevo."""
+    global _pool, _pid_pool, _cupos
+    with _lock:
+        if _pool is None or _pid_pool != os.getpid():
+            # spawn: el servidor tiene hilos, y hacer fork de un proceso con hilos no es seguro
+            _pool = ProcessPoolExecutor(max_workers=config['PASSWORD_HASH_WORKERS'],
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pid_pool = os.getpid()
+            _cupos = threading.BoundedSemaphore(config['PASSWORD_HASH_MAX_PENDING'])
+        return _pool, _cupos
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _registrar(espera, calculo):
+    with _lock:
+        _metricas['calculos'] += 1
+        _metricas['espera_total'] += max(espera, 0)
+        _metricas['espera_max'] = max(_metricas['espera_max'], espera)
+        _metricas['calculo_total'] += calculo
@@ -0,0 +1,192 @@
+# utils/pdf_optimize.py
+"""Variante optimizada de los PDF subidos, generada en segundo plano (tarea 'optimizar_pdf').
+
+- Imágenes: las que superan PDF_OPTIMIZE_MAX_PX por lado se reducen, y las JPEG se
+  recomprimen con PDF_OPTIMIZE_JPEG_QUALITY. Solo se reemplazan si el resultado pesa menos.
+- Flujos de contenido comprimidos al máximo y objetos idénticos fusionados (pypdf).
+- El original no se toca: la variante es otro contenido y solo se guarda si ahorra al
+  menos PDF_OPTIMIZE_MIN_SAVING. ver_pdf y descargar_pdf la entregan por defecto.
+
+pypdf no escribe PDF linealizados; Range (206) sigue permitiendo al visor pedir solo
+las partes que necesita.
+"""
+import hashlib
+import time
+from io import BytesIO
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .jobs import tarea
+
+LARGO_DETALLE = 500
+FILTROS_BITONALES = ('/JBIG2Decode', '/CCITTFaxDecode')  # Escaneos en blanco y negro: ya son compactos
+
+
+def optimizar_pdf(origen, destino, max_lado, calidad):
+    """Escribe en `destino` la versión optimizada de `origen`. Devuelve cuántas imágenes reemplazó."""
+    from pypdf import PdfReader, PdfWriter
+
+    lector = PdfReader(origen)
+    if lector.is_encrypted:
+        raise ValueError("PDF cifrado")
+    escritor = PdfWriter(clone_from=lector)
+
+    reducidas, vistas = 0, set()
+    for pagina in escritor.pages:
+        for archivo in pagina.images:
+            referencia = archivo.indirect_reference
+            # Imágenes en línea no se pueden reemplazar; las compartidas entre páginas se procesan una vez
+            if referencia is None or referencia.idnum in vistas:
+                continue
+            vistas.add(referencia.idnum)
+            reducidas += _reducir_imagen(archivo, max_lado, calidad)
+        pagina.compress_content_streams(level=9)
+
+    escritor.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    escritor.write(destino)
+    return reducidas
+
+
+def _reducir_imagen(archivo, max_lado, calidad):
+    """Reemplaza la imagen por un JPEG más liviano si conviene. Devuelve 1 si la reemplazó."""
+    objeto = archivo.indirect_reference.get_object()
+    filtros = objeto.get('/Filter') or []
+    if not isinstance(filtros, list):
+        filtros = [filtros]
+    # Máscaras y transparencias cambian de significado al pasar a JPEG
+    if objeto.get('/SMask') or objeto.get('/Mask') or objeto.get('/ImageMask') \
+            or any(f in FILTROS_BITONALES for f in filtros):
+        return 0
+    try:
+        imagen = archivo.image
+    except Exception:
+        return 0
+    # CMYK y paletas se dejan como están: JPEG los altera (inversión Adobe, colores)
+    if imagen is None or imagen.mode not in ('RGB', 'L'):
+        return 0
+
+    grande = max(imagen.size) > max_lado
+    if not grande and '/DCTDecode' not in filtros:
+        return 0  # Imagen chica sin pérdida (diagramas, texto): recomprimirla en JPEG la ensucia
+    if grande:
+        imagen = imagen.copy()
+        imagen.thumbnail((max_lado, max_lado))
+
+    prueba = BytesIO()
+    imagen.save(prueba, format='JPEG', quality=calidad, optimize=True)
+    if prueba.tell() >= len(objeto._data):
+        return 0
+    archivo.replace(imagen, quality=calidad, optimize=True)
+    return 1
+
+
+def variante_optimizada(doc):
+    """OptimizacionPDF a entregar en lugar del original, o None si no hay."""
+    from models import OptimizacionPDF
+
+    if not doc.storage_key:
+        return None
+    return OptimizacionPDF.query.filter_by(sha256_original=doc.storage_key, estado='optimizado').first()
+
+
+def optimizar_contenido(doc):
+    """Genera y guarda la variante optimizada del contenido del documento (una por sha256)."""
+    from models import db, OptimizacionPDF, ContenidoArchivo
+    from .storage import almacenamiento_de, obtener_almacenamiento
+
+    existente = OptimizacionPDF.query.filter_by(sha256_original=doc.storage_key).first()
+    if existente is not None:
+        return existente
+
+    config = current_app.config
+    almacen = almacenamiento_de(doc)
+    origen = almacen.ruta(doc) or almacen.abrir(doc)
+    if origen is None:
+        return None
+    bytes_original = almacen.tamano(doc)
+
+    inicio = time.monotonic()
+    salida = BytesIO()
+    registro = OptimizacionPDF(sha256_original=doc.storage_key, bytes_original=bytes_original)
+    try:
+        registro.imagenes_reducidas = optimizar_pdf(origen, salida, config['PDF_OPTIMIZE_MAX_PX'],
+                                                    config['PDF_OPTIMIZE_JPEG_QUALITY'])
+    except Exception as e:
+        # PDF dañado o no soportado: reintentar daría el mismo resultado
+        registro.estado, registro.detalle = 'error', str(e)[:LARGO_DETALLE]
+    registro.segundos = round(time.monotonic() - inicio, 3)
+
+    if registro.estado != 'error':
+        datos = salida.getvalue()
+        registro.bytes_optimizado = len(datos)
+        if len(datos) > bytes_original * (1 - config['PDF_OPTIMIZE_MIN_SAVING']):
+            registro.estado = 'sin_ganancia'
+        else:
+            registro.estado = 'optimizado'
+            sha256 = hashlib.sha256(datos).hexdigest()
+            contenido = ContenidoArchivo.query.filter_by(sha256=sha256).first()
+            if contenido is None:
+                contenido = obtener_almacenamiento().escribir_nuevo(sha256, len(datos), datos)
+                db.session.add(contenido)
+            else:
+                contenido.referencias = ContenidoArchivo.referencias + 1
+            registro.storage_backend, registro.storage_key = contenido.storage_backend, sha256
+
+    db.session.add(registro)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Otro documento con el mismo contenido se optimizó al mismo tiempo
+        db.session.rollback()
+        return OptimizacionPDF.query.filter_by(sha256_original=doc.storage_key).first()
+    return registro
+
+
+def descartar_optimizacion(sha256_original):
+    """Borra la optimización de un contenido purgado y suelta su variante (llamar tras el commit)."""
+    from models import db, OptimizacionPDF, ContenidoArchivo
+    from .storage import purgar_contenido
+
+    registro = OptimizacionPDF.query.filter_by(sha256_original=sha256_original).first()
+    if registro is None:
+        return
+    backend, clave = registro.storage_backend, registro.storage_key
+    db.session.delete(registro)
+    if clave:
+        ContenidoArchivo.query.filter_by(sha256=clave) \
+            .update({ContenidoArchivo.referencias: ContenidoArchivo.referencias - 1},
+                    synchronize_session=False)
+    db.session.commit()
+    purgar_contenido(backend, clave)
+
+
+def reporte_optimizacion():
+    """Contenidos optimizados, bytes ahorrados por las variantes y tiempo promedio de proceso."""
+    from models import db, OptimizacionPDF
+
+    optimizados, original, optimizado = db.session.query(
+        func.count(OptimizacionPDF.id),
+        func.coalesce(func.sum(OptimizacionPDF.bytes_original), 0),
+        func.coalesce(func.sum(OptimizacionPDF.bytes_optimizado), 0)
+    ).filter(OptimizacionPDF.estado == 'optimizado').one()
+    procesados, segundos = db.session.query(
+        func.count(OptimizacionPDF.id), func.coalesce(func.avg(OptimizacionPDF.segundos), 0)
+    ).one()
+
+    return {
+        'procesados': procesados,
+        'optimizados': optimizados,
+        'bytes_ahorrados': int(original) - int(optimizado),
+        'segundos_promedio': round(float(segundos), 2),
+    }
+
+
+@tarea('optimizar_pdf')
+def _tarea_optimizar_pdf(documento_id):
+    from models import db, Documento
+
+    doc = db.session.get(Documento, documento_id)
+    # Los BLOB legados (sin storage_key) no tienen un contenido al que asociar la variante
+    if doc is not None and doc.storage_key and current_app.config['PDF_OPTIMIZE_ENABLED']:
+        optimizar_contenido(doc)
@@ -0,0 +1,194 @@
+# utils/queries.py
+"""Consultas de lectura para los listados del repositorio (sin cargar colecciones ORM)."""
+import base64
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import func, or_, and_
+
+from models import db, AreaDocumento, Documento, Log, Usuario
+from .user_search import filtrar_por_texto
+
+ResumenArea = namedtuple('ResumenArea', ['area', 'total_documentos', 'total_bytes', 'ultima_subida'])
+
+
+def resumen_areas(area_ids=None):
+    """Áreas con cantidad de documentos, tamaño total y última subida, en una sola consulta.
+
+    El conteo se agrupa en el servidor (usa el índice de area_id) y se une a las áreas con
+    LEFT JOIN, así las áreas vacías también aparecen.
+    """
+    stats = db.session.query(
+        Documento.area_id.label('area_id'),
+        func.count(Documento.id).label('total'),
+        func.coalesce(func.sum(Documento.size_bytes), 0).label('bytes'),
+        func.max(Documento.fecha_subida).label('ultima')
+    ).group_by(Documento.area_id).subquery()
+
+    query = db.session.query(
+        AreaDocumento,
+        func.coalesce(stats.c.total, 0),
+        func.coalesce(stats.c.bytes, 0),
+        stats.c.ultima
+    ).outerjoin(stats, stats.c.area_id == AreaDocumento.id)
+
+    if area_ids is not None:
+        query = query.filter(AreaDocumento.id.in_(area_ids))
+
+    return [ResumenArea(area, int(total), int(size), ultima)
+            for area, total, size, ultima in query.order_by(AreaDocumento.id)]
+
+
+def resumen_area(area_id):
+    """Resumen de un área; None si no existe."""
+    filas = resumen_areas([area_id])
+    return filas[0] if filas else None
+
+
+# --- LISTADO DE DOCUMENTOS ---
+
+# Solo metadatos: nunca se seleccionan archivo_data ni columnas de almacenamiento
+COLUMNAS_LISTADO = (
+    Documento.id, Documento.titulo, Documento.version, Documento.descripcion,
+    Documento.filename, Documento.mimetype, Documento.size_bytes, Documento.sha256,
+    Documento.fecha_subida, Documento.area_id,
+)
+
+PaginaDocumentos = namedtuple('PaginaDocumentos', ['documentos', 'cursor_siguiente'])
+
+
+def listar_documentos(area_id, cursor=None, limite=50):
+    """Documentos de un área, más recientes primero, paginados por cursor (keyset).
+
+    El cursor codifica (fecha_subida, id) de la última fila entregada; la página siguiente
+    continúa desde ahí con el índice (area_id, fecha_subida, id), sin OFFSET.
+    Devuelve filas de solo lectura con los atributos de COLUMNAS_LISTADO.
+    """
+    query = db.session.query(*COLUMNAS_LISTADO).filter(Documento.area_id == area_id)
+
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        query = query.filter(_despues_de(Documento.fecha_subida, Documento.id, *posicion))
+
+    filas = query.order_by(Documento.fecha_subida.desc(), Documento.id.desc()) \
+        .limit(limite + 1).all()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1].fecha_subida, filas[-1].id)
+    return PaginaDocumentos(filas, siguiente)
+
+
+# --- USUARIOS ---
+
+def autocompletar_usuarios(texto, limite=10):
+    """Primeros usuarios con alguna palabra del nombre o email que empieza con el texto.
+
+    Solo id, nombre y email; sin tildes ni mayúsculas (ver user_search). Con menos de
+    2 caracteres no se consulta.
+    """
+    texto = (texto or '').strip()
+    if len(texto) < 2:
+        return []
+    query = db.session.query(Usuario.id, Usuario.nombre_completo, Usuario.email)
+    return filtrar_por_texto(query, texto).order_by(Usuario.nombre_completo).limit(limite).all()
+
+
+# --- VISOR DE LOGS ---
+
+PaginaLogs = namedtuple('PaginaLogs', ['logs', 'cursor_siguiente'])
+
+SEGUNDOS_CACHE_CONTEO = 60
+MAX_CONTEOS_CACHE = 256  # Los filtros vienen de la URL: sin tope, cada combinación quedaría en memoria
+_conteos_logs = {}  # (usuario_id, accion) -> (instante, total), el más antiguo primero
+_lock_conteos = threading.Lock()
+
+
+def _filtrar_logs(query, usuario_id=None, accion=None):
+    if usuario_id:
+        query = query.filter(Log.usuario_id == usuario_id)
+    if accion:
+        query = query.filter(Log.accion == accion)
+    return query
+
+
+def listar_logs(usuario_id=None, accion=None, cursor=None, limite=15):
+    """Logs más recientes primero, paginados por cursor sobre (timestamp, id).
+
+    Cada combinación de filtros tiene su índice (usuario, acción o ambos, seguidos de
+    timestamp e id), así cualquier página cuesta lo mismo que la primera.
+    """
+    query = _filtrar_logs(Log.query, usuario_id, accion)
+
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        query = query.filter(_despues_de(Log.timestamp, Log.id, *posicion))
+
+    filas = query.order_by(Log.timestamp.desc(), Log.id.desc()).limit(limite + 1).all()
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1].timestamp, filas[-1].id)
+    return PaginaLogs(filas, siguiente)
+
+
+def contar_logs(usuario_id=None, accion=None):
+    """Total de logs para los filtros, cacheado por proceso durante SEGUNDOS_CACHE_CONTEO
+    (hasta MAX_CONTEOS_CACHE combinaciones).
+
+    Es un valor de referencia para el visor: puede ir unos segundos atrasado.
+    """
+    clave = (usuario_id, accion)
+    guardado = _conteos_logs.get(clave)
+    if guardado and time.monotonic() - guardado[0] < SEGUNDOS_CACHE_CONTEO:
+        return guardado[1]
+
+    total = _filtrar_logs(db.session.query(func.count(Log.id)), usuario_id, accion).scalar()
+    ahora = time.monotonic()
+    with _lock_conteos:
+        # Al escribir se descartan los vencidos; si aún no hay cupo, sale el más antiguo
+        _conteos_logs.pop(clave, None)
+        for vieja, (instante, _) in list(_conteos_logs.items()):
+            if ahora - instante < SEGUNDOS_CACHE_CONTEO:
+                break
+            del _conteos_logs[vieja]
+        if len(_conteos_logs) >= MAX_CONTEOS_CACHE:
+            del _conteos_logs[next(iter(_conteos_logs))]
+        _conteos_logs[clave] = (ahora, total)
+    return total
+
+
+def _despues_de(columna_fecha, columna_id, fecha, ultimo_id):
+    """Filas que siguen a (fecha, id) en orden (fecha DESC, id DESC).
+
+    Las fechas NULL van al final (MySQL y SQLite las ordenan como las menores): un cursor
+    con fecha sigue por las anteriores y luego por las NULL; uno sin fecha, solo por estas.
+    """
+    if fecha is None:
+        return and_(columna_fecha.is_(None), columna_id < ultimo_id)
+    return or_(
+        columna_fecha < fecha,
+        and_(columna_fecha == fecha, columna_id < ultimo_id),
+        columna_fecha.is_(None)
+    )
+
+
+def codificar_cursor(fecha, ultimo_id):
+    """Sin fecha (NULL) la parte de la fecha queda vacía."""
+    valor = f"{fecha.isoformat() if fecha else ''}|{ultimo_id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """(fecha o None, id), o None si el cursor falta o viene adulterado."""
+    if not cursor:
+        return None
+    try:
+        valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        fecha, ultimo_id = valor.split('|')
+        return (datetime.fromisoformat(fecha) if fecha else None), int(ultimo_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
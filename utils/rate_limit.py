@@ -0,0 +1,192 @@
+# utils/rate_limit.py
+"""Límite de intentos con ventana deslizante para login y recuperación de clave.
+
+Cada intento queda registrado con su instante; se rechaza si en los últimos `ventana`
+segundos ya hubo `limite` intentos para la misma clave (IP o email). El chequeo corre
+antes que la vista: un intento rechazado no consulta la base ni calcula hashes.
+
+Primero se revisan todas las claves y solo si ninguna está excedida se registra el intento,
+así un rechazo por email no le gasta cupo a la IP. En login solo cuentan los fallos: la vista
+llama a registrar_fallo() cuando la clave no es válida.
+
+La IP es request.remote_addr. Detrás de un proxy inverso hay que definir PROXY_FIX_X_FOR
+(app.py) para tomarla de X-Forwarded-For; si no, todos los usuarios comparten la IP del proxy.
+
+Backends (RATE_LIMIT_BACKEND):
+- 'memoria': diccionario del proceso; cada worker cuenta por separado.
+- 'sqlite': archivo compartido por todos los procesos del servidor (RATE_LIMIT_SQLITE_PATH).
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque, defaultdict
+from functools import wraps
+from flask import current_app, request, render_template, flash
+
+PROBABILIDAD_LIMPIEZA = 0.01  # De vez en cuando se borran las claves que ya no tienen intentos vigentes
+VENTANA_MAXIMA = 24 * 3600
+
+
+class LimitadorMemoria:
+
+    def __init__(self):
+        self._intentos = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def espera(self, clave, limite, ventana):
+        """Segundos a esperar antes de otro intento (0 = hay cupo). No registra nada."""
+        ahora = time.time()
+        with self._lock:
+            intentos = self._intentos.get(clave)
+            if not intentos:
+                return 0
+            while intentos and intentos[0] <= ahora - ventana:
+                intentos.popleft()
+            if len(intentos) >= limite:
+                return intentos[0] + ventana - ahora
+            return 0
+
+    def registrar(self, clave):
+        ahora = time.time()
+        with self._lock:
+            self._intentos[clave].append(ahora)
+            if random.random() < PROBABILIDAD_LIMPIEZA:
+                self._limpiar(ahora)
+
+    def limpiar(self, clave):
+        with self._lock:
+            self._intentos.pop(clave, None)
+
+    def _limpiar(self, ahora):
+        for clave in [c for c, i in self._intentos.items() if not i or i[-1] <= ahora - VENTANA_MAXIMA]:
+            del self._intentos[clave]
+
+
+class LimitadorSQLite:
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with self._conectar() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('CREATE TABLE IF NOT EXISTS intentos (clave TEXT NOT NULL, instante REAL NOT NULL)')
+            conexion.execute('CREATE INDEX IF NOT EXISTS ix_intentos_clave ON intentos (clave, instante)')
+
+    def _conectar(self):
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        return sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+
+    def espera(self, clave, limite, ventana):
+        ahora = time.time()
+        conexion = self._conectar()
+        try:
+            # Solo lectura: los vencidos se ignoran aquí y se borran al registrar
+            cantidad, primero = conexion.execute(
+                'SELECT count(*), min(instante) FROM intentos WHERE clave = ? AND instante > ?',
+                (clave, ahora - ventana)).fetchone()
+            if cantidad >= limite:
+                return primero + ventana - ahora
+            return 0
+        finally:
+            conexion.close()
+
+    def registrar(self, clave):
+        ahora = time.time()
+        conexion = self._conectar()
+        try:
+            conexion.execute('BEGIN IMMEDIATE')
+            conexion.execute('INSERT INTO intentos (clave, instante) VALUES (?, ?)', (clave, ahora))
+            if random.random() < PROBABILIDAD_LIMPIEZA:
+                conexion.execute('DELETE FROM intentos WHERE instante <= ?', (ahora - VENTANA_MAXIMA,))
+            conexion.execute('COMMIT')
+        except Exception:
+            if conexion.in_transaction:
+                conexion.execute('ROLLBACK')
+            raise
+        finally:
+            conexion.close()
+
+    def limpiar(self, clave):
+        conexion = self._conectar()
+        try:
+            conexion.execute('DELETE FROM intentos WHERE clave = ?', (clave,))
+        finally:
+            conexion.close()
+
+
+_lock_creacion = threading.Lock()
+
+
+def obtener_limitador():
+    """Backend configurado, uno por aplicación (se crea en el primer uso)."""
+    extensiones = current_app.extensions
+    if 'limitador' not in extensiones:
+        with _lock_creacion:
+            if 'limitador' not in extensiones:
+                if current_app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+                    extensiones['limitador'] = LimitadorSQLite(current_app.config['RATE_LIMIT_SQLITE_PATH'])
+                else:
+                    extensiones['limitador'] = LimitadorMemoria()
+    return extensiones['limitador']
+
+
+def _regla(nombre):
+    """'20/300' -> (20 intentos, 300 segundos)."""
+    limite, ventana = current_app.config[nombre].split('/')
+    return int(limite), float(ventana)
+
+
+def _claves(accion, email):
+    """[(clave, regla), ...] del intento: siempre la IP y, si viene, el email."""
+    claves = [(f'{accion}:ip:{request.remote_addr}', f'RATE_LIMIT_{accion}_IP')]
+    email = (email or '').strip().lower()
+    if email:
+        claves.append((f'{accion}:email:{email}', f'RATE_LIMIT_{accion}_EMAIL'))
+    return claves
+
+
+def limitar_intentos(accion, plantilla, solo_fallos=False):
+    """En POST revisa el cupo por IP y por email (campo 'email' del formulario).
+
+    Usa las reglas RATE_LIMIT_<ACCION>_IP y RATE_LIMIT_<ACCION>_EMAIL. Si se excede
+    alguna, responde 429 con Retry-After mostrando `plantilla`, sin ejecutar la vista.
+    Con solo_fallos=True no registra nada: la vista llama a registrar_fallo() cuando corresponde.
+    """
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'POST' or not current_app.config['RATE_LIMIT_ENABLED']:
+                return f(*args, **kwargs)
+
+            limitador = obtener_limitador()
+            claves = _claves(accion, request.form.get('email'))
+            espera = max(limitador.espera(clave, *_regla(regla)) for clave, regla in claves)
+            if espera:
+                minutos = max(1, round(espera / 60))
+                flash(f'Demasiados intentos. Espera {minutos} minuto(s) e intenta nuevamente.', 'danger')
+                respuesta = current_app.make_response((render_template(plantilla), 429))
+                respuesta.headers['Retry-After'] = str(int(espera) + 1)
+                return respuesta
+
+            if not solo_fallos:
+                for clave, _ in claves:
+                    limitador.registrar(clave)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorador
+
+
+def registrar_fallo(accion, email):
+    """Cuenta un intento fallido (por IP y por email) en una vista con solo_fallos=True."""
+    if current_app.config['RATE_LIMIT_ENABLED']:
+        limitador = obtener_limitador()
+        for clave, _ in _claves(accion, email):
+            limitador.registrar(clave)
+
+
+def limpiar_intentos(accion, email):
+    """Tras un ingreso correcto se olvidan los intentos de ese email."""
+    if email and current_app.config['RATE_LIMIT_ENABLED']:
+        obtener_limitador().limpiar(f'{accion}:email:{email.strip().lower()}')
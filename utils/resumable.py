@@ -0,0 +1,196 @@
+# utils/resumable.py
+"""Subidas reanudables por trozos.
+
+Cada sesión vive en UPLOAD_TMP_PATH/<upload_id>/:
+    meta.json   -> datos del documento, tamaño total, tamaño de trozo y usuario dueño
+    datos.part  -> archivo final; cada trozo se escribe directamente en su offset
+    trozos/<n>  -> marca de trozo recibido (se crea al final del PUT, sin carreras entre trozos)
+"""
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+from flask import current_app
+
+from .uploads import procesar_archivo, ArchivoNoValido
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+_SHA256_VALIDO = re.compile(r'^[0-9a-f]{64}$')
+BLOQUE_ESCRITURA = 256 * 1024
+
+
+class SubidaNoEncontrada(Exception):
+    """La sesión no existe, expiró o pertenece a otro usuario."""
+
+
+class TrozoNoValido(Exception):
+    """Offset, largo o contenido del trozo no cuadran con la sesión."""
+
+
+def _raiz():
+    return current_app.config['UPLOAD_TMP_PATH']
+
+
+def _directorio(upload_id):
+    if not _ID_VALIDO.match(upload_id or ''):
+        raise SubidaNoEncontrada(upload_id)
+    return os.path.join(_raiz(), upload_id)
+
+
+def iniciar_subida(usuario_id, area_id, datos, size_bytes, sha256):
+    """Crea la sesión y reserva el archivo destino. Devuelve el meta de la sesión.
+
+    El sha256 que calculó el cliente es obligatorio: al finalizar se compara con el del
+    archivo ensamblado, así un trozo dañado en el camino no llega al repositorio.
+    """
+    limite = current_app.config['RESUMABLE_MAX_BYTES']
+    if size_bytes <= 0 or size_bytes > limite:
+        raise TrozoNoValido(f'Tamaño no permitido (máximo {limite // (1024 * 1024)} MB).')
+    sha256 = (sha256 or '').lower()
+    if not _SHA256_VALIDO.match(sha256):
+        raise TrozoNoValido('Falta el sha256 del archivo o no es válido.')
+
+    limpiar_subidas_abandonadas()
+
+    upload_id = secrets.token_hex(16)
+    carpeta = _directorio(upload_id)
+    os.makedirs(os.path.join(carpeta, 'trozos'))
+
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    meta = {
+        'upload_id': upload_id,
+        'usuario_id': usuario_id,
+        'area_id': area_id,
+        'titulo': datos.get('titulo'),
+        'version': datos.get('version'),
+        'descripcion': datos.get('descripcion'),
+        'filename': datos.get('filename'),
+        'size_bytes': size_bytes,
+        'sha256': sha256,
+        'chunk_size': chunk_size,
+        'total_trozos': -(-size_bytes // chunk_size),
+        'creado': time.time(),
+    }
+    with open(os.path.join(carpeta, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Archivo disperso del tamaño final: los trozos pueden llegar en cualquier orden
+    with open(os.path.join(carpeta, 'datos.part'), 'wb') as f:
+        f.truncate(size_bytes)
+
+    return meta
+
+
+def cargar_sesion(upload_id, usuario_id):
+    try:
+        with open(os.path.join(_directorio(upload_id), 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise SubidaNoEncontrada(upload_id)
+
+    if meta['usuario_id'] != usuario_id:
+        raise SubidaNoEncontrada(upload_id)
+    return meta
+
+
+def guardar_trozo(meta, offset, stream):
+    """Escribe un trozo alineado a chunk_size en su posición. Reenviar un trozo es idempotente."""
+    chunk_size = meta['chunk_size']
+    if offset < 0 or offset >= meta['size_bytes'] or offset % chunk_size:
+        raise TrozoNoValido('Offset inválido.')
+
+    indice = offset // chunk_size
+    esperado = min(chunk_size, meta['size_bytes'] - offset)
+    carpeta = _directorio(meta['upload_id'])
+    marca = os.path.join(carpeta, 'trozos', str(indice))
+
+    # Un reenvío que falle a medias no debe quedar como recibido con la marca anterior
+    try:
+        os.remove(marca)
+    except FileNotFoundError:
+        pass
+
+    recibido = 0
+    with open(os.path.join(carpeta, 'datos.part'), 'r+b') as f:
+        f.seek(offset)
+        while recibido <= esperado:
+            bloque = stream.read(BLOQUE_ESCRITURA)
+            if not bloque:
+                break
+            recibido += len(bloque)
+            if recibido > esperado:
+                break
+            f.write(bloque)
+
+    if recibido != esperado:
+        raise TrozoNoValido(f'Largo del trozo {indice} incorrecto: se esperaban {esperado} bytes.')
+
+    # La marca se crea solo cuando el trozo quedó completo
+    open(marca, 'w').close()
+    return indice
+
+
+def estado_subida(meta):
+    carpeta = os.path.join(_directorio(meta['upload_id']), 'trozos')
+    recibidos = sorted(int(n) for n in os.listdir(carpeta) if n.isdigit())
+    presentes = set(recibidos)
+    faltantes = [i for i in range(meta['total_trozos']) if i not in presentes]
+    return {
+        'upload_id': meta['upload_id'],
+        'chunk_size': meta['chunk_size'],
+        'size_bytes': meta['size_bytes'],
+        'total_trozos': meta['total_trozos'],
+        'recibidos': recibidos,
+        'faltantes': faltantes,
+        'completo': not faltantes,
+    }
+
+
+def abrir_subida_completa(meta):
+    """Verifica que estén todos los trozos, la firma PDF y el sha256 declarado.
+
+    Devuelve un SubidaProcesada sobre datos.part (sin volver a copiar el archivo).
+    """
+    estado = estado_subida(meta)
+    if not estado['completo']:
+        raise TrozoNoValido(f"Faltan {len(estado['faltantes'])} trozos.")
+
+    ruta = os.path.join(_directorio(meta['upload_id']), 'datos.part')
+    subida = procesar_archivo(ruta)
+    if subida.sha256 != meta.get('sha256'):
+        subida.close()
+        raise ArchivoNoValido('El sha256 del archivo ensamblado no coincide con el declarado.')
+    return subida
+
+
+def descartar_subida(upload_id):
+    shutil.rmtree(_directorio(upload_id), ignore_errors=True)
+
+
+def limpiar_subidas_abandonadas(max_edad_horas=None):
+    """Elimina sesiones sin actividad reciente. Devuelve cuántas se borraron."""
+    raiz = _raiz()
+    if not os.path.isdir(raiz):
+        return 0
+
+    max_edad_horas = max_edad_horas or current_app.config['UPLOAD_SESSION_TTL_HOURS']
+    limite = time.time() - max_edad_horas * 3600
+    eliminadas = 0
+
+    for nombre in os.listdir(raiz):
+        carpeta = os.path.join(raiz, nombre)
+        if not _ID_VALIDO.match(nombre) or not os.path.isdir(carpeta):
+            continue
+        try:
+            # El directorio de marcas cambia con cada trozo recibido
+            actividad = max(os.path.getmtime(carpeta),
+                            os.path.getmtime(os.path.join(carpeta, 'trozos')))
+        except OSError:
+            actividad = 0
+        if actividad < limite:
+            shutil.rmtree(carpeta, ignore_errors=True)
+            eliminadas += 1
+
+    return eliminadas
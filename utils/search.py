@@ -0,0 +1,198 @@
+# utils/search.py
+"""Búsqueda de texto completo sobre el contenido de los PDF.
+
+El índice es un archivo SQLite con FTS5 (SEARCH_INDEX_PATH), separado de MySQL:
+se puede borrar y reconstruir con indexar_documentos.py sin tocar la base principal.
+"""
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from contextlib import contextmanager
+from markupsafe import Markup, escape
+from flask import current_app
+
+from .jobs import tarea
+
+MAX_CARACTERES = 2_000_000   # Tope de texto indexado por documento
+_INICIO_MARCA, _FIN_MARCA = '\x02', '\x03'
+
+ResultadoBusqueda = namedtuple('ResultadoBusqueda', ['documento_id', 'area_id', 'titulo', 'fragmento'])
+
+
+# El rowid de cada fila es el id del documento: borrar o actualizar uno no recorre la tabla
+_ESQUEMA = ("CREATE VIRTUAL TABLE IF NOT EXISTS {tabla} USING fts5("
+            "titulo, descripcion, contenido, area_id UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2')")
+_rutas_revisadas = set()
+
+
+def _conectar(ruta=None):
+    ruta = ruta or current_app.config['SEARCH_INDEX_PATH']
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    conexion = sqlite3.connect(ruta, timeout=10)
+    conexion.execute('PRAGMA journal_mode=WAL')
+    conexion.execute(_ESQUEMA.format(tabla='documentos_fts'))
+    if ruta not in _rutas_revisadas:
+        _migrar_esquema(conexion)
+        _rutas_revisadas.add(ruta)
+    return conexion
+
+
+def _columnas(conexion):
+    return {fila[1] for fila in conexion.execute('PRAGMA table_info(documentos_fts)')}
+
+
+def _migrar_esquema(conexion):
+    """Índices creados antes de usar el rowid guardaban el id en una columna documento_id
+    UNINDEXED. Se copian una vez a la tabla nueva, sin volver a extraer los PDF."""
+    if 'documento_id' not in _columnas(conexion):
+        return
+    conexion.execute('BEGIN IMMEDIATE')
+    try:
+        if 'documento_id' in _columnas(conexion):  # Otro proceso pudo migrarlo mientras esperábamos
+            conexion.execute('DROP TABLE IF EXISTS documentos_fts_nuevo')
+            conexion.execute(_ESQUEMA.format(tabla='documentos_fts_nuevo'))
+            conexion.execute(
+                'INSERT OR REPLACE INTO documentos_fts_nuevo (rowid, titulo, descripcion, contenido, area_id) '
+                'SELECT documento_id, titulo, descripcion, contenido, area_id FROM documentos_fts'
+            )
+            conexion.execute('DROP TABLE documentos_fts')
+            conexion.execute('ALTER TABLE documentos_fts_nuevo RENAME TO documentos_fts')
+        conexion.execute('COMMIT')
+    except Exception:
+        conexion.execute('ROLLBACK')
+        raise
+
+
+@contextmanager
+def _indice(ruta=None):
+    """Conexión de corta vida: commit al salir y cierre siempre."""
+    conexion = _conectar(ruta)
+    try:
+        with conexion:
+            yield conexion
+    finally:
+        conexion.close()
+
+
+def extraer_texto(origen):
+    """Texto plano de un PDF (ruta, bytes o archivo). Devuelve '' si no se puede leer."""
+    from io import BytesIO
+    from pypdf import PdfReader
+
+    if isinstance(origen, (bytes, bytearray)):
+        origen = BytesIO(origen)
+    try:
+        lector = PdfReader(origen)
+        partes, total = [], 0
+        for pagina in lector.pages:
+            texto = pagina.extract_text() or ''
+            partes.append(texto)
+            total += len(texto)
+            if total >= MAX_CARACTERES:
+                break
+        return '\n'.join(partes)[:MAX_CARACTERES]
+    except Exception as e:
+        print(f"Error extrayendo texto: {e}")
+        return ''
+
+
+def indexar_documento(documento_id, area_id, titulo, descripcion, contenido, ruta=None):
+    """Inserta o reemplaza la entrada del documento en el índice."""
+    with _indice(ruta) as conexion:
+        conexion.execute('DELETE FROM documentos_fts WHERE rowid = ?', (documento_id,))
+        conexion.execute(
+            'INSERT INTO documentos_fts (rowid, titulo, descripcion, contenido, area_id) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (documento_id, titulo or '', descripcion or '', contenido or '', area_id)
+        )
+
+
+def actualizar_metadatos_indice(documento_id, area_id, titulo, descripcion):
+    """Cambia título/descripción sin volver a extraer el PDF."""
+    try:
+        with _indice() as conexion:
+            conexion.execute(
+                'UPDATE documentos_fts SET titulo = ?, descripcion = ?, area_id = ? WHERE rowid = ?',
+                (titulo or '', descripcion or '', area_id, documento_id)
+            )
+    except Exception as e:
+        print(f"Error actualizando índice de búsqueda: {e}")
+
+
+def eliminar_del_indice(documento_ids):
+    if not documento_ids:
+        return
+    try:
+        with _indice() as conexion:
+            conexion.executemany('DELETE FROM documentos_fts WHERE rowid = ?',
+                                 [(i,) for i in documento_ids])
+    except Exception as e:
+        print(f"Error actualizando índice de búsqueda: {e}")
+
+
+def ids_indexados(ruta=None):
+    with _indice(ruta) as conexion:
+        return {fila[0] for fila in conexion.execute('SELECT rowid FROM documentos_fts')}
+
+
+def _consulta_fts(texto):
+    """Convierte el texto del usuario en una consulta FTS5 segura: cada término entre comillas
+    (sin operadores inyectables) y el último como prefijo."""
+    terminos = re.findall(r'\w+', texto or '')
+    if not terminos:
+        return None
+    partes = [f'"{t}"' for t in terminos]
+    partes[-1] += '*'
+    return ' '.join(partes)
+
+
+def buscar(texto, page=1, per_page=20):
+    """Resultados ordenados por relevancia (bm25, el título pesa más) con fragmento resaltado.
+
+    Devuelve (resultados, total).
+    """
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return [], 0
+
+    with _indice() as conexion:
+        total = conexion.execute(
+            'SELECT count(*) FROM documentos_fts WHERE documentos_fts MATCH ?', (consulta,)
+        ).fetchone()[0]
+        filas = conexion.execute(
+            "SELECT rowid, area_id, titulo, "
+            "snippet(documentos_fts, -1, ?, ?, '…', 16) "
+            "FROM documentos_fts WHERE documentos_fts MATCH ? "
+            "ORDER BY bm25(documentos_fts, 10.0, 3.0, 1.0) LIMIT ? OFFSET ?",
+            (_INICIO_MARCA, _FIN_MARCA, consulta, per_page, (page - 1) * per_page)
+        ).fetchall()
+
+    return [ResultadoBusqueda(doc_id, area_id, titulo, _resaltar(fragmento))
+            for doc_id, area_id, titulo, fragmento in filas], total
+
+
+def _resaltar(fragmento):
+    """Escapa el texto del PDF y convierte las marcas internas en <mark>."""
+    seguro = str(escape(fragmento or ''))
+    return Markup(seguro.replace(_INICIO_MARCA, '<mark>').replace(_FIN_MARCA, '</mark>'))
+
+
+def indexar_desde_almacen(doc):
+    """Extrae el texto del archivo guardado y actualiza el índice del documento."""
+    from .storage import almacenamiento_de
+
+    almacen = almacenamiento_de(doc)
+    origen = almacen.ruta(doc) or almacen.abrir(doc)
+    texto = extraer_texto(origen) if origen else ''
+    indexar_documento(doc.id, doc.area_id, doc.titulo, doc.descripcion, texto)
+
+
+@tarea('indexar_documento')
+def _tarea_indexar_documento(documento_id):
+    from models import db, Documento
+
+    doc = db.session.get(Documento, documento_id)
+    if doc is not None:  # Pudo eliminarse antes de que el worker llegara
+        indexar_desde_almacen(doc)
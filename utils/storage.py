@@ -0,0 +1,354 @@
+# utils/storage.py
+"""Backends de almacenamiento para los PDF del repositorio.
+
+- 'db'    : BLOB en MySQL (ContenidoArchivo.data; los documentos antiguos en Documento.archivo_data).
+- 'local' : Disco local direccionado por contenido.
+
+Cada sha256 se guarda una sola vez (ContenidoArchivo) con un contador de referencias.
+Los documentos apuntan al contenido por storage_key = sha256.
+"""
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB por lectura/escritura
+
+
+class _AlmacenamientoBase:
+
+    def guardar(self, doc, origen, conservar_legado=False):
+        """Asocia el documento al contenido de su sha256, escribiéndolo solo si es nuevo.
+
+        Suma una referencia en la misma transacción que el documento. Con conservar_legado no
+        borra documentos.archivo_data (una versión anterior aún lo usa, ver utils/versions.py).
+        """
+        from models import db, ContenidoArchivo
+
+        contenido = ContenidoArchivo.query.filter_by(sha256=doc.sha256).first()
+        if contenido is None:
+            contenido = self._insertar_nuevo(doc, origen)
+        else:
+            # Incremento atómico en el servidor (dos subidas simultáneas no se pisan)
+            contenido.referencias = ContenidoArchivo.referencias + 1
+
+        # Si el contenido ya existía en otro backend, se reutiliza tal cual
+        doc.storage_backend = contenido.storage_backend
+        doc.storage_key = contenido.sha256
+        if not conservar_legado:
+            doc.archivo_data = None
+        return contenido
+
+    def _insertar_nuevo(self, doc, origen):
+        """Inserta el contenido en un SAVEPOINT. Si otra subida simultánea del mismo archivo lo
+        insertó primero (sha256 único), se suma una referencia a esa fila: el payload que
+        escribimos es idéntico al suyo."""
+        from models import db, ContenidoArchivo
+
+        contenido = self.escribir_nuevo(doc.sha256, doc.size_bytes, origen)
+        try:
+            with db.session.begin_nested():
+                db.session.add(contenido)
+            return contenido
+        except IntegrityError:
+            # FOR UPDATE: lectura con bloqueo, ve la fila que la otra transacción ya confirmó
+            contenido = ContenidoArchivo.query.filter_by(sha256=doc.sha256).with_for_update().one()
+            contenido.referencias = ContenidoArchivo.referencias + 1
+            return contenido
+
+    def escribir_nuevo(self, sha256, size_bytes, origen):
+        """Escribe un contenido que aún no existe y devuelve su ContenidoArchivo (con 1 referencia),
+        sin agregarlo a la sesión: la importación masiva inserta esas filas en lote."""
+        from models import ContenidoArchivo
+
+        contenido = ContenidoArchivo(sha256=sha256, size_bytes=size_bytes,
+                                     storage_backend=self.nombre, referencias=1)
+        self._escribir(contenido, origen)
+        return contenido
+
+    def _escribir(self, contenido, origen):
+        raise NotImplementedError
+
+    def apartar(self, clave):
+        """Saca el payload de su ubicación antes de confirmar su borrado (ver purgar_contenido).
+        Devuelve lo necesario para devolverlo o descartarlo; None si no hay nada que mover."""
+        return None
+
+    def devolver(self, clave, apartado):
+        pass
+
+    def descartar(self, apartado):
+        pass
+
+
+class AlmacenamientoBD(_AlmacenamientoBase):
+    """Guarda el archivo como BLOB en MySQL."""
+    nombre = 'db'
+
+    def _escribir(self, contenido, origen):
+        contenido.data = origen if isinstance(origen, (bytes, bytearray)) else origen.read()
+
+    def _columna(self, doc):
+        """Columna y filtro donde vive el BLOB del documento (contenido o fila legada)."""
+        from models import Documento, ContenidoArchivo
+
+        if doc.storage_key:
+            return ContenidoArchivo.data, ContenidoArchivo.sha256 == doc.storage_key
+        # Una versión anterior sin storage_key apunta al BLOB legado de su documento
+        return Documento.archivo_data, Documento.id == getattr(doc, 'documento_id', doc.id)
+
+    def abrir(self, doc):
+        from models import db
+
+        columna, filtro = self._columna(doc)
+        data = db.session.query(columna).filter(filtro).scalar()
+        return BytesIO(data) if data else None
+
+    def ruta(self, doc):
+        # No hay archivo físico: el BLOB vive en MySQL
+        return None
+
+    def tamano(self, doc):
+        """Tamaño en bytes sin cargar el BLOB (LENGTH en el servidor)."""
+        from models import db
+
+        if doc.size_bytes is not None:
+            return doc.size_bytes
+        columna, filtro = self._columna(doc)
+        return db.session.query(func.length(columna)).filter(filtro).scalar()
+
+    def iterar(self, doc, inicio=0, fin=None, chunk_size=CHUNK_SIZE):
+        """Genera el BLOB por trozos con SUBSTRING, sin subirlo entero a Python."""
+        from models import db
+
+        columna, filtro = self._columna(doc)
+        fin = self.tamano(doc) if fin is None else fin
+        posicion = inicio
+        while posicion < fin:
+            largo = min(chunk_size, fin - posicion)
+            # SUBSTRING es 1-indexado
+            trozo = db.session.query(func.substring(columna, posicion + 1, largo)) \
+                .filter(filtro).scalar()
+            if not trozo:
+                break
+            yield bytes(trozo)
+            posicion += len(trozo)
+
+    def eliminar(self, clave):
+        # El BLOB desaparece junto con la fila de ContenidoArchivo
+        pass
+
+
+class AlmacenamientoLocal(_AlmacenamientoBase):
+    """Guarda el archivo en disco bajo raiz/ab/cd/<sha256>."""
+    nombre = 'local'
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+
+    def _ruta_clave(self, clave):
+        return os.path.join(self.raiz, clave[:2], clave[2:4], clave)
+
+    def _escribir(self, contenido, origen):
+        destino = self._ruta_clave(contenido.sha256)
+
+        # Solo se llega aquí si no hay fila para el hash: un archivo con ese nombre sería un
+        # resto de una purga a medias, así que se reescribe siempre (reemplazo atómico)
+        carpeta = os.path.dirname(destino)
+        os.makedirs(carpeta, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(origen, (bytes, bytearray)):
+                    f.write(origen)
+                else:
+                    shutil.copyfileobj(origen, f, CHUNK_SIZE)
+            os.replace(temporal, destino)
+        except Exception:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    def abrir(self, doc):
+        ruta = self.ruta(doc)
+        return open(ruta, 'rb') if ruta else None
+
+    def ruta(self, doc):
+        if not doc.storage_key:
+            return None
+        ruta = self._ruta_clave(doc.storage_key)
+        return ruta if os.path.exists(ruta) else None
+
+    def tamano(self, doc):
+        ruta = self.ruta(doc)
+        return os.path.getsize(ruta) if ruta else None
+
+    def iterar(self, doc, inicio=0, fin=None, chunk_size=CHUNK_SIZE):
+        ruta = self.ruta(doc)
+        if not ruta:
+            return
+        with open(ruta, 'rb') as f:
+            fin = os.fstat(f.fileno()).st_size if fin is None else fin
+            f.seek(inicio)
+            restante = fin - inicio
+            while restante > 0:
+                trozo = f.read(min(chunk_size, restante))
+                if not trozo:
+                    break
+                yield trozo
+                restante -= len(trozo)
+
+    def eliminar(self, clave):
+        if not clave:
+            return
+        ruta = self._ruta_clave(clave)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+    def apartar(self, clave):
+        ruta = self._ruta_clave(clave)
+        apartado = f'{ruta}.{os.getpid()}.borrar'
+        try:
+            os.replace(ruta, apartado)
+        except FileNotFoundError:
+            return None
+        return apartado
+
+    def devolver(self, clave, apartado):
+        ruta = self._ruta_clave(clave)
+        if apartado and not os.path.exists(ruta):
+            os.replace(apartado, ruta)
+
+    def descartar(self, apartado):
+        if apartado and os.path.exists(apartado):
+            os.remove(apartado)
+
+
+def obtener_almacenamiento(nombre=None):
+    """Devuelve el backend indicado o, por defecto, el configurado para nuevas subidas."""
+    nombre = nombre or current_app.config['STORAGE_BACKEND']
+    if nombre == 'local':
+        return AlmacenamientoLocal(current_app.config['STORAGE_PATH'])
+    if nombre == 'db':
+        return AlmacenamientoBD()
+    raise ValueError(f"Backend de almacenamiento desconocido: {nombre}")
+
+
+def almacenamiento_de(doc):
+    """Backend donde está guardado un documento existente."""
+    return obtener_almacenamiento(doc.storage_backend or 'db')
+
+
+def soltar_contenido(doc):
+    """Resta la referencia del documento a su contenido (llamar antes del commit que lo borra
+    o reemplaza). Devuelve (backend, clave) para purgar_contenido después del commit."""
+    from models import ContenidoArchivo
+
+    if not doc.storage_key:
+        return None, None
+    ContenidoArchivo.query.filter_by(sha256=doc.storage_key) \
+        .update({ContenidoArchivo.referencias: ContenidoArchivo.referencias - 1},
+                synchronize_session=False)
+    return doc.storage_backend, doc.storage_key
+
+
+def purgar_contenido(backend, clave):
+    """Elimina el contenido si ya nadie lo referencia (llamar después del commit)."""
+    from models import db, ContenidoArchivo
+
+    if not clave:
+        return
+    almacen = obtener_almacenamiento(backend or 'db')
+    apartado = None
+    try:
+        # DELETE condicionado: si otra subida lo volvió a referenciar, no se toca
+        borrados = ContenidoArchivo.query \
+            .filter(ContenidoArchivo.sha256 == clave, ContenidoArchivo.referencias <= 0) \
+            .delete(synchronize_session=False)
+        if borrados:
+            # El archivo se aparta antes del commit: una subida que ya no vea la fila escribe
+            # el suyo en la ruta libre, y una que aún la vea falla al sumar la referencia
+            apartado = almacen.apartar(clave)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        almacen.devolver(clave, apartado)
+        print(f"Error purgando contenido {clave}: {e}")
+        return
+
+    try:
+        if borrados:
+            from .thumbnails import descartar_miniatura
+            from .pdf_optimize import descartar_optimizacion
+            from .pages import descartar_estructura
+            almacen.descartar(apartado)
+            descartar_miniatura(clave)
+            descartar_estructura(clave)
+            descartar_optimizacion(clave)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error purgando contenido {clave}: {e}")
+
+
+def sincronizar_referencias():
+    """Recalcula los contadores desde los documentos, sus versiones anteriores y las variantes
+    optimizadas (reparación / migración).
+
+    Crea el ContenidoArchivo de archivos en disco subidos antes de la deduplicación.
+    """
+    from models import db, Documento, DocumentoVersion, ContenidoArchivo, OptimizacionPDF
+
+    conteos = db.session.query(Documento.storage_backend, Documento.storage_key,
+                               func.count(Documento.id), func.max(Documento.size_bytes)) \
+        .filter(Documento.storage_key.isnot(None)) \
+        .group_by(Documento.storage_backend, Documento.storage_key).all()
+    conteos += db.session.query(DocumentoVersion.storage_backend, DocumentoVersion.storage_key,
+                                func.count(DocumentoVersion.id), func.max(DocumentoVersion.size_bytes)) \
+        .filter(DocumentoVersion.storage_key.isnot(None)) \
+        .group_by(DocumentoVersion.storage_backend, DocumentoVersion.storage_key).all()
+    conteos += db.session.query(OptimizacionPDF.storage_backend, OptimizacionPDF.storage_key,
+                                func.count(OptimizacionPDF.id), func.max(OptimizacionPDF.bytes_optimizado)) \
+        .filter(OptimizacionPDF.storage_key.isnot(None)) \
+        .group_by(OptimizacionPDF.storage_backend, OptimizacionPDF.storage_key).all()
+
+    vistos = {}
+    for backend, clave, cantidad, size in conteos:
+        vistos[clave] = vistos.get(clave, 0) + cantidad
+        contenido = ContenidoArchivo.query.filter_by(sha256=clave).first()
+        if contenido is None:
+            contenido = ContenidoArchivo(sha256=clave, size_bytes=size or 0, storage_backend=backend)
+            db.session.add(contenido)
+        contenido.referencias = vistos[clave]
+
+    huerfanos = ContenidoArchivo.query.filter(ContenidoArchivo.sha256.notin_(list(vistos))).all() \
+        if vistos else ContenidoArchivo.query.all()
+    for contenido in huerfanos:
+        contenido.referencias = 0
+    db.session.commit()
+
+    for contenido in huerfanos:
+        purgar_contenido(contenido.storage_backend, contenido.sha256)
+
+
+def reporte_deduplicacion():
+    """Bytes lógicos (lo que ocuparía sin deduplicar) frente a bytes realmente almacenados."""
+    from models import db, Documento, ContenidoArchivo
+
+    contenidos, almacenados, referencias = db.session.query(
+        func.count(ContenidoArchivo.id),
+        func.coalesce(func.sum(ContenidoArchivo.size_bytes), 0),
+        func.coalesce(func.sum(ContenidoArchivo.referencias), 0)
+    ).one()
+    logicos = db.session.query(func.coalesce(func.sum(Documento.size_bytes), 0)) \
+        .filter(Documento.storage_key.isnot(None)).scalar()
+
+    return {
+        'contenidos': contenidos,
+        'referencias': int(referencias),
+        'bytes_almacenados': int(almacenados),
+        'bytes_logicos': int(logicos),
+        'bytes_ahorrados': max(int(logicos) - int(almacenados), 0),
+    }
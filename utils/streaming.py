@@ -0,0 +1,214 @@
+# utils/streaming.py
+"""Respuestas de descarga por trozos con soporte de HTTP Range (206) y GET condicional (304)."""
+import os
+import zipfile
+import pytz
+from flask import Response, request, send_file, stream_with_context, abort, current_app
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified
+
+from .storage import almacenamiento_de
+
+
+def respuesta_documento(doc, as_attachment=False, variante=None):
+    """Entrega un documento sin cargarlo completo en memoria.
+
+    - Archivo en disco: send_file sobre la ruta (sendfile del SO; Werkzeug resuelve Range).
+    - BLOB en MySQL: se lee por trozos con SUBSTRING y se responde 200/206 según Range.
+
+    `variante` (OptimizacionPDF) se entrega en lugar del original, con el nombre del documento.
+    """
+    archivo = variante or doc
+    etag = variante.storage_key if variante else doc.sha256
+    ultima_modificacion = _fecha_utc(variante.fecha if variante else doc.fecha_subida)
+
+    # 304 solo con metadatos: no se toca el archivo ni el BLOB
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima_modificacion):
+        respuesta = Response(status=304)
+        return _aplicar_cache(respuesta, etag, ultima_modificacion)
+
+    almacen = almacenamiento_de(archivo)
+
+    ruta = almacen.ruta(archivo)
+    if ruta:
+        respuesta = send_file(ruta, mimetype=doc.mimetype, conditional=True,
+                              etag=etag or True, last_modified=ultima_modificacion,
+                              as_attachment=as_attachment, download_name=doc.filename)
+        return _aplicar_cache(respuesta, etag, ultima_modificacion)
+
+    total = almacen.tamano(archivo)
+    if not total:
+        abort(404)
+
+    inicio, fin, status = 0, total, 200
+    rango = request.range
+    # Un solo rango; si piden varios (multipart/byteranges) se entrega el archivo completo
+    if rango and rango.units == 'bytes' and len(rango.ranges) == 1 \
+            and _if_range_valido(etag, ultima_modificacion):
+        limites = rango.range_for_length(total)
+        if limites is None:
+            raise RequestedRangeNotSatisfiable(length=total)
+        inicio, fin = limites
+        status = 206
+
+    respuesta = Response(
+        stream_with_context(almacen.iterar(archivo, inicio, fin)),
+        status=status,
+        mimetype=doc.mimetype,
+        direct_passthrough=True
+    )
+    respuesta.headers['Accept-Ranges'] = 'bytes'
+    respuesta.content_length = fin - inicio
+    if status == 206:
+        respuesta.headers['Content-Range'] = f'bytes {inicio}-{fin - 1}/{total}'
+    respuesta.headers.set('Content-Disposition',
+                          'attachment' if as_attachment else 'inline',
+                          filename=doc.filename)
+    return _aplicar_cache(respuesta, etag, ultima_modificacion)
+
+
+def respuesta_paginas(doc, desde, hasta=None, as_attachment=False, variante=None):
+    """PDF con solo las páginas desde..hasta (1 = primera; sin `hasta`, hasta el final).
+
+    El extracto se arma una vez por (sha256, rango) y queda en la caché de páginas; si el
+    rango cubre todo el documento se entrega el archivo completo.
+    """
+    from .pages import obtener_estructura, extracto_paginas
+
+    estructura = obtener_estructura(doc)
+    if estructura is None:
+        abort(404)
+    hasta = hasta or estructura.paginas
+    if not 1 <= desde <= hasta <= estructura.paginas:
+        abort(400, description=f'Rango de páginas no válido (el documento tiene {estructura.paginas}).')
+    if desde == 1 and hasta == estructura.paginas:
+        return respuesta_documento(doc, as_attachment=as_attachment, variante=variante)
+
+    archivo = variante or doc
+    sha256 = variante.storage_key if variante else doc.sha256
+    etag = f'{sha256}-{desde}-{hasta}'
+    ultima_modificacion = _fecha_utc(variante.fecha if variante else doc.fecha_subida)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=ultima_modificacion):
+        respuesta = Response(status=304)
+        return _aplicar_cache(respuesta, etag, ultima_modificacion)
+
+    ruta = extracto_paginas(archivo, sha256, desde, hasta)
+    if ruta is None:
+        abort(404)
+    base = os.path.splitext(doc.filename or f'documento_{doc.id}.pdf')[0]
+    respuesta = send_file(ruta, mimetype=doc.mimetype, conditional=True,
+                          etag=etag, last_modified=ultima_modificacion,
+                          as_attachment=as_attachment, download_name=f'{base}_p{desde}-{hasta}.pdf')
+    return _aplicar_cache(respuesta, etag, ultima_modificacion)
+
+
+def respuesta_zip(nombre_archivo, documentos):
+    """ZIP de los documentos generado mientras se envía.
+
+    Entradas sin compresión (los PDF ya vienen comprimidos), un documento a la vez y por
+    trozos: la memoria no depende del tamaño del área. Como la salida no es posicionable,
+    zipfile escribe tamaño y CRC después de cada archivo (data descriptor) y usa ZIP64
+    cuando hace falta.
+    """
+    def generar():
+        salida = _SalidaZip()
+        usados = set()
+        with zipfile.ZipFile(salida, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archivo_zip:
+            for doc in documentos:
+                almacen = almacenamiento_de(doc)
+                total = almacen.tamano(doc)
+                if not total:
+                    continue
+                info = zipfile.ZipInfo(_nombre_en_zip(doc, usados), date_time=_fecha_zip(doc.fecha_subida))
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = total  # zipfile decide ZIP64 con este dato
+                with archivo_zip.open(info, mode='w') as destino:
+                    yield salida.vaciar()  # Cabecera local: el primer byte sale antes de leer el archivo
+                    for trozo in almacen.iterar(doc, 0, total):
+                        destino.write(trozo)
+                        yield salida.vaciar()
+        yield salida.vaciar()  # Directorio central
+
+    respuesta = Response(stream_with_context(generar()), mimetype='application/zip',
+                         direct_passthrough=True)
+    respuesta.headers.set('Content-Disposition', 'attachment', filename=nombre_archivo)
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_store = True
+    return respuesta
+
+
+class _SalidaZip:
+    """Destino sin seek para ZipFile: guarda lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _nombre_en_zip(doc, usados):
+    """Nombre original sin rutas; si se repite dentro del ZIP se agrega (2), (3)..."""
+    nombre = (doc.filename or '').replace('/', '_').replace('\\', '_').strip() or f'documento_{doc.id}.pdf'
+    base, extension = os.path.splitext(nombre)
+    numero = 2
+    while nombre.lower() in usados:
+        nombre = f'{base} ({numero}){extension}'
+        numero += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def _fecha_zip(fecha):
+    # El formato ZIP no admite fechas anteriores a 1980
+    if fecha is None or fecha.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return fecha.timetuple()[:6]
+
+
+def _fecha_utc(fecha):
+    """fecha_subida se guarda en hora de Chile sin zona; HTTP exige UTC."""
+    if fecha is None:
+        return None
+    if fecha.tzinfo is None:
+        fecha = pytz.timezone('America/Santiago').localize(fecha)
+    return fecha.astimezone(pytz.utc)
+
+
+def _if_range_valido(etag, ultima_modificacion):
+    """Con If-Range el rango solo aplica si el validador sigue vigente."""
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return ultima_modificacion is not None and if_range.date >= ultima_modificacion
+    return True
+
+
+def _aplicar_cache(respuesta, etag, ultima_modificacion):
+    """Caché privada: el repositorio requiere sesión, ningún proxy compartido debe guardarlo."""
+    if etag:
+        respuesta.set_etag(etag)
+    if ultima_modificacion:
+        respuesta.last_modified = ultima_modificacion
+    respuesta.cache_control.public = False
+    respuesta.cache_control.no_cache = None
+    respuesta.cache_control.private = True
+    respuesta.cache_control.max_age = current_app.config['DOCUMENT_CACHE_MAX_AGE']
+    respuesta.cache_control.must_revalidate = True
+    respuesta.vary.add('Cookie')
+    return respuesta
@@ -0,0 +1,206 @@
+# utils/thumbnails.py
+"""Miniaturas de la primera página de cada PDF, en una caché de disco acotada (LRU).
+
+- Una miniatura por sha256: los documentos con el mismo contenido comparten imagen.
+- pypdf no rasteriza páginas: se usa la imagen más grande incrustada en la primera
+  página (documentos escaneados) y, si no hay, una vista del texto de esa página.
+- Al superar THUMBNAIL_CACHE_MAX_MB se eliminan las miniaturas usadas hace más tiempo
+  (ver disk_cache).
+"""
+import os
+import textwrap
+from io import BytesIO
+from flask import Response, request, send_file, current_app
+from werkzeug.http import is_resource_modified
+
+from .disk_cache import marcar_uso, guardar_atomico, recortar_directorio, registrar_escritura
+from .jobs import tarea, encolar_unica
+
+ANCHO = 240
+CALIDAD_JPEG = 80
+MIN_LADO_IMAGEN = 100          # Imágenes menores (logos, íconos) no sirven de portada
+MAX_EDAD_NAVEGADOR = 30 * 24 * 3600  # La URL lleva el sha256: el contenido no cambia
+
+
+def _ruta_miniatura(sha256):
+    raiz = current_app.config['THUMBNAIL_CACHE_PATH']
+    return os.path.join(raiz, sha256[:2], f'{sha256}.jpg')
+
+
+def miniatura_en_cache(sha256):
+    """Ruta de la miniatura si existe (y la marca como recién usada); None si no."""
+    if not sha256:
+        return None
+    ruta = _ruta_miniatura(sha256)
+    return ruta if marcar_uso(ruta) else None
+
+
+def generar_miniatura(origen):
+    """JPEG (bytes) de la primera página de un PDF (ruta, bytes o archivo); None si no se puede leer."""
+    from pypdf import PdfReader
+
+    if isinstance(origen, (bytes, bytearray)):
+        origen = BytesIO(origen)
+    try:
+        pagina = PdfReader(origen).pages[0]
+        imagen = _imagen_principal(pagina) or _vista_texto(pagina)
+    except Exception as e:
+        print(f"Error generando miniatura: {e}")
+        return None
+
+    if imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    imagen.thumbnail((ANCHO, ANCHO * 2))
+    salida = BytesIO()
+    imagen.save(salida, format='JPEG', quality=CALIDAD_JPEG, optimize=True)
+    return salida.getvalue()
+
+
+def _imagenes_candidatas(recursos, vistas):
+    """(área, XObject) de las imágenes de los recursos, también dentro de formularios.
+
+    El tamaño sale de /Width y /Height del diccionario: aquí no se decodifica nada.
+    """
+    try:
+        xobjects = recursos.get_object()['/XObject'].get_object()
+    except (KeyError, AttributeError, TypeError):
+        return
+    for nombre in xobjects:
+        xobject = xobjects[nombre].get_object()
+        referencia = getattr(xobject, 'indirect_reference', None)
+        clave = (referencia.idnum, referencia.generation) if referencia else id(xobject)
+        if clave in vistas:
+            continue  # Formularios que se incluyen a sí mismos o imágenes repetidas
+        vistas.add(clave)
+        subtipo = xobject.get('/Subtype')
+        if subtipo == '/Image':
+            ancho, alto = int(xobject.get('/Width', 0)), int(xobject.get('/Height', 0))
+            if min(ancho, alto) >= MIN_LADO_IMAGEN:
+                yield ancho * alto, xobject
+        elif subtipo == '/Form':
+            yield from _imagenes_candidatas(xobject.get('/Resources'), vistas)
+
+
+def _imagen_principal(pagina):
+    """La imagen incrustada más grande de la página, o None.
+
+    Se decodifica solo la elegida (o la siguiente, si Pillow no puede con su filtro).
+    """
+    candidatas = sorted(_imagenes_candidatas(pagina.get('/Resources'), set()),
+                        key=lambda candidata: candidata[0], reverse=True)
+    for _, xobject in candidatas:
+        try:
+            imagen = xobject.decode_as_image()
+        except Exception:
+            continue  # Filtros que Pillow no decodifica (JBIG2, etc.)
+        if imagen is not None:
+            return imagen
+    return None
+
+
+def _vista_texto(pagina):
+    """Hoja en blanco con las primeras líneas del texto, en la proporción de la página."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    ancho_pdf, alto_pdf = float(pagina.mediabox.width), float(pagina.mediabox.height)
+    alto = int(ANCHO * min(max(alto_pdf / ancho_pdf, 0.5), 2)) if ancho_pdf else int(ANCHO * 1.41)
+    imagen = Image.new('RGB', (ANCHO, alto), 'white')
+    dibujo = ImageDraw.Draw(imagen)
+
+    try:
+        fuente = ImageFont.truetype('DejaVuSans.ttf', 9)  # Con tildes y ñ; no siempre está instalada
+    except OSError:
+        fuente = ImageFont.load_default(size=9)
+    margen, interlineado = 12, 11
+    lineas = []
+    for parrafo in (pagina.extract_text() or '').splitlines():
+        lineas.extend(textwrap.wrap(parrafo, 42) or [''])
+    y = margen
+    for linea in lineas:
+        if y > alto - margen - interlineado:
+            break
+        dibujo.text((margen, y), linea, fill=(60, 60, 60), font=fuente)
+        y += interlineado
+
+    dibujo.rectangle((0, 0, ANCHO - 1, alto - 1), outline=(210, 210, 210))
+    return imagen
+
+
+def guardar_en_cache(sha256, datos):
+    """Escribe la miniatura (archivo temporal + os.replace) y recorta la caché si hace falta."""
+    ruta = guardar_atomico(_ruta_miniatura(sha256), lambda destino: destino.write(datos))
+    registrar_escritura(current_app.config['THUMBNAIL_CACHE_PATH'], '.jpg', len(datos),
+                        current_app.config['THUMBNAIL_CACHE_MAX_MB'] * 1024 * 1024)
+    return ruta
+
+
+def recortar_cache(limite_bytes=None):
+    """Elimina las miniaturas menos usadas hasta quedar bajo el límite. Devuelve cuántas borró."""
+    if limite_bytes is None:
+        limite_bytes = current_app.config['THUMBNAIL_CACHE_MAX_MB'] * 1024 * 1024
+    return recortar_directorio(current_app.config['THUMBNAIL_CACHE_PATH'], '.jpg', limite_bytes)
+
+
+def descartar_miniatura(sha256):
+    """Quita la miniatura de un contenido que se eliminó del almacenamiento."""
+    if not sha256:
+        return
+    try:
+        os.remove(_ruta_miniatura(sha256))
+    except FileNotFoundError:
+        pass
+
+
+def obtener_miniatura(doc, encolar_si_falta=False):
+    """Ruta de la miniatura del documento; la genera desde el almacenamiento si no está en caché.
+
+    Con `encolar_si_falta` (peticiones web), un archivo que no está en disco (BLOB en MySQL) no
+    se carga completo en la petición: se encola 'generar_miniatura' y devuelve None.
+    """
+    from .storage import almacenamiento_de
+
+    ruta = miniatura_en_cache(doc.sha256)
+    if ruta or not doc.sha256:
+        return ruta
+
+    almacen = almacenamiento_de(doc)
+    ruta_pdf = almacen.ruta(doc)
+    if ruta_pdf is None and encolar_si_falta:
+        encolar_unica('generar_miniatura', documento_id=doc.id)
+        return None
+    origen = ruta_pdf or almacen.abrir(doc)
+    datos = generar_miniatura(origen) if origen else None
+    if datos is None:
+        return None
+    return guardar_en_cache(doc.sha256, datos)
+
+
+def respuesta_miniatura(doc):
+    """JPEG de la miniatura con caché privada larga; 304 sin tocar el disco si el ETag coincide.
+
+    Devuelve None si el documento no tiene miniatura posible o si aún se está generando.
+    """
+    etag = f"min-{doc.sha256}"
+    if doc.sha256 and not is_resource_modified(request.environ, etag=etag):
+        respuesta = Response(status=304)
+    else:
+        ruta = obtener_miniatura(doc, encolar_si_falta=True)
+        if ruta is None:
+            return None
+        respuesta = send_file(ruta, mimetype='image/jpeg', etag=False, conditional=False)
+
+    respuesta.set_etag(etag)
+    respuesta.cache_control.no_cache = None
+    respuesta.cache_control.private = True
+    respuesta.cache_control.max_age = MAX_EDAD_NAVEGADOR
+    respuesta.vary.add('Cookie')
+    return respuesta
+
+
+@tarea('generar_miniatura')
+def _tarea_generar_miniatura(documento_id):
+    from models import db, Documento
+
+    doc = db.session.get(Documento, documento_id)
+    if doc is not None:
+        obtener_miniatura(doc)
@@ -0,0 +1,81 @@
+# utils/uploads.py
+"""Procesamiento de subidas por trozos: hash incremental, validación PDF y spool a disco."""
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024           # 1 MB por lectura
+SPOOL_MAX_MEMORIA = 1024 * 1024    # Sobre 1 MB el spool pasa a archivo temporal
+FIRMA_PDF = b'%PDF-'
+
+
+class ArchivoNoValido(Exception):
+    """El contenido subido no es un PDF aceptable."""
+
+
+class SubidaProcesada:
+    """Archivo ya hasheado y guardado en un temporal, listo para el backend de almacenamiento."""
+
+    def __init__(self, archivo, sha256, size_bytes):
+        self.archivo = archivo
+        self.sha256 = sha256
+        self.size_bytes = size_bytes
+
+    def close(self):
+        self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def procesar_subida(stream, chunk_size=CHUNK_SIZE):
+    """Consume el stream en trozos fijos; la memoria usada no depende del tamaño del archivo.
+
+    La firma %PDF- se valida en el primer trozo (la norma tolera basura antes del encabezado,
+    por eso se busca en los primeros 1024 bytes) en vez de confiar en la extensión.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORIA)
+    try:
+        sha256, size = _consumir(stream, spool, chunk_size)
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return SubidaProcesada(spool, sha256, size)
+
+
+def procesar_archivo(ruta, chunk_size=CHUNK_SIZE):
+    """Igual que procesar_subida, pero sobre un archivo ya en disco (sin copiarlo)."""
+    archivo = open(ruta, 'rb')
+    try:
+        sha256, size = _consumir(archivo, None, chunk_size)
+    except Exception:
+        archivo.close()
+        raise
+
+    archivo.seek(0)
+    return SubidaProcesada(archivo, sha256, size)
+
+
+def _consumir(origen, destino, chunk_size):
+    """Lee por trozos validando la firma PDF; devuelve (sha256, tamaño)."""
+    hasher = hashlib.sha256()
+    size = 0
+
+    while True:
+        trozo = origen.read(chunk_size)
+        if not trozo:
+            break
+        if size == 0 and FIRMA_PDF not in trozo[:1024]:
+            raise ArchivoNoValido('El archivo no es un PDF válido.')
+        hasher.update(trozo)
+        if destino is not None:
+            destino.write(trozo)
+        size += len(trozo)
+
+    if size == 0:
+        raise ArchivoNoValido('El archivo está vacío.')
+    return hasher.hexdigest(), size
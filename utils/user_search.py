@@ -0,0 +1,104 @@
+# utils/user_search.py
+"""Búsqueda de usuarios por prefijo de palabra, sin distinguir tildes ni mayúsculas.
+
+Cada usuario tiene sus términos en `usuarios_terminos` (PK termino, usuario_id): las
+palabras del nombre y del email, normalizadas. Buscar "perez" es un rango sobre esa PK
+(LIKE 'perez%'), no un recorrido de la tabla de usuarios como ILIKE '%perez%'.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+from sqlalchemy import event, select, inspect
+from sqlalchemy.orm import joinedload
+
+from models import db, Usuario, UsuarioTermino
+
+LARGO_TERMINO = 100
+
+PaginaUsuarios = namedtuple('PaginaUsuarios', ['usuarios', 'cursor_siguiente'])
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Muñoz Pérez' -> 'munoz perez'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def terminos_usuario(nombre, email):
+    """Palabras del nombre, partes del email antes de la @ y el email completo."""
+    email = normalizar(email).strip()
+    terminos = set(re.findall(r'\w+', normalizar(nombre)))
+    terminos.update(re.findall(r'\w+', email.split('@')[0]))
+    if email:
+        terminos.add(email)
+    return {t[:LARGO_TERMINO] for t in terminos}
+
+
+def _consulta_terminos(texto):
+    """Prefijos a buscar: el texto completo si parece un email, si no cada palabra."""
+    texto = normalizar(texto).strip()
+    if '@' in texto:
+        return [texto[:LARGO_TERMINO]]
+    return [t[:LARGO_TERMINO] for t in re.findall(r'\w+', texto)]
+
+
+def filtrar_por_texto(query, texto):
+    """Agrega a la consulta de Usuario un filtro por cada palabra del texto (todas deben calzar)."""
+    for prefijo in _consulta_terminos(texto):
+        query = query.filter(Usuario.id.in_(
+            select(UsuarioTermino.usuario_id)
+            .where(UsuarioTermino.termino.startswith(prefijo, autoescape=True))
+        ))
+    return query
+
+
+def buscar_usuarios(texto='', rol_id=None, activo=None, cursor=None, limite=10):
+    """Usuarios ordenados por id, paginados por cursor (el último id entregado)."""
+    query = filtrar_por_texto(Usuario.query.options(joinedload(Usuario.rol)), texto)
+    if rol_id:
+        query = query.filter(Usuario.rol_id == rol_id)
+    if activo is not None:
+        query = query.filter(Usuario.activo == activo)
+    if cursor and str(cursor).isdigit():
+        query = query.filter(Usuario.id > int(cursor))
+
+    usuarios = query.order_by(Usuario.id).limit(limite + 1).all()
+
+    siguiente = None
+    if len(usuarios) > limite:
+        usuarios = usuarios[:limite]
+        siguiente = str(usuarios[-1].id)
+    return PaginaUsuarios(usuarios, siguiente)
+
+
+def _guardar_terminos(conexion, usuario):
+    tabla = UsuarioTermino.__table__
+    conexion.execute(tabla.delete().where(tabla.c.usuario_id == usuario.id))
+    terminos = terminos_usuario(usuario.nombre_completo, usuario.email)
+    if terminos:
+        conexion.execute(tabla.insert(), [{'termino': t, 'usuario_id': usuario.id} for t in terminos])
+
+
+@event.listens_for(Usuario, 'after_insert')
+def _terminos_al_crear(mapper, conexion, usuario):
+    _guardar_terminos(conexion, usuario)
+
+
+@event.listens_for(Usuario, 'after_update')
+def _terminos_al_editar(mapper, conexion, usuario):
+    estado = inspect(usuario)
+    if estado.attrs.nombre_completo.history.has_changes() or estado.attrs.email.history.has_changes():
+        _guardar_terminos(conexion, usuario)
+
+
+def reindexar_usuarios():
+    """Reconstruye los términos de todos los usuarios (usuarios creados antes de esta tabla)."""
+    tabla = UsuarioTermino.__table__
+    usuarios = db.session.query(Usuario.id, Usuario.nombre_completo, Usuario.email).all()
+    db.session.execute(tabla.delete())
+    filas = [{'termino': t, 'usuario_id': u.id}
+             for u in usuarios for t in terminos_usuario(u.nombre_completo, u.email)]
+    if filas:
+        db.session.execute(tabla.insert(), filas)
+    db.session.commit()
+    return len(usuarios)
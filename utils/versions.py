@@ -0,0 +1,214 @@
+# utils/versions.py
+"""Historial de versiones de los documentos.
+
+- La versión vigente sigue en la fila de Documento (las consultas y descargas no cambian).
+- Al reemplazar el archivo, los metadatos de la vigente se copian a DocumentoVersion, que se
+  queda con su referencia al ContenidoArchivo; el documento pasa a apuntar al contenido nuevo.
+  No se copia ni se borra ningún archivo: es un INSERT pequeño y un cambio de puntero.
+- Restaurar una versión también agrega historial (la vigente se archiva primero).
+- Reemplazar o restaurar actualiza Documento.fecha_subida (fecha del archivo vigente): de ahí
+  salen Last-Modified e If-Range al descargar.
+- El contenido de una versión solo se purga cuando se elimina el documento.
+- Documento legado (BLOB en documentos.archivo_data, sin storage_key): la versión archivada
+  apunta a ese mismo BLOB (storage_key NULL) y el worker lo migra después (tarea
+  'migrar_legado'); la petición no copia el archivo.
+"""
+import hashlib
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
+
+from .helpers import obtener_hora_chile
+from .jobs import tarea, encolar_unica
+
+REINTENTOS_NUMERO = 5  # Ediciones simultáneas del mismo documento que chocan en el número
+
+
+def _ahora():
+    return obtener_hora_chile().replace(tzinfo=None)
+
+
+def _tiene_blob_legado(doc):
+    from models import db, Documento
+
+    return db.session.query(Documento.id) \
+        .filter(Documento.id == doc.id, Documento.archivo_data.isnot(None)).first() is not None
+
+
+def _insertar_con_numero(version):
+    """Inserta la versión con el número siguiente del documento (en un SAVEPOINT). Si otra
+    edición simultánea tomó el mismo número (UniqueConstraint), vuelve a intentar."""
+    from models import db, DocumentoVersion
+
+    for intento in range(REINTENTOS_NUMERO):
+        # FOR UPDATE: lectura con bloqueo, ve el último número confirmado por otra transacción
+        ultimo = db.session.query(func.max(DocumentoVersion.numero)) \
+            .filter(DocumentoVersion.documento_id == version.documento_id).with_for_update().scalar()
+        version.numero = (ultimo or 0) + 1
+        try:
+            with db.session.begin_nested():
+                db.session.add(version)
+            return version
+        except IntegrityError:
+            if intento == REINTENTOS_NUMERO - 1:
+                raise
+
+
+def archivar_version_actual(doc, usuario_nombre=None):
+    """Copia los metadatos de la versión vigente al historial (sin commit).
+
+    La referencia del documento al contenido pasa a la fila de historial, así que después hay
+    que asociar el documento a otro contenido (guardar) o sumarle una referencia.
+    Devuelve la DocumentoVersion, o None si el documento no tenía archivo.
+    """
+    from models import DocumentoVersion
+
+    if not doc.storage_key and not _tiene_blob_legado(doc):
+        return None
+
+    version = DocumentoVersion(
+        documento_id=doc.id,
+        version=doc.version,
+        filename=doc.filename,
+        mimetype=doc.mimetype,
+        size_bytes=doc.size_bytes,
+        sha256=doc.sha256,
+        storage_backend=doc.storage_backend,
+        storage_key=doc.storage_key,  # NULL: BLOB legado del documento (lo migra el worker)
+        fecha_subida=doc.fecha_subida,  # Vigente desde
+        fecha_reemplazo=_ahora(),
+        reemplazado_por=usuario_nombre,
+    )
+    return _insertar_con_numero(version)
+
+
+def reemplazar_archivo(doc, subida, filename, usuario_nombre=None):
+    """Deja la versión vigente en el historial y asocia el documento al archivo subido (sin commit).
+
+    Si el archivo es idéntico al vigente no se crea versión y devuelve False.
+    """
+    from .storage import obtener_almacenamiento
+
+    if doc.storage_key and subida.sha256 == doc.sha256:
+        doc.filename = filename
+        return False
+
+    archivada = archivar_version_actual(doc, usuario_nombre)
+    doc.filename = filename
+    doc.mimetype = 'application/pdf'
+    doc.size_bytes = subida.size_bytes
+    doc.sha256 = subida.sha256
+    doc.fecha_subida = _ahora()
+    # Si la versión archivada es el BLOB legado, documentos.archivo_data se conserva
+    obtener_almacenamiento().guardar(doc, subida.archivo,
+                                     conservar_legado=archivada is not None and not archivada.storage_key)
+    return True
+
+
+def restaurar_version(doc, version, usuario_nombre=None):
+    """Vuelve a dejar vigente una versión anterior (sin commit). La vigente pasa al historial y la
+    restaurada se conserva en él: el documento solo suma una referencia a ese contenido."""
+    from models import ContenidoArchivo
+
+    if version.storage_key == doc.storage_key:
+        return False
+
+    archivar_version_actual(doc, usuario_nombre)
+    if version.storage_key:
+        ContenidoArchivo.query.filter_by(sha256=version.storage_key) \
+            .update({ContenidoArchivo.referencias: ContenidoArchivo.referencias + 1},
+                    synchronize_session=False)
+    doc.version = version.version
+    doc.filename = version.filename
+    doc.mimetype = version.mimetype
+    doc.size_bytes = version.size_bytes
+    doc.sha256 = version.sha256
+    doc.storage_backend = version.storage_backend
+    doc.storage_key = version.storage_key
+    doc.fecha_subida = _ahora()
+    return True
+
+
+def encolar_migracion_legado(doc):
+    """Después del commit: si el historial quedó apuntando al BLOB legado, lo migra el worker."""
+    from models import db, DocumentoVersion
+
+    pendiente = db.session.query(DocumentoVersion.id) \
+        .filter(DocumentoVersion.documento_id == doc.id, DocumentoVersion.storage_key.is_(None)).first()
+    if pendiente is not None:
+        encolar_unica('migrar_legado', documento_id=doc.id)
+
+
+def migrar_legado(documento_id):
+    """Pasa el BLOB de documentos.archivo_data al almacenamiento deduplicado (sin commit), junto
+    con el documento y las versiones anteriores que apuntan a él.
+
+    Devuelve el ContenidoArchivo, o None si el documento no tiene BLOB legado.
+    """
+    from models import db, Documento, DocumentoVersion, ContenidoArchivo
+    from .storage import obtener_almacenamiento
+
+    doc = db.session.get(Documento, documento_id, options=[undefer(Documento.archivo_data)])
+    if doc is None or not doc.archivo_data:
+        return None
+    data = doc.archivo_data
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    versiones = DocumentoVersion.query \
+        .filter(DocumentoVersion.documento_id == doc.id, DocumentoVersion.storage_key.is_(None)).all()
+    referencias = len(versiones) + (0 if doc.storage_key else 1)
+    if not referencias:
+        doc.archivo_data = None  # Nadie lo usa ya
+        return None
+
+    contenido = ContenidoArchivo.query.filter_by(sha256=sha256).first()
+    if contenido is None:
+        contenido = obtener_almacenamiento().escribir_nuevo(sha256, len(data), data)
+        contenido.referencias = referencias
+        db.session.add(contenido)
+    else:
+        contenido.referencias = ContenidoArchivo.referencias + referencias
+
+    for ubicacion in versiones + ([] if doc.storage_key else [doc]):
+        ubicacion.sha256 = sha256
+        ubicacion.storage_backend = contenido.storage_backend
+        ubicacion.storage_key = sha256
+    doc.archivo_data = None
+    return contenido
+
+
+@tarea('migrar_legado')
+def _tarea_migrar_legado(documento_id):
+    from models import db
+
+    migrar_legado(documento_id)
+    db.session.commit()
+
+
+def historial(doc):
+    """Versiones anteriores del documento, de la más reciente a la más antigua."""
+    from models import DocumentoVersion
+
+    return DocumentoVersion.query.filter_by(documento_id=doc.id) \
+        .order_by(DocumentoVersion.numero.desc()).all()
+
+
+def soltar_versiones(documento_ids):
+    """Borra el historial de los documentos y resta sus referencias (antes del commit que los
+    elimina). Devuelve [(backend, clave), ...] para purgar_contenido después del commit."""
+    from models import db, ContenidoArchivo, DocumentoVersion
+
+    if not documento_ids:
+        return []
+    filtro = DocumentoVersion.documento_id.in_(documento_ids)
+    conteos = db.session.query(DocumentoVersion.storage_backend, DocumentoVersion.storage_key,
+                               func.count(DocumentoVersion.id)) \
+        .filter(filtro).group_by(DocumentoVersion.storage_backend, DocumentoVersion.storage_key).all()
+    for _, clave, cantidad in conteos:
+        if not clave:
+            continue  # BLOB legado: se va con la fila del documento
+        ContenidoArchivo.query.filter_by(sha256=clave) \
+            .update({ContenidoArchivo.referencias: ContenidoArchivo.referencias - cantidad},
+                    synchronize_session=False)
+    DocumentoVersion.query.filter(filtro).delete(synchronize_session=False)
+    return [(backend, clave) for backend, clave, _ in conteos]
@@ -0,0 +1,43 @@
+# verificar_integridad.py
+import argparse
+from app import create_app
+from utils import verificar_pendientes
+
+app = create_app()
+
+def verificar(dias, limite, max_minutos, mb_por_segundo):
+    """Relee los archivos con verificación vencida y compara su sha256 y tamaño.
+
+    Pensado para cron (p. ej. cada noche con --max-minutos 60): cada ejecución sigue donde
+    quedó la anterior, y las diferencias quedan en el Log y en /admin/integridad.
+    """
+    with app.app_context(), app.test_request_context():
+        print("\n--- VERIFICACIÓN DE INTEGRIDAD ---")
+        revisados = leidos = 0
+        problemas = []
+        for resultado in verificar_pendientes(dias=dias, limite=limite,
+                                              max_segundos=max_minutos * 60 if max_minutos else None,
+                                              mb_por_segundo=mb_por_segundo):
+            revisados += 1
+            leidos += resultado.bytes_leidos
+            pendiente = resultado.pendiente
+            if resultado.estado != 'ok':
+                problemas.append(resultado)
+                print(f"  [{pendiente.tipo} {pendiente.clave[:16]}] {resultado.estado}: {resultado.detalle}")
+            elif revisados % 100 == 0:
+                print(f"  {revisados} archivos verificados ({leidos / 1024 / 1024:.1f} MB)")
+
+        print(f"¡Listo! {revisados} archivos verificados ({leidos / 1024 / 1024:.1f} MB), "
+              f"{len(problemas)} con problemas.")
+
+if __name__ == '__main__':
+    configuracion = app.config
+    parser = argparse.ArgumentParser(description='Verifica el sha256 de los archivos guardados.')
+    parser.add_argument('--dias', type=int, default=configuracion['VERIFY_INTERVAL_DAYS'],
+                        help='Reverificar lo verificado hace más de estos días (0 = todo).')
+    parser.add_argument('--limite', type=int, default=None, help='Máximo de archivos en esta ejecución.')
+    parser.add_argument('--max-minutos', type=float, default=None, help='Detenerse después de estos minutos.')
+    parser.add_argument('--mb-por-segundo', type=float, default=configuracion['VERIFY_MAX_MB_S'],
+                        help='Tasa máxima de lectura (0 = sin límite).')
+    args = parser.parse_args()
+    verificar(args.dias, args.limite, args.max_minutos, args.mb_por_segundo)
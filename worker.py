@@ -0,0 +1,101 @@
+# worker.py
+import argparse
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app import create_app
+from models import db
+from utils import limpiar_subidas_abandonadas
+from utils.jobs import (reclamar_tareas, ejecutar_tarea, recuperar_tareas_colgadas, marcar_latido,
+                        limpiar_tareas_completadas)
+
+INTERVALO_MANTENIMIENTO = 300  # segundos
+
+app = None
+detener = False
+
+def _iniciar_proceso():
+    """Cada proceso hijo crea su propia app (y su propio pool de conexiones)."""
+    global app
+    app = create_app()
+
+def _ejecutar(tarea_id):
+    with app.app_context():
+        try:
+            ejecutar_tarea(tarea_id)
+        finally:
+            db.session.remove()
+
+def _mantenimiento():
+    recuperadas = recuperar_tareas_colgadas()
+    if recuperadas:
+        print(f"Tareas colgadas devueltas a la cola: {recuperadas}")
+    limpiar_tareas_completadas()
+    limpiar_subidas_abandonadas()
+
+def _senal_detener(signum, frame):
+    global detener
+    detener = True
+    print("Deteniendo worker: se terminan las tareas en curso...")
+
+def _crear_pool(modo, concurrencia):
+    if modo == 'process':
+        return ProcessPoolExecutor(max_workers=concurrencia, initializer=_iniciar_proceso)
+    return ThreadPoolExecutor(max_workers=concurrencia)
+
+def procesar_cola(modo, concurrencia, intervalo):
+    """Reclama tareas pendientes y las ejecuta en un pool de hilos o de procesos."""
+    global app
+    app = create_app()
+    intervalo_latido = app.config['JOB_HEARTBEAT_SECONDS']
+
+    pool = _crear_pool(modo, concurrencia)
+
+    signal.signal(signal.SIGTERM, _senal_detener)
+    signal.signal(signal.SIGINT, _senal_detener)
+    print(f"Worker iniciado ({modo}, concurrencia {concurrencia}).")
+
+    en_curso = {}  # futuro -> id de la tarea
+    ultimo_mantenimiento = ultimo_latido = 0
+    try:
+        while not detener:
+            terminados = [f for f in en_curso if f.done()]
+            if any(isinstance(f.exception(), BrokenProcessPool) for f in terminados):
+                # Un proceso hijo murió (p. ej. sin memoria): sus tareas quedan sin latido y
+                # recuperar_tareas_colgadas las devuelve a la cola con un intento más
+                print("Un proceso del pool terminó de forma inesperada; se crea un pool nuevo.")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = _crear_pool(modo, concurrencia)
+                en_curso = {}
+            for futuro in terminados:
+                en_curso.pop(futuro, None)
+            libres = concurrencia - len(en_curso)
+
+            with app.app_context():
+                if time.time() - ultimo_latido > intervalo_latido:
+                    marcar_latido(list(en_curso.values()))
+                    ultimo_latido = time.time()
+                if time.time() - ultimo_mantenimiento > INTERVALO_MANTENIMIENTO:
+                    _mantenimiento()
+                    ultimo_mantenimiento = time.time()
+                ids = reclamar_tareas(libres) if libres > 0 else []
+                db.session.remove()
+
+            for tarea_id in ids:
+                en_curso[pool.submit(_ejecutar, tarea_id)] = tarea_id
+
+            if not ids:
+                time.sleep(intervalo)
+    finally:
+        pool.shutdown(wait=True)
+
+if __name__ == '__main__':
+    configuracion = create_app().config
+    parser = argparse.ArgumentParser(description='Procesa la cola de tareas en segundo plano.')
+    parser.add_argument('--modo', choices=['thread', 'process'], default=configuracion['WORKER_MODE'])
+    parser.add_argument('--concurrencia', type=int, default=configuracion['WORKER_CONCURRENCY'])
+    parser.add_argument('--intervalo', type=float, default=2.0,
+                        help='Segundos de espera cuando la cola está vacía.')
+    args = parser.parse_args()
+    procesar_cola(args.modo, args.concurrencia, args.intervalo)